@@ -0,0 +1,380 @@
+#!/usr/bin/env python
+# Copyright: (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Runs the modules in-process against a simulated Assisted Installer service
+# and compares the requests, SSO exchanges, bytes and sleep time of standard
+# scenarios with benchmarks/request_budgets.json. Exits 1 when a scenario
+# goes over its budget. The unit tests of the collection replay the same
+# scenarios (tests/unit/test_request_budget.py), this script reports the
+# measurements and rewrites the budgets.
+#
+#   PYTHONPATH=collections python benchmarks/request_budget.py
+#   PYTHONPATH=collections python benchmarks/request_budget.py --update
+import argparse
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, ID_RE
+
+API_URL = "https://api.openshift.com/api/assisted-install/v2"
+BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'request_budgets.json')
+METRICS = ('requests', 'sso_requests', 'bytes_sent', 'bytes_received', 'sleep')
+MODULES = 'ansible_collections.agonzalezrh.install_openshift.plugins.modules.'
+
+
+def uuid(kind, index):
+    return '%08x-0000-4000-8000-%012x' % (kind, index)
+
+
+class FakeClock(object):
+    # Replaces time.time and time.sleep so that waits take no wall time
+
+    def __init__(self):
+        self.now = 1700000000.0
+        self.slept = 0.0
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self.lock:
+            self.now += seconds
+            self.slept += seconds
+
+
+class MockTransport(object):
+    # Stands in for requests.Session, answers with the service and records every call
+
+    def __init__(self, service):
+        self.service = service
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, params=None, json=None, data=None, headers=None, stream=False, timeout=None):
+        prepared = requests.Request(method, url, params=params, json=json, data=data, headers=headers).prepare()
+        status, body = self.service.handle(method, url.split('?')[0], params or {}, json)
+        response = requests.models.Response()
+        response.status_code = status
+        if isinstance(body, bytes):
+            response._content = body
+        else:
+            response._content = b'' if body is None else encode(body)
+        response._content_consumed = True
+        response.headers = CaseInsensitiveDict({'Content-Length': str(len(response._content))})
+        response.request = prepared
+        response.url = prepared.url
+        response.raw = None
+        self.service.record(method, url, prepared, response)
+        return response
+
+    def close(self):
+        pass
+
+
+def encode(body):
+    # module level, MockTransport.request takes a json argument like requests
+    return to_bytes(json.dumps(body))
+
+
+class FakeService(object):
+    # Minimal Assisted Installer service, scenarios set up clusters and hosts
+    # and tick() moves them forward on every cluster GET
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.clusters = OrderedDict()
+        self.infra_envs = OrderedDict()
+        self.calls = []
+        self.tokens = 0
+        self.polls = 0
+        self.tick = None
+        self.lock = threading.Lock()
+
+    def record(self, method, url, prepared, response):
+        path = url.split('?')[0]
+        endpoint = 'sso/token' if 'openid-connect' in path else ID_RE.sub('{id}', path[len(API_URL):])
+        body = prepared.body or b''
+        with self.lock:
+            self.calls.append((method, endpoint, len(body), len(response.content)))
+
+    def cluster_view(self, cluster):
+        view = dict(cluster)
+        view['hosts'] = [dict(host) for host in cluster['hosts']]
+        return view
+
+    def handle(self, method, path, params, body):
+        if 'openid-connect' in path:
+            self.tokens += 1
+            return 200, {'access_token': 'token-%d' % self.tokens, 'expires_in': 900}
+        parts = path[len(API_URL):].strip('/').split('/')
+        if parts[0] == 'clusters' and len(parts) == 1:
+            return 200, [self.cluster_view(cluster) for cluster in self.clusters.values()]
+        if parts[0] == 'clusters':
+            cluster = self.clusters.get(parts[1])
+            if cluster is None:
+                return 404, {'code': '404', 'reason': 'cluster %s not found' % parts[1]}
+            if len(parts) == 2 and method == 'GET':
+                self.polls += 1
+                if self.tick is not None:
+                    self.tick(self, cluster)
+                return 200, self.cluster_view(cluster)
+            if len(parts) == 2 and method == 'DELETE':
+                del self.clusters[parts[1]]
+                return 204, None
+            if parts[2:] == ['actions', 'install']:
+                cluster['status'] = 'preparing-for-installation'
+                return 202, self.cluster_view(cluster)
+            if parts[2:] == ['downloads', 'credentials']:
+                return 200, to_bytes('%s of %s\n' % (params.get('file_name'), cluster['id'])) * 100
+        if parts[0] == 'infra-envs' and len(parts) == 1:
+            return 200, [env for env in self.infra_envs.values() if env['cluster_id'] == params.get('cluster_id')]
+        if parts[0] == 'infra-envs' and len(parts) == 2 and method == 'DELETE':
+            self.infra_envs.pop(parts[1], None)
+            return 204, None
+        if parts[0] == 'infra-envs' and len(parts) == 4 and method == 'PATCH':
+            for cluster in self.clusters.values():
+                for host in cluster['hosts']:
+                    if host['id'] == parts[3]:
+                        if 'host_role' in body:
+                            host['role'] = body['host_role']
+                        if 'disks_selected_config' in body:
+                            host['installation_disk_id'] = body['disks_selected_config'][0]['id']
+                        return 201, host
+            return 404, {'code': '404', 'reason': 'host not found'}
+        return 404, {'code': '404', 'reason': 'no route for %s %s' % (method, path)}
+
+
+def make_host(cluster_index, index, status='known'):
+    inventory = json.dumps(dict(
+        hostname='node-%d' % index,
+        interfaces=[dict(name='eth0', mac_address='52:54:00:%02x:%02x:%02x' % (cluster_index % 256, index // 256, index % 256))],
+        disks=[
+            dict(id='/dev/disk/by-id/ssd-%d' % index, size_bytes=480 * 10 ** 9, drive_type='SSD',
+                 installation_eligibility=dict(eligible=True)),
+            dict(id='/dev/disk/by-id/hdd-%d' % index, size_bytes=4000 * 10 ** 9, drive_type='HDD',
+                 installation_eligibility=dict(eligible=True)),
+        ],
+        cpu=dict(count=16),
+        memory=dict(physical_bytes=64 * 1024 ** 3),
+    ))
+    return dict(
+        kind='Host', id=uuid(2, cluster_index * 1000 + index), requested_hostname='node-%d' % index,
+        status=status, role='auto-assign', inventory=inventory, updated_at='2023-05-10T12:00:00Z',
+        infra_env_id=uuid(3, cluster_index),
+    )
+
+
+def make_cluster(index, hosts=0, status='ready'):
+    return dict(
+        kind='Cluster', id=uuid(1, index), name='cluster-%d' % index, status=status,
+        openshift_version='4.14.10', base_dns_domain='example.com',
+        hosts=[make_host(index, n) for n in range(hosts)],
+    )
+
+
+def run_module(name, args):
+    basic._ANSIBLE_ARGS = to_bytes(json.dumps({'ANSIBLE_MODULE_ARGS': args}))
+    basic._ANSIBLE_PROFILE = 'legacy'
+    module = importlib.import_module(MODULES + name)
+    out = io.StringIO()
+    stdout = sys.stdout
+    sys.stdout = out
+    try:
+        module.run_module()
+    except SystemExit:
+        pass
+    finally:
+        sys.stdout = stdout
+    text = out.getvalue()
+    result = json.loads(text[text.index('{'):])
+    if result.get('failed'):
+        raise RuntimeError('%s failed: %s' % (name, result.get('msg')))
+    return result
+
+
+def scenario_compact_install(service):
+    # 3-node compact cluster, about 30 minutes of installation polled every 60 seconds
+    cluster = make_cluster(1, hosts=3)
+    service.clusters[cluster['id']] = cluster
+
+    def tick(service, cluster):
+        if cluster['status'] == 'ready':
+            return
+        if service.polls > 34:
+            cluster['status'] = 'installed'
+        elif service.polls > 31:
+            cluster['status'] = 'finalizing'
+        elif service.polls > 3:
+            cluster['status'] = 'installing'
+        stages = ['Starting installation', 'Installing', 'Writing image to disk', 'Rebooting', 'Configuring', 'Joined', 'Done']
+        for index, host in enumerate(cluster['hosts']):
+            stage = stages[min(max(service.polls - 3 - index, 0) // 5, len(stages) - 1)]
+            host['progress'] = dict(current_stage=stage, stage_started_at='2023-05-10T12:00:00Z')
+    service.tick = tick
+    run_module('install_cluster', dict(offline_token='offline', cluster_id=cluster['id'], delay=60, wait_timeout=3600))
+
+
+def scenario_sno_install(service):
+    # Single-node OpenShift, the host bootstraps itself, about 40 minutes polled every 60 seconds
+    cluster = make_cluster(4, hosts=1)
+    cluster['high_availability_mode'] = 'None'
+    service.clusters[cluster['id']] = cluster
+
+    def tick(service, cluster):
+        if cluster['status'] == 'ready':
+            return
+        if service.polls > 44:
+            cluster['status'] = 'installed'
+        elif service.polls > 41:
+            cluster['status'] = 'finalizing'
+        elif service.polls > 3:
+            cluster['status'] = 'installing'
+        stages = ['Starting installation', 'Installing', 'Waiting for bootkube', 'Writing image to disk', 'Rebooting',
+                  'Done']
+        stage = stages[min(max(service.polls - 3, 0) // 8, len(stages) - 1)]
+        cluster['hosts'][0]['progress'] = dict(current_stage=stage, stage_started_at='2023-05-10T12:00:00Z')
+    service.tick = tick
+    run_module('install_cluster', dict(offline_token='offline', cluster_id=cluster['id'], delay=60, wait_timeout=3600,
+                                       stuck_host_timeout=1200))
+
+
+def scenario_wait_120_hosts(service):
+    # 120 hosts booting 20 at a time, roles and disks assigned by host_rules
+    cluster = make_cluster(2, status='insufficient')
+    service.clusters[cluster['id']] = cluster
+
+    def tick(service, cluster):
+        for host in cluster['hosts']:
+            host['status'] = 'known'
+        if len(cluster['hosts']) < 120:
+            start = len(cluster['hosts'])
+            cluster['hosts'].extend(make_host(2, n, status='discovering') for n in range(start, start + 20))
+        elif all(host['role'] != 'auto-assign' for host in cluster['hosts']):
+            cluster['status'] = 'ready'
+    service.tick = tick
+    run_module('wait_for_hosts', dict(
+        offline_token='offline', cluster_id=cluster['id'], infra_env_id=uuid(3, 2), expected_hosts=120, delay=10,
+        host_rules=dict(roles=[dict(role='master', count=3), dict(role='worker')],
+                        installation_disk=dict(rotational=False)),
+    ))
+
+
+def scenario_cleanup_50_clusters(service):
+    # list_clusters then one delete_cluster task per cluster
+    for index in range(50):
+        cluster = make_cluster(100 + index, hosts=3, status='installed')
+        service.clusters[cluster['id']] = cluster
+        service.infra_envs[uuid(3, 100 + index)] = dict(id=uuid(3, 100 + index), cluster_id=cluster['id'])
+    clusters = run_module('list_clusters', dict(offline_token='offline'))['result']
+    for cluster in clusters:
+        run_module('delete_cluster', dict(offline_token='offline', cluster_id=cluster['id']))
+
+
+def scenario_download_credentials(service):
+    cluster = make_cluster(3, status='installed')
+    service.clusters[cluster['id']] = cluster
+    directory = os.path.join(os.environ.get('TMPDIR', '/tmp'), 'request-budget-%d' % os.getpid())
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    run_module('download_credentials', dict(offline_token='offline', cluster_id=cluster['id'], files=[
+        dict(file_name='kubeconfig', dest=os.path.join(directory, 'kubeconfig')),
+        dict(file_name='kubeadmin-password', dest=os.path.join(directory, 'kubeadmin-password')),
+    ]))
+
+
+SCENARIOS = OrderedDict([
+    ('compact_install', scenario_compact_install),
+    ('sno_install', scenario_sno_install),
+    ('wait_120_hosts', scenario_wait_120_hosts),
+    ('cleanup_50_clusters', scenario_cleanup_50_clusters),
+    ('download_credentials', scenario_download_credentials),
+])
+
+
+def measure(scenario):
+    clock = FakeClock()
+    service = FakeService(clock)
+    saved = (time.time, time.sleep, AssistedClient.session_factory)
+    time.time, time.sleep = clock.time, clock.sleep
+    AssistedClient.session_factory = staticmethod(lambda: MockTransport(service))
+    try:
+        SCENARIOS[scenario](service)
+    finally:
+        time.time, time.sleep, AssistedClient.session_factory = saved
+    endpoints = OrderedDict()
+    for method, endpoint, sent, received in service.calls:
+        key = '%s %s' % (method, endpoint)
+        endpoints[key] = endpoints.get(key, 0) + 1
+    return dict(
+        requests=len([call for call in service.calls if call[1] != 'sso/token']),
+        sso_requests=len([call for call in service.calls if call[1] == 'sso/token']),
+        bytes_sent=sum(call[2] for call in service.calls),
+        bytes_received=sum(call[3] for call in service.calls),
+        sleep=round(clock.slept, 1),
+        endpoints=endpoints,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Request budgets of the collection modules')
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO', help='one of %s, all by default' % ', '.join(SCENARIOS))
+    parser.add_argument('--update', action='store_true', help='write the measured values as the new budgets')
+    parser.add_argument('--verbose', action='store_true', help='also print the requests per endpoint')
+    args = parser.parse_args()
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error('unknown scenario %s' % scenario)
+
+    budgets = {}
+    if os.path.exists(BUDGETS):
+        with open(BUDGETS) as f:
+            budgets = json.load(f)
+    over = []
+    print("%-22s %-15s %12s %12s" % ("scenario", "metric", "measured", "budget"))
+    for scenario in args.scenarios or SCENARIOS:
+        measured = measure(scenario)
+        budget = budgets.get(scenario, {})
+        for metric in METRICS:
+            limit = budget.get(metric)
+            flag = ''
+            if limit is not None and measured[metric] > limit:
+                flag = ' OVER'
+                over.append('%s %s' % (scenario, metric))
+            print("%-22s %-15s %12s %12s%s" % (scenario, metric, measured[metric], '-' if limit is None else limit, flag))
+        if args.verbose:
+            for endpoint, count in measured['endpoints'].items():
+                print("%-22s   %-40s %6d" % ('', endpoint, count))
+        if args.update:
+            budgets[scenario] = dict((metric, measured[metric]) for metric in METRICS)
+
+    if args.update:
+        with open(BUDGETS, 'w') as f:
+            json.dump(budgets, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print("budgets written to %s" % BUDGETS)
+        return 0
+    if over:
+        print("over budget: " + ', '.join(over))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# Copyright: (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Peak RSS of decoding a GET /clusters?with_hosts=true response with
+# json.loads against the streaming decoder used by list_clusters.
+#
+#   PYTHONPATH=collections python benchmarks/stream_list.py --clusters 50 200 800
+#
+# Every measurement runs in its own process so ru_maxrss is not shared.
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+
+def make_cluster(index, hosts):
+    inventory = json.dumps(dict(
+        hostname="host-%d" % index,
+        interfaces=[dict(name="eth%d" % n, mac_address="52:54:00:00:%02x:%02x" % (index % 256, n)) for n in range(4)],
+        disks=[dict(id="/dev/disk/by-id/wwn-%d-%d" % (index, n), size_bytes=10 ** 12, drive_type="SSD") for n in range(8)],
+        cpu=dict(count=64, flags=["flag%d" % n for n in range(120)]),
+        memory=dict(physical_bytes=256 * 1024 ** 3),
+    ))
+    return dict(
+        kind="Cluster",
+        id="%08d-0000-0000-0000-000000000000" % index,
+        name="cluster-%d" % index,
+        status="installed" if index % 3 else "ready",
+        openshift_version="4.14.1",
+        hosts=[dict(
+            kind="Host",
+            id="%08d-0000-0000-0000-%012d" % (index, n),
+            requested_hostname="cluster-%d-host-%d" % (index, n),
+            status="installed",
+            inventory=inventory,
+            validations_info="x" * 4000,
+        ) for n in range(hosts)],
+    )
+
+
+def rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def measure(mode, path):
+    from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+    from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import streaming
+
+    transform = results.transformer(dict(result_mode='summary'))
+    before = rss_kb()
+    with open(path, 'rb') as f:
+        if mode == 'json':
+            clusters = json.loads(f.read())
+            kept = [transform(cluster) for cluster in clusters if cluster['status'] == 'ready']
+        else:
+            chunks = iter(lambda: f.read(CHUNK_SIZE), b'')
+            kept = streaming.collect(
+                streaming.iter_json_array(chunks), lambda cluster: cluster['status'] == 'ready', transform)
+    print(json.dumps(dict(before=before, peak=rss_kb(), kept=len(kept))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak RSS of json.loads against the streaming list decoder')
+    parser.add_argument('--clusters', type=int, nargs='+', default=[50, 200, 800])
+    parser.add_argument('--hosts', type=int, default=6)
+    parser.add_argument('--measure', nargs=2, metavar=('MODE', 'FILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    print("%10s %12s %16s %16s" % ("clusters", "response MB", "json.loads MB", "streaming MB"))
+    for count in args.clusters:
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump([make_cluster(index, args.hosts) for index in range(count)], f)
+            size = os.path.getsize(path)
+            peaks = []
+            for mode in ('json', 'stream'):
+                output = subprocess.check_output([sys.executable, __file__, '--measure', mode, path])
+                data = json.loads(output)
+                peaks.append((data['peak'] - data['before']) / 1024.0)
+            print("%10d %12.1f %16.1f %16.1f" % (count, size / 1024.0 / 1024.0, peaks[0], peaks[1]))
+        finally:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Prometheus exporter for the clusters of an Assisted Installer API. It is a
+# standalone process, not a module, and imports the collection from the
+# directory it is installed in:
+#
+#   PYTHONPATH=~/.ansible/collections ASSISTED_OFFLINE_TOKEN=... python \
+#     ~/.ansible/collections/ansible_collections/agonzalezrh/install_openshift/contrib/metrics_exporter.py \
+#     --textfile /var/lib/node_exporter/textfile/assisted.prom --once
+#
+# Every poll lists the clusters without their hosts and only fetches the
+# clusters that changed since the previous poll, or that are still moving.
+# Lists and clusters are requested with If-None-Match/If-Modified-Since when
+# the service sent an ETag or Last-Modified, one session and one access token
+# are kept for the whole life of the exporter.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+
+from ansible.module_utils.six.moves import BaseHTTPServer
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import (
+    API_URL, AUTH_TYPES, TRANSIENT_STATUSES, AssistedClient, AssistedError, _transient_error)
+
+DEFAULT_INTERVAL = 60
+
+# Clusters in these states only change when updated_at does
+SETTLED_STATUSES = ('installed', 'error', 'cancelled')
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics(object):
+    # Samples of one exposition, rendered in the Prometheus text format
+
+    def __init__(self):
+        self.families = OrderedDict()
+
+    def add(self, metric, kind, help_text, value, **labels):
+        family = self.families.setdefault(metric, dict(kind=kind, help=help_text, samples=[]))
+        family['samples'].append((labels, value))
+
+    def render(self):
+        lines = []
+        for name, family in self.families.items():
+            lines.append('# HELP %s %s' % (name, family['help']))
+            lines.append('# TYPE %s %s' % (name, family['kind']))
+            for labels, value in family['samples']:
+                suffix = ''
+                if labels:
+                    suffix = '{%s}' % ','.join('%s="%s"' % (key, escape(labels[key])) for key in sorted(labels))
+                lines.append('%s%s %s' % (name, suffix, repr(float(value)) if isinstance(value, float) else value))
+        return '\n'.join(lines) + '\n'
+
+
+class ClusterPoller(object):
+
+    def __init__(self, client, cluster_ids=None):
+        self.client = client
+        self.cluster_ids = cluster_ids
+        # path -> (etag, last_modified, data) of the conditional requests
+        self.validators = {}
+        # cluster id -> (updated_at, cluster with hosts)
+        self.details = {}
+        self.clusters = []
+        # (method, endpoint, status) -> [count, seconds]
+        self.api_requests = {}
+        self.not_modified = 0
+        self.polls = 0
+        self.errors = 0
+        self.last_success = None
+        self.last_duration = None
+
+    def get(self, path, params=None):
+        # GET with the validators of the previous answer, 304 answers reuse its body
+        key = path + repr(sorted((params or {}).items()))
+        cached = self.validators.get(key)
+        headers = {}
+        if cached is not None:
+            if cached[0]:
+                headers['If-None-Match'] = cached[0]
+            if cached[1]:
+                headers['If-Modified-Since'] = cached[1]
+        response = self.client.request('GET', path, params=params, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            return cached[2]
+        if response.status_code in TRANSIENT_STATUSES:
+            raise _transient_error(response)
+        try:
+            data = response.json()
+        except ValueError:
+            raise AssistedError('Request failed: ', {'code': str(response.status_code), 'reason': response.text[:200]})
+        if response.status_code >= 400 or (isinstance(data, dict) and 'code' in data):
+            raise AssistedError('Request failed: ', data)
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if etag or last_modified:
+            self.validators[key] = (etag, last_modified, data)
+        else:
+            self.validators.pop(key, None)
+        return data
+
+    def needs_refresh(self, cluster):
+        known = self.details.get(cluster['id'])
+        if known is None or known[0] != cluster.get('updated_at'):
+            return True
+        return cluster.get('status') not in SETTLED_STATUSES
+
+    def poll(self):
+        start = time.time()
+        self.polls += 1
+        try:
+            listed = self.get('/clusters')
+            if self.cluster_ids:
+                listed = [cluster for cluster in listed
+                          if cluster['id'] in self.cluster_ids or cluster.get('name') in self.cluster_ids]
+            clusters = []
+            for cluster in listed:
+                if self.needs_refresh(cluster):
+                    detail = self.get('/clusters/' + cluster['id'])
+                    self.details[cluster['id']] = (cluster.get('updated_at'), detail)
+                clusters.append(self.details[cluster['id']][1])
+            listed_ids = set(cluster['id'] for cluster in listed)
+            for cluster_id in list(self.details):
+                if cluster_id not in listed_ids:
+                    del self.details[cluster_id]
+            self.clusters = clusters
+            self.last_success = time.time()
+        except AssistedError as e:
+            self.errors += 1
+            sys.stderr.write('poll failed: %s%s\n' % (e.msg, e.result.get('reason', '')))
+        except (ValueError, requests.exceptions.RequestException) as e:
+            # An SSO or API answer that is not JSON, such as an HTML error
+            # page, fails the poll instead of the exporter
+            self.errors += 1
+            sys.stderr.write('poll failed: %s\n' % e)
+        finally:
+            self.last_duration = time.time() - start
+            self.collect_calls()
+
+    def collect_calls(self):
+        # Folds the calls recorded by the client into counters so the list
+        # does not grow for the life of the exporter
+        calls, self.client.calls = self.client.calls, []
+        for method, endpoint, status, elapsed in (call[:4] for call in calls):
+            entry = self.api_requests.setdefault((method, endpoint, status), [0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def metrics(self):
+        metrics = Metrics()
+        for cluster in self.clusters:
+            labels = dict(cluster_id=cluster['id'], name=cluster.get('name') or '')
+            metrics.add('assisted_cluster_info', 'gauge', 'Cluster metadata, always 1.', 1,
+                        openshift_version=cluster.get('openshift_version') or '',
+                        base_dns_domain=cluster.get('base_dns_domain') or '', **labels)
+            metrics.add('assisted_cluster_status', 'gauge', 'Current status of the cluster, always 1.', 1,
+                        status=cluster.get('status') or '', **labels)
+            progress = (cluster.get('progress') or {}).get('total_percentage') or 0
+            metrics.add('assisted_cluster_install_progress_percent', 'gauge',
+                        'Installation progress of the cluster in percent.', progress, **labels)
+            counts = {}
+            for host in cluster.get('hosts') or []:
+                counts[host.get('status')] = counts.get(host.get('status'), 0) + 1
+            for status in sorted(counts):
+                metrics.add('assisted_cluster_hosts', 'gauge', 'Hosts of the cluster by status.', counts[status],
+                            status=status, **labels)
+        for (method, endpoint, status), (count, seconds) in sorted(self.api_requests.items()):
+            metrics.add('assisted_api_requests_total', 'counter', 'Requests sent to the API and SSO.', count,
+                        method=method, endpoint=endpoint, code=status)
+            metrics.add('assisted_api_request_duration_seconds_total', 'counter',
+                        'Time spent waiting for the API and SSO.', round(seconds, 4),
+                        method=method, endpoint=endpoint, code=status)
+        metrics.add('assisted_exporter_not_modified_total', 'counter',
+                    'Requests answered 304 Not Modified.', self.not_modified)
+        metrics.add('assisted_exporter_polls_total', 'counter', 'Polls of the API.', self.polls)
+        metrics.add('assisted_exporter_poll_errors_total', 'counter', 'Polls that failed.', self.errors)
+        if self.last_duration is not None:
+            metrics.add('assisted_exporter_poll_duration_seconds', 'gauge', 'Duration of the last poll.',
+                        round(self.last_duration, 4))
+        if self.last_success is not None:
+            metrics.add('assisted_exporter_last_success_timestamp_seconds', 'gauge',
+                        'Time of the last successful poll.', round(self.last_success, 3))
+        return metrics.render()
+
+
+def write_textfile(path, text):
+    # Written next to path and renamed so the node exporter never reads half a file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.assisted-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.rename(tmp, path)
+
+
+def serve(address, port, poller):
+    lock = threading.Lock()
+    state = dict(text=poller.metrics())
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            with lock:
+                body = state['text'].encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = BaseHTTPServer.HTTPServer((address, port), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    def publish(text):
+        with lock:
+            state['text'] = text
+    return publish
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Prometheus metrics of the clusters of an Assisted Installer API. The offline or bearer '
+                    'token is read from ASSISTED_OFFLINE_TOKEN or ASSISTED_BEARER_TOKEN.')
+    parser.add_argument('--api-url', default=os.environ.get('ASSISTED_API_URL', API_URL))
+    parser.add_argument('--sso-url', default=os.environ.get('ASSISTED_SSO_URL', access_token.SSO_URL))
+    parser.add_argument('--auth-type', choices=AUTH_TYPES, default=os.environ.get('ASSISTED_AUTH_TYPE', 'offline_token'))
+    parser.add_argument('--cluster', action='append', dest='clusters', metavar='ID_OR_NAME',
+                        help='only export these clusters, can be repeated')
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL, help='seconds between polls')
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument('--textfile', help='write the metrics to this file for the node exporter textfile collector')
+    output.add_argument('--listen', metavar='[ADDRESS:]PORT', help='serve the metrics on /metrics')
+    parser.add_argument('--once', action='store_true', help='poll once and exit, with --textfile')
+    args = parser.parse_args(argv)
+
+    offline_token = os.environ.get('ASSISTED_OFFLINE_TOKEN')
+    bearer_token = os.environ.get('ASSISTED_BEARER_TOKEN')
+    if args.auth_type == 'offline_token' and not offline_token:
+        parser.error('ASSISTED_OFFLINE_TOKEN is required when auth type is offline_token')
+    if args.auth_type == 'bearer' and not bearer_token:
+        parser.error('ASSISTED_BEARER_TOKEN is required when auth type is bearer')
+    if args.once and not args.textfile:
+        parser.error('--once requires --textfile')
+
+    client = AssistedClient(offline_token, api_url=args.api_url, sso_url=args.sso_url,
+                            auth_type=args.auth_type, bearer_token=bearer_token)
+    poller = ClusterPoller(client, set(args.clusters) if args.clusters else None)
+
+    if args.listen:
+        address, _, port = args.listen.rpartition(':')
+        publish = serve(address or '127.0.0.1', int(port), poller)
+    else:
+        def publish(text):
+            write_textfile(args.textfile, text)
+
+    while True:
+        poller.poll()
+        publish(poller.metrics())
+        if args.once:
+            return 1 if poller.errors else 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+name: api_profile
+type: aggregate
+short_description: Profiles the Assisted Installer API calls made by the collection modules.
+version_added: "1.1.0"
+description:
+    - Reads the C(api_profile) timings returned by the modules of this collection.
+    - At the end of the run it prints, per task, the time spent in SSO token exchanges, API requests and sleeps between polls,
+      and per endpoint the request count, latency percentiles, bytes and retries.
+requirements:
+    - enable in configuration, for example C(callbacks_enabled = agonzalezrh.install_openshift.api_profile) in ansible.cfg
+options:
+    output_file:
+        description: Also write the profile as JSON to this file.
+        type: path
+        env:
+            - name: ASSISTED_API_PROFILE_OUTPUT
+        ini:
+            - section: callback_api_profile
+              key: output_file
+author:
+    - Alberto Gonzalez (@agonzalezrh)
+'''
+
+import json
+from collections import OrderedDict
+
+from ansible.plugins.callback import CallbackBase
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = int(round(percent / 100.0 * (len(ordered) - 1)))
+    return ordered[rank]
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'agonzalezrh.install_openshift.api_profile'
+    CALLBACK_NEEDS_WHITELIST = True
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self.tasks = OrderedDict()
+        self.endpoints = OrderedDict()
+
+    def _collect(self, result):
+        data = result._result
+        profiles = []
+        if isinstance(data.get('api_profile'), dict):
+            profiles.append(data['api_profile'])
+        for item in data.get('results') or []:
+            if isinstance(item, dict) and isinstance(item.get('api_profile'), dict):
+                profiles.append(item['api_profile'])
+        if not profiles:
+            return
+
+        key = "%s | %s" % (result._task.get_name(), result._host.get_name())
+        task = self.tasks.setdefault(key, dict(
+            runs=0, requests=0, sso_requests=0, api_time=0.0, sso_time=0.0, sleep=0.0, wall=0.0,
+            bytes_received=0, bytes_sent=0, retries=0, errors=0,
+        ))
+        for profile in profiles:
+            fields = profile.get('fields')
+            task['runs'] += 1
+            task['sleep'] += profile.get('sleep', 0)
+            task['wall'] += profile.get('wall', 0)
+            for values in profile.get('calls') or []:
+                call = dict(zip(fields, values))
+                if call['endpoint'] == 'sso/token':
+                    task['sso_requests'] += 1
+                    task['sso_time'] += call['elapsed']
+                else:
+                    task['requests'] += 1
+                    task['api_time'] += call['elapsed']
+                task['bytes_received'] += call['bytes_received']
+                task['bytes_sent'] += call['bytes_sent']
+                task['retries'] += call['retries']
+                if call['status'] >= 400 or call['status'] == 0:
+                    task['errors'] += 1
+
+                endpoint = self.endpoints.setdefault("%s %s" % (call['method'], call['endpoint']), dict(
+                    requests=0, latencies=[], bytes_received=0, bytes_sent=0, retries=0, errors=0,
+                ))
+                endpoint['requests'] += 1
+                endpoint['latencies'].append(call['elapsed'])
+                endpoint['bytes_received'] += call['bytes_received']
+                endpoint['bytes_sent'] += call['bytes_sent']
+                endpoint['retries'] += call['retries']
+                if call['status'] >= 400 or call['status'] == 0:
+                    endpoint['errors'] += 1
+
+    def v2_runner_on_ok(self, result):
+        self._collect(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._collect(result)
+
+    def _report(self):
+        tasks = OrderedDict()
+        for key, task in self.tasks.items():
+            task = dict(task)
+            task['other'] = max(task['wall'] - task['api_time'] - task['sso_time'] - task['sleep'], 0.0)
+            tasks[key] = dict((name, round(value, 3) if isinstance(value, float) else value) for name, value in task.items())
+        endpoints = OrderedDict()
+        for key, endpoint in self.endpoints.items():
+            latencies = endpoint['latencies']
+            endpoints[key] = dict(
+                requests=endpoint['requests'],
+                p50=round(_percentile(latencies, 50), 4),
+                p90=round(_percentile(latencies, 90), 4),
+                p99=round(_percentile(latencies, 99), 4),
+                max=round(max(latencies), 4),
+                total=round(sum(latencies), 3),
+                bytes_received=endpoint['bytes_received'],
+                bytes_sent=endpoint['bytes_sent'],
+                retries=endpoint['retries'],
+                errors=endpoint['errors'],
+            )
+        return dict(tasks=tasks, endpoints=endpoints)
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.tasks:
+            return
+        report = self._report()
+
+        self._display.banner("ASSISTED INSTALLER API PROFILE")
+        self._display.display("%-50s %8s %8s %9s %9s %9s %9s %9s" % (
+            "task", "requests", "sso", "api s", "sso s", "sleep s", "other s", "wall s"))
+        for key, task in report['tasks'].items():
+            self._display.display("%-50s %8d %8d %9.2f %9.2f %9.2f %9.2f %9.2f" % (
+                key[:50], task['requests'], task['sso_requests'], task['api_time'], task['sso_time'],
+                task['sleep'], task['other'], task['wall']))
+        self._display.display("")
+        self._display.display("%-50s %8s %8s %8s %8s %11s %8s %7s" % (
+            "endpoint", "requests", "p50 ms", "p90 ms", "p99 ms", "received", "retries", "errors"))
+        for key, endpoint in sorted(report['endpoints'].items(), key=lambda item: -item[1]['total']):
+            self._display.display("%-50s %8d %8.1f %8.1f %8.1f %11d %8d %7d" % (
+                key[:50], endpoint['requests'], endpoint['p50'] * 1000, endpoint['p90'] * 1000,
+                endpoint['p99'] * 1000, endpoint['bytes_received'], endpoint['retries'], endpoint['errors']))
+
+        output_file = self.get_option('output_file')
+        if output_file:
+            with open(output_file, 'w') as f:
+                json.dump(report, f, indent=2)
+            self._display.display("API profile written to %s" % output_file)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    offline_token:
+        description:
+            - Offline token from console.redhat.com, exchanged for an access token at O(sso_url).
+            - Required when O(auth_type=offline_token).
+            - The E(ASSISTED_OFFLINE_TOKEN) environment variable is used when not set.
+        required: false
+        type: str
+    bearer_token:
+        description:
+            - Access token sent as is when O(auth_type=bearer).
+            - The E(ASSISTED_BEARER_TOKEN) environment variable is used when not set.
+        required: false
+        type: str
+    auth_type:
+        description:
+            - How the requests are authenticated.
+            - V(offline_token) exchanges O(offline_token) at O(sso_url), V(bearer) sends O(bearer_token),
+              V(none) sends no credentials, for a self-hosted assisted-service without authentication.
+            - The E(ASSISTED_AUTH_TYPE) environment variable is used when not set.
+        required: false
+        type: str
+        choices: ['offline_token', 'bearer', 'none']
+        default: offline_token
+    api_url:
+        description:
+            - Base URL of the Assisted Installer API, for example V(http://assisted.lab.example.com:8090/api/assisted-install/v2) for a self-hosted service.
+            - The E(ASSISTED_API_URL) environment variable is used when not set.
+        required: false
+        type: str
+        default: https://api.openshift.com/api/assisted-install/v2
+    sso_url:
+        description:
+            - Token endpoint used to exchange O(offline_token).
+            - The E(ASSISTED_SSO_URL) environment variable is used when not set.
+        required: false
+        type: str
+        default: https://sso.redhat.com/auth/realms/redhat-external/protocol/openid-connect/token
+    cassette:
+        description:
+            - Cassette file holding the SSO and API exchanges of the modules, gzip compressed when the name ends with C(.gz).
+            - With O(cassette_mode=record) every exchange is appended to the file. Tokens, passwords, pull secrets,
+              credential and file downloads, proxy credentials and signed URL parameters are redacted, request bodies are not kept.
+            - With O(cassette_mode=replay) no request leaves the controller, each task gets the answers recorded for
+              the same module and parameters.
+            - The E(ASSISTED_CASSETTE) environment variable is used when not set.
+        required: false
+        type: path
+    cassette_mode:
+        description:
+            - Whether O(cassette) is recorded or replayed.
+            - The E(ASSISTED_CASSETTE_MODE) environment variable is used when not set.
+        required: false
+        type: str
+        choices: ['record', 'replay']
+        default: replay
+    cassette_speed:
+        description:
+            - How much faster than recorded a cassette is replayed, for the API latencies and the sleeps between polls.
+            - V(0) replays without waiting at all. Wait deadlines still expire as if the full time had passed.
+            - The E(ASSISTED_CASSETTE_SPEED) environment variable is used when not set.
+        required: false
+        type: float
+        default: 0
+notes:
+    - All the modules of the collection belong to the C(group/agonzalezrh.install_openshift.assisted) action group,
+      so these options can be set once with C(module_defaults).
+'''
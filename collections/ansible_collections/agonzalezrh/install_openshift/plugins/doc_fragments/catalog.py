@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    validate_catalog:
+        description:
+            - Check O(openshift_version), O(cpu_architecture) and the operators against the versions and operators the API supports before anything is created.
+            - A minor version such as V(4.14) is resolved to its latest patch release.
+            - A patch release newer than the latest one listed is rejected, an older one the API does not list is accepted with a warning.
+            - When the catalog cannot be fetched and is not cached, the module warns and lets the API validate.
+        required: false
+        type: bool
+        default: true
+    catalog_cache:
+        description:
+            - JSON file caching the C(/openshift-versions) and C(/supported-operators) answers per O(api_url).
+        required: false
+        type: path
+        default: ~/.cache/agonzalezrh.install_openshift/catalog.json
+    catalog_ttl:
+        description: Seconds the cached catalog is used before it is fetched again.
+        required: false
+        type: int
+        default: 86400
+'''
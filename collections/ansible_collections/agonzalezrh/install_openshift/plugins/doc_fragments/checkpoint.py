@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    checkpoint_file:
+        description:
+            - Path of a JSON file where the progress of the wait is saved (cluster ID, start time, deadline, last status and when the cluster last changed status).
+            - When the task is rerun for the same cluster, the wait resumes with the original deadline instead of starting a new O(wait_timeout).
+            - A saved deadline that has already passed is discarded and the rerun waits a full O(wait_timeout) again.
+            - The file is removed once the wait completes, fails or times out.
+        required: false
+        type: path
+'''
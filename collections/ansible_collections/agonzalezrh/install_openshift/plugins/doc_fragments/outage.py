@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    outage_budget:
+        description:
+            - Seconds of API unavailability tolerated while polling the cluster.
+            - 5xx and 429 answers, timeouts and connection resets are retried with a doubling delay, keeping the wait deadline.
+            - The task fails when a single outage lasts longer than this. Other API errors fail at once.
+        required: false
+        type: int
+        default: 300
+'''
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    result_mode:
+        description:
+            - C(full) returns the API objects as they are.
+            - C(summary) keeps the identifying and status fields of clusters, infra-envs and hosts and drops host inventories.
+            - The access token is only returned with C(full).
+        required: false
+        type: str
+        choices: [ full, summary ]
+        default: full
+    return_fields:
+        description:
+            - Only return these fields of the API objects. Nested fields use dots, for example C(hosts.status).
+            - Takes precedence over O(result_mode). The access token is not returned.
+        required: false
+        type: list
+        elements: str
+'''
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    state_store:
+        description:
+            - Path to a local SQLite database where every fetched cluster, infra-env and host is recorded with a timestamp.
+            - Unchanged snapshots are stored only once. The database is created when it does not exist.
+        required: false
+        type: path
+'''
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    wait:
+        description:
+            - Retry until the credentials are available instead of failing on the first error.
+            - Only the answers meaning the cluster is not ready yet (409) and transient errors are retried,
+              authentication errors and unknown clusters fail at once.
+            - The retries reuse the same session and access token.
+        required: false
+        type: bool
+        default: false
+    wait_timeout:
+        description: Give up after this many seconds when O(wait=true).
+        required: false
+        type: int
+        default: 1800
+    delay:
+        description: Seconds before the first retry, doubled after every failed attempt up to O(max_delay).
+        required: false
+        type: int
+        default: 10
+    max_delay:
+        description: Maximum seconds between two attempts.
+        required: false
+        type: int
+        default: 60
+'''
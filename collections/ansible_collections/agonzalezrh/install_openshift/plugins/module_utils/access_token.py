@@ -3,8 +3,10 @@
 # GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
 import requests
 
+SSO_URL = "https://sso.redhat.com/auth/realms/redhat-external/protocol/openid-connect/token"
 
-def _get_access_token(offline_token):
+
+def _get_access_token(offline_token, session=None, sso_url=SSO_URL):
     headers = {
         "Accept": "application/json",
         "Content-Type": "application/x-www-form-urlencoded"
@@ -14,8 +16,10 @@ def _get_access_token(offline_token):
         "client_id": "rhsm-api",
         "refresh_token": offline_token
     }
-    response = requests.post(
-        "https://sso.redhat.com/auth/realms/redhat-external/protocol/openid-connect/token",
+    # Reuse the caller's session so the token exchange shares its connection pool
+    post = session.post if session is not None else requests.post
+    response = post(
+        sso_url,
         headers=headers,
         data=params
     )
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import re
+import threading
+import time
+
+import requests
+
+from ansible.module_utils.basic import env_fallback
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token, cassette, results
+
+API_URL = "https://api.openshift.com/api/assisted-install/v2"
+
+AUTH_TYPES = ('offline_token', 'bearer', 'none')
+
+# Options of the auth doc fragment, never sent to the API
+AUTH_OPTIONS = ('offline_token', 'bearer_token', 'auth_type', 'api_url', 'sso_url', 'cassette', 'cassette_mode',
+                'cassette_speed')
+
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 60
+
+# Answers meaning the service is temporarily unavailable, worth retrying
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+# Network failures worth retrying
+TRANSIENT_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+# Default (connect, read) timeout of the requests in seconds
+REQUEST_TIMEOUT = (10, 60)
+
+# Object IDs are replaced in the recorded endpoints so calls can be grouped
+ID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def auth_argument_spec():
+    # Shared by every module, see the auth doc fragment
+    return dict(
+        offline_token=dict(type='str', required=False, no_log=True, fallback=(env_fallback, ['ASSISTED_OFFLINE_TOKEN'])),
+        bearer_token=dict(type='str', required=False, no_log=True, fallback=(env_fallback, ['ASSISTED_BEARER_TOKEN'])),
+        auth_type=dict(type='str', required=False, choices=list(AUTH_TYPES),
+                       fallback=(env_fallback, ['ASSISTED_AUTH_TYPE']), default='offline_token'),
+        api_url=dict(type='str', required=False, fallback=(env_fallback, ['ASSISTED_API_URL']), default=API_URL),
+        sso_url=dict(type='str', required=False, fallback=(env_fallback, ['ASSISTED_SSO_URL']), default=access_token.SSO_URL),
+        cassette=dict(type='path', required=False, fallback=(env_fallback, ['ASSISTED_CASSETTE'])),
+        cassette_mode=dict(type='str', required=False, choices=list(cassette.CASSETTE_MODES),
+                           fallback=(env_fallback, ['ASSISTED_CASSETTE_MODE']), default='replay'),
+        cassette_speed=dict(type='float', required=False, fallback=(env_fallback, ['ASSISTED_CASSETTE_SPEED']), default=0),
+    )
+
+
+class AssistedError(Exception):
+
+    def __init__(self, msg, result=None):
+        super(AssistedError, self).__init__(msg)
+        self.msg = msg
+        self.result = result if isinstance(result, dict) else {}
+
+
+class TransientError(AssistedError):
+    # 5xx answers, timeouts and connection resets, see CircuitBreaker
+    pass
+
+
+def not_ready(error):
+    # 409 is how the API says an object is not in the state needed yet, such
+    # as credentials before the installation ends. Transient errors clear up
+    # by themselves as well, other errors (401, 403, 404, SSO) never do.
+    if isinstance(error, TransientError):
+        return True
+    return str(error.result.get('code')) == '409' or error.result.get('id') == 409
+
+
+def _transient_error(response):
+    # Gateways answer 5xx with HTML, keep the shape of the API errors
+    try:
+        error = response.json()
+    except ValueError:
+        error = None
+    if not isinstance(error, dict):
+        error = {'code': str(response.status_code), 'reason': response.text[:200]}
+    return TransientError('Request failed: ', error)
+
+
+class AssistedClient(object):
+    # One pooled HTTPS session and one access token shared by every call made
+    # while a module runs, including calls made from worker threads.
+
+    # Builds the session, replaced by in-process transports such as the one
+    # of benchmarks/request_budget.py
+    session_factory = requests.Session
+
+    def __init__(self, offline_token, api_url=API_URL, pool_size=10, sso_url=access_token.SSO_URL,
+                 auth_type='offline_token', bearer_token=None, timeout=REQUEST_TIMEOUT,
+                 cassette_path=None, cassette_mode='replay', cassette_speed=0, task=None):
+        self.offline_token = offline_token
+        self.api_url = api_url.rstrip('/')
+        self.sso_url = sso_url
+        self.auth_type = auth_type
+        self.bearer_token = bearer_token
+        self.timeout = timeout
+        # Scale of the sleeps between polls, compressed when replaying a cassette
+        self.sleep_scale = 1.0
+        if cassette_path:
+            self.session = cassette.open_session(self.session_factory, cassette_path, cassette_mode, task, cassette_speed)
+            if cassette_mode == 'replay':
+                self.sleep_scale = 1.0 / cassette_speed if cassette_speed else 0.0
+        else:
+            self.session = self.session_factory()
+        adapter = requests.adapters.HTTPAdapter(max_retries=5, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.token = None
+        self.token_expires_at = 0
+        self._token_lock = threading.Lock()
+        self.started = time.time()
+        self.calls = []
+        self.sleep_time = 0.0
+        # Sleep seconds skipped by the compressed replay of a cassette
+        self.skipped = 0.0
+
+    @classmethod
+    def from_module(cls, module):
+        # Every result of the module, including failures, carries the
+        # per-call timings read by the api_profile callback plugin, unless
+        # result_mode or return_fields asked for trimmed results
+        params = module.params
+        if params.get('auth_type', 'offline_token') == 'offline_token' and not params.get('offline_token'):
+            module.fail_json(msg='offline_token is required when auth_type is offline_token')
+        if params.get('auth_type') == 'bearer' and not params.get('bearer_token'):
+            module.fail_json(msg='bearer_token is required when auth_type is bearer')
+        try:
+            client = cls(
+                params.get('offline_token'),
+                api_url=params.get('api_url') or API_URL,
+                sso_url=params.get('sso_url') or access_token.SSO_URL,
+                auth_type=params.get('auth_type') or 'offline_token',
+                bearer_token=params.get('bearer_token'),
+                cassette_path=params.get('cassette'),
+                cassette_mode=params.get('cassette_mode') or 'replay',
+                cassette_speed=params.get('cassette_speed') or 0,
+                task=cassette.task_signature(getattr(module, '_name', None), params, AUTH_OPTIONS),
+            )
+        except (IOError, OSError) as e:
+            module.fail_json(msg='Cannot open cassette %s: %s' % (params.get('cassette'), e))
+        if results.transformer(params) is not None:
+            return client
+        exit_json = module.exit_json
+        fail_json = module.fail_json
+
+        def profiled_exit_json(**kwargs):
+            kwargs['api_profile'] = client.profile()
+            exit_json(**kwargs)
+
+        def profiled_fail_json(msg, **kwargs):
+            kwargs['api_profile'] = client.profile()
+            fail_json(msg=msg, **kwargs)
+
+        module.exit_json = profiled_exit_json
+        module.fail_json = profiled_fail_json
+        return client
+
+    def _record(self, method, endpoint, response, start, stream=False):
+        elapsed = time.time() - start
+        if response is None:
+            # The request failed before any answer
+            self.calls.append([method, endpoint, 0, round(elapsed, 4), 0, 0, 0, round(start - self.started, 3)])
+            return
+        request = getattr(response, 'request', None)
+        body = getattr(request, 'body', None) or b''
+        retries = getattr(getattr(response, 'raw', None), 'retries', None)
+        # Streamed bodies are not read here, count what the server announced
+        if stream:
+            received = int(response.headers.get('Content-Length') or 0)
+        else:
+            received = len(response.content)
+        self.calls.append([
+            method,
+            endpoint,
+            response.status_code,
+            round(elapsed, 4),
+            received,
+            len(body),
+            len(retries.history) if retries is not None and retries.history else 0,
+            round(start - self.started, 3),
+        ])
+
+    def profile(self):
+        return dict(
+            fields=['method', 'endpoint', 'status', 'elapsed', 'bytes_received', 'bytes_sent', 'retries', 'offset'],
+            calls=self.calls,
+            sleep=round(self.sleep_time, 3),
+            wall=round(time.time() - self.started, 3),
+        )
+
+    def get_access_token(self):
+        # Same contract as access_token._get_access_token, the token is kept
+        # for the following requests when the exchange succeeds
+        start = time.time()
+        try:
+            response = access_token._get_access_token(self.offline_token, session=self.session, sso_url=self.sso_url)
+        except TRANSIENT_EXCEPTIONS as e:
+            self._record('POST', 'sso/token', None, start)
+            raise TransientError('Error getting access token: ' + str(e))
+        self._record('POST', 'sso/token', response, start)
+        if response.status_code == 200:
+            data = response.json()
+            self.token = data["access_token"]
+            self.token_expires_at = time.time() + data.get("expires_in", 300)
+        return response
+
+    def authenticate(self, force=False):
+        # Returns the token to send, None when auth_type is none
+        with self._token_lock:
+            if self.auth_type != 'offline_token':
+                self.token = self.bearer_token if self.auth_type == 'bearer' else None
+                return self.token
+            if not force and self.token is not None and time.time() < self.token_expires_at - TOKEN_REFRESH_MARGIN:
+                return self.token
+            response = self.get_access_token()
+            if response.status_code != 200:
+                # A failed proactive refresh keeps the current token until it really expires
+                if not force and self.token is not None and time.time() < self.token_expires_at:
+                    return self.token
+                if response.status_code in TRANSIENT_STATUSES:
+                    raise _transient_error(response)
+                raise AssistedError('Error getting access token ', response.json())
+            return self.token
+
+    def headers(self):
+        headers = {
+            "Content-Type": "application/json"
+        }
+        token = self.authenticate()
+        if token:
+            headers["Authorization"] = "Bearer " + token
+        return headers
+
+    def _send(self, method, url, auth=True, **kwargs):
+        endpoint = ID_RE.sub('{id}', url[len(self.api_url):] if url.startswith(self.api_url) else url.split('?')[0])
+        headers = self.headers() if auth else {}
+        # Extra headers of the caller, such as If-None-Match
+        headers.update(kwargs.pop('headers', None) or {})
+        kwargs.setdefault('timeout', self.timeout)
+        start = time.time()
+        try:
+            response = self.session.request(method, url, headers=headers, **kwargs)
+        except TRANSIENT_EXCEPTIONS as e:
+            self._record(method, endpoint, None, start)
+            raise TransientError('Request failed: ' + str(e))
+        self._record(method, endpoint, response, start, stream=kwargs.get('stream', False))
+        return response
+
+    def request(self, method, path, **kwargs):
+        url = path if path.startswith('http') else self.api_url + path
+        response = self._send(method, url, **kwargs)
+        if response.status_code == 401 and self.auth_type == 'offline_token':
+            # The token was revoked or expired early, exchange it once more
+            self.authenticate(force=True)
+            response = self._send(method, url, **kwargs)
+        return response
+
+    def get_presigned(self, url, **kwargs):
+        # Presigned URLs of the image service carry their own api_key, the
+        # access token is not sent to them
+        return self._send('GET', url, auth=False, **kwargs)
+
+    def call(self, method, path, **kwargs):
+        response = self.request(method, path, **kwargs)
+        if response.status_code in TRANSIENT_STATUSES:
+            raise _transient_error(response)
+        if len(response.content) == 0:
+            return None
+        data = response.json()
+        # Key code only appears if there is an error
+        if isinstance(data, dict) and "code" in data:
+            raise AssistedError('Request failed: ', data)
+        return data
+
+    def clock(self):
+        # Time of the wait loops, moves by the full sleeps when a cassette is
+        # replayed with compressed timing so that deadlines still pass
+        return time.time() + self.skipped
+
+    def sleep(self, seconds):
+        self.sleep_time += seconds
+        self.skipped += seconds * (1 - self.sleep_scale)
+        time.sleep(seconds * self.sleep_scale)
+
+    def wait_until(self, func, timeout, delay, max_delay):
+        # Calls func while it raises a not ready error, sleeping delay seconds
+        # doubled after every attempt. Any other error is raised at once, the
+        # last one once timeout is reached. Returns the result of func and
+        # the attempts made.
+        deadline = self.clock() + timeout
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                return func(), attempts
+            except AssistedError as e:
+                remaining = deadline - self.clock()
+                if not not_ready(e) or remaining <= 0:
+                    raise
+            self.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+    def get_cluster(self, cluster_id):
+        return self.call('GET', '/clusters/' + cluster_id)
+
+    def create_cluster(self, params):
+        return self.call('POST', '/clusters', json=params)
+
+    def create_infra_env(self, params):
+        return self.call('POST', '/infra-envs', json=params)
+
+    def create_manifest(self, cluster_id, params):
+        return self.call('POST', '/clusters/' + cluster_id + '/manifests', json=params)
+
+    def update_host(self, infra_env_id, host_id, data):
+        return self.call('PATCH', '/infra-envs/' + infra_env_id + '/hosts/' + host_id, json=data)
+
+    def install_cluster(self, cluster_id):
+        return self.call('POST', '/clusters/' + cluster_id + '/actions/install')
+
+    def reset_cluster(self, cluster_id):
+        return self.call('POST', '/clusters/' + cluster_id + '/actions/reset')
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+import os
+import re
+import tempfile
+import time
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedError
+
+DEFAULT_CACHE = '~/.cache/agonzalezrh.install_openshift/catalog.json'
+DEFAULT_TTL = 86400
+
+VERSION_RE = re.compile(r'^(\d+)\.(\d+)(?:\.(\d+))?(-\S+)?$')
+MINOR_RE = re.compile(r'^\d+\.\d+$')
+
+
+def version_key(version):
+    # "4.14.10" sorts after "4.14.9", a pre-release before its release
+    match = VERSION_RE.match(version or '')
+    if match is None:
+        return (-1, -1, -1, 0)
+    major, minor, patch, suffix = match.groups()
+    return (int(major), int(minor), int(patch or 0), 0 if suffix and suffix != '-multi' else 1)
+
+
+class Catalog(object):
+    # OpenShift versions and supported operators of one API, see load()
+
+    def __init__(self, versions, operators, fetched_at=None):
+        self.versions = versions or {}
+        self.operators = operators or []
+        self.fetched_at = fetched_at
+        self.entries = []
+        # Filled by validate() for versions accepted without being listed
+        self.warnings = []
+        # GET /openshift-versions answers a map keyed by version, older
+        # services a list of release images
+        items = self.versions.items() if isinstance(self.versions, dict) else [
+            (item.get('openshift_version'), item) for item in self.versions]
+        for key, info in items:
+            full = (info.get('display_name') or info.get('version') or key or '').split(' ')[0]
+            if VERSION_RE.match(full) is None:
+                full = key
+            multi = '-multi' in (key or '') or '-multi' in full or 'multi' in (info.get('cpu_architectures') or [])
+            # Multi-architecture releases keep their "-multi" version, the
+            # service only knows them by it
+            self.entries.append(dict(key=key, version=full, multi=multi, info=info))
+
+    def resolve(self, version, cpu_architecture=None):
+        # Returns the catalog entry for version, resolving "4.14" to its latest
+        # patch, or None when the catalog does not know it. A patch missing
+        # from a catalog listing only the latest ones is accepted as is and
+        # flagged unlisted, one newer than the latest listed is a typo.
+        multi = cpu_architecture == 'multi'
+        entries = [entry for entry in self.entries if entry['multi'] == multi] or self.entries
+        if not MINOR_RE.match(version):
+            for entry in entries:
+                if version in (entry['key'], entry['version']) or version + '-multi' == entry['version']:
+                    return entry
+        match = VERSION_RE.match(version)
+        if match is None:
+            return None
+        minor = '%s.%s' % match.groups()[:2]
+        matches = [entry for entry in entries
+                   if entry['version'] == minor or entry['version'].startswith(minor + '.')]
+        if not matches:
+            return None
+        latest = max(matches, key=lambda entry: version_key(entry['version']))
+        if MINOR_RE.match(version):
+            return latest
+        if version_key(version)[:3] > version_key(latest['version'])[:3]:
+            return None
+        if latest['version'].endswith('-multi') and not version.endswith('-multi'):
+            version += '-multi'
+        return dict(latest, version=version, unlisted=latest['version'])
+
+    def architectures(self, entry):
+        info = entry['info']
+        architectures = info.get('cpu_architectures') or [info.get('cpu_architecture') or 'x86_64']
+        if entry['multi']:
+            architectures = list(architectures) + ['multi']
+        return architectures
+
+    def validate(self, params):
+        # Returns (errors, changes) for the openshift_version,
+        # cpu_architecture and olm_operators of params
+        errors = []
+        changes = {}
+        version = params.get('openshift_version')
+        architecture = params.get('cpu_architecture')
+        if version:
+            entry = self.resolve(version, architecture)
+            if entry is None:
+                known = sorted(set(e['version'] for e in self.entries), key=lambda v: (version_key(v), v))
+                errors.append('openshift_version %s is not available, known versions: %s' % (version, ', '.join(known)))
+            else:
+                if entry['version'] != version:
+                    changes['openshift_version'] = entry['version']
+                if entry.get('unlisted'):
+                    self.warnings.append('openshift_version %s is not listed by the API, the latest listed release is %s' % (
+                        entry['version'], entry['unlisted']))
+                if architecture and architecture not in self.architectures(entry):
+                    errors.append('cpu_architecture %s is not available for OpenShift %s, use one of: %s' % (
+                        architecture, entry['version'], ', '.join(self.architectures(entry))))
+        for operator in params.get('olm_operators') or []:
+            name = operator.get('name') if isinstance(operator, dict) else operator
+            if self.operators and name not in self.operators:
+                errors.append('olm_operators %s is not supported, use one of: %s' % (name, ', '.join(sorted(self.operators))))
+        return errors, changes
+
+
+def _read_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _write_cache(path, data):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.catalog-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp, path)
+
+
+def load(client, path=DEFAULT_CACHE, ttl=DEFAULT_TTL, now=None, offline=False):
+    # Catalog of client.api_url from the cache file when younger than ttl
+    # seconds, fetched again otherwise. A stale cache is used when the fetch
+    # fails or offline is set, None is returned when there is nothing to use.
+    if now is None:
+        now = time.time()
+    path = os.path.expanduser(path) if path else None
+    cache = _read_cache(path) if path else {}
+    cached = cache.get(client.api_url)
+    if cached is not None and now - cached.get('fetched_at', 0) < ttl:
+        return Catalog(cached.get('versions'), cached.get('operators'), cached.get('fetched_at'))
+    if offline:
+        if cached is not None:
+            return Catalog(cached.get('versions'), cached.get('operators'), cached.get('fetched_at'))
+        return None
+    try:
+        versions = client.call('GET', '/openshift-versions')
+        operators = client.call('GET', '/supported-operators')
+    except (AssistedError, ValueError):
+        if cached is not None:
+            return Catalog(cached.get('versions'), cached.get('operators'), cached.get('fetched_at'))
+        return None
+    if path:
+        cache[client.api_url] = dict(fetched_at=now, versions=versions, operators=operators)
+        try:
+            _write_cache(path, cache)
+        except (IOError, OSError):
+            pass
+    return Catalog(versions, operators, now)
+
+
+def open_catalog(module, client, offline=False):
+    # Catalog for the catalog doc fragment options, None when validate_catalog is off
+    if not module.params.get('validate_catalog'):
+        return None
+    catalog = load(client, module.params.get('catalog_cache'), module.params.get('catalog_ttl'), offline=offline)
+    if catalog is None:
+        module.warn('The OpenShift version catalog could not be fetched, versions and operators are not validated')
+    return catalog
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Check mode of the modules that change objects: the requests a real run
+# would send are returned as a plan instead, with a diff per created, updated
+# or deleted object. The state they are planned against comes from the state
+# store when its last full listing is at most max_age seconds old, so neither
+# SSO nor the API are contacted, or from one read-only request otherwise.
+
+MASK = '********'
+
+# Body fields never shown in plans and diffs
+SECRET_FIELDS = ('pull_secret',)
+
+
+def mask(body):
+    masked = dict(body)
+    for key in SECRET_FIELDS:
+        if masked.get(key):
+            masked[key] = MASK
+    return masked
+
+
+def planned(method, path, body=None):
+    # One request of the plan
+    entry = dict(method=method, path=path)
+    if body is not None:
+        entry['body'] = mask(body)
+    return entry
+
+
+def is_fresh(store, kind, max_age):
+    return store is not None and max_age is not None and store.is_fresh(kind, max_age)
+
+
+def exit_plan(module, result, plan, diffs, source):
+    # source tells where the current state came from: state_store or api
+    result['changed'] = bool(plan)
+    result['plan'] = plan
+    result['plan_source'] = source
+    if module._diff:
+        result['diff'] = diffs
+    module.exit_json(**result)
+
+
+def creation_diff(kind, name, body, existing=None):
+    # A create always adds a new object, objects with the same name stay.
+    # Options left unset are sent as null, the diff leaves them out.
+    header = '%s %s' % (kind, name)
+    if existing:
+        header += ' (%d existing with this name: %s)' % (len(existing), ', '.join(item['id'] for item in existing))
+    after = dict((key, value) for key, value in mask(body).items() if value is not None)
+    return dict(before={}, after=after, before_header=header, after_header=header)
+
+
+def deletion_diff(kind, name, existing=None):
+    # The object as last known, gone after the DELETE
+    header = '%s %s' % (kind, name)
+    before = dict((key, value) for key, value in (existing or {}).items()
+                  if key in ('id', 'name', 'status', 'cluster_id', 'openshift_version') and value is not None)
+    return dict(before=before, after={}, before_header=header, after_header=header)
+
+
+def update_diff(kind, name, before, body):
+    # Only the fields the PATCH sets are shown, with their current value
+    header = '%s %s' % (kind, name)
+    return dict(before=before, after=mask(body), before_header=header, after_header=header)
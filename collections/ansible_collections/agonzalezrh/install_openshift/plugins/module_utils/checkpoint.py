@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+import os
+import tempfile
+import time
+
+# Cluster statuses meaning the install action was already accepted
+INSTALL_STARTED_STATUSES = (
+    "preparing-for-installation",
+    "installing",
+    "installing-pending-user-action",
+    "finalizing",
+    "installed",
+)
+
+
+class Checkpoint(object):
+    # JSON file recording the progress of a wait so that a rerun of the same
+    # task resumes it instead of starting over. A checkpoint only applies to
+    # the same kind of wait on the same cluster.
+
+    def __init__(self, path, kind, cluster_id):
+        self.path = os.path.expanduser(path) if path else None
+        self.kind = kind
+        self.cluster_id = cluster_id
+        self.data = None
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, ValueError):
+            return None
+        if data.get('kind') != self.kind or data.get('cluster_id') != self.cluster_id:
+            return None
+        self.data = data
+        return data
+
+    def start(self, wait_timeout, now=None):
+        # Reuse the deadline of a previous run, otherwise start a new one. A
+        # deadline that already passed belongs to a wait that gave up, the
+        # rerun gets the full wait_timeout again
+        if now is None:
+            now = time.time()
+        if self.data is not None and self.data.get('deadline', 0) <= now:
+            self.data = None
+        if self.data is None:
+            self.data = dict(
+                kind=self.kind,
+                cluster_id=self.cluster_id,
+                started_at=now,
+                deadline=now + wait_timeout,
+                last_status=None,
+                last_status_updated_at=None,
+            )
+            self.save()
+        return self.data['deadline']
+
+    def update(self, status, status_updated_at=None):
+        if self.data is None:
+            return
+        if status == self.data.get('last_status') and status_updated_at == self.data.get('last_status_updated_at'):
+            return
+        self.data['last_status'] = status
+        self.data['last_status_updated_at'] = status_updated_at
+        self.save()
+
+    def note(self, **values):
+        # Extra progress kept in the file, such as the hosts still missing,
+        # saved only when it changed
+        if self.data is None:
+            return
+        changed = dict((key, value) for key, value in values.items() if self.data.get(key) != value)
+        if changed:
+            self.data.update(changed)
+            self.save()
+
+    def save(self):
+        if self.path is None or self.data is None:
+            return
+        self.data['updated_at'] = time.time()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.checkpoint-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.data, f)
+        os.rename(tmp, self.path)
+
+    def clear(self):
+        self.data = None
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
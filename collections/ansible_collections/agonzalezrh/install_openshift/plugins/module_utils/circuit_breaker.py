@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import TransientError
+
+
+class CircuitBreaker(object):
+    # Rides out API outages during the wait loops. The breaker opens on the
+    # first transient failure and retries with a doubling delay. It gives up
+    # once the outage lasts longer than budget seconds or the deadline passes.
+    # Real errors (4xx, "code" answers) are raised at once.
+
+    def __init__(self, client, budget, delay=5, max_delay=60):
+        self.client = client
+        self.budget = budget
+        self.delay = delay
+        self.max_delay = max_delay
+        self.opened_at = None
+        self.failures = 0
+        self.outages = []
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def _close(self):
+        if self.opened_at is not None:
+            self.outages[-1]['duration'] = round(self.client.clock() - self.opened_at, 1)
+        self.opened_at = None
+        self.failures = 0
+
+    def _open(self, error):
+        now = self.client.clock()
+        if self.opened_at is None:
+            self.opened_at = now
+            self.outages.append(dict(started=round(now - self.client.started, 1), duration=None, failures=0))
+        self.failures += 1
+        self.outages[-1]['failures'] = self.failures
+        self.outages[-1]['last_error'] = error.msg + str(error.result.get('reason', ''))
+
+    def call(self, func, *args, **kwargs):
+        deadline = kwargs.pop('deadline', None)
+        while True:
+            try:
+                value = func(*args, **kwargs)
+            except TransientError as e:
+                self._open(e)
+                now = self.client.clock()
+                outage = now - self.opened_at
+                if outage >= self.budget or (deadline is not None and now >= deadline):
+                    self.outages[-1]['duration'] = round(outage, 1)
+                    raise TransientError(
+                        'API unavailable for %d seconds (%d failures), last error: %s' % (
+                            outage, self.failures, self.outages[-1]['last_error']), e.result)
+                wait = min(self.delay * 2 ** (self.failures - 1), self.max_delay, self.opened_at + self.budget - now)
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+                self.client.sleep(max(wait, 0))
+                continue
+            self._close()
+            return value
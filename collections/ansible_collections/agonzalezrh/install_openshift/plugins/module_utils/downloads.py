@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import hashlib
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import (
+    TRANSIENT_STATUSES, AssistedError, _transient_error)
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.cassette import redact_url
+
+CHUNK_SIZE = 1024 * 1024
+
+# Written next to every streamed file, the validators it was downloaded with
+META_SUFFIX = '.download.json'
+
+
+def fetch(client, cluster_id, kind, file_name):
+    # kind is "files" or "credentials"
+    response = client.request(
+        "GET",
+        "/clusters/" + cluster_id + "/downloads/" + kind,
+        params={'file_name': file_name}
+    )
+    if response.status_code in TRANSIENT_STATUSES:
+        raise _transient_error(response)
+    if response.status_code >= 400:
+        try:
+            error = response.json()
+        except ValueError:
+            error = None
+        if not isinstance(error, dict):
+            error = {'reason': response.text}
+        error.setdefault('code', str(response.status_code))
+        raise AssistedError('Request failed: ', error)
+    return response.content
+
+
+def fetch_all(client, cluster_id, kind, file_names, max_workers=5):
+    # Contents in the order of file_names, all the GETs share the client session
+    if len(file_names) == 1:
+        return [fetch(client, cluster_id, kind, file_names[0])]
+    with ThreadPoolExecutor(max_workers=min(len(file_names), max_workers)) as executor:
+        futures = [executor.submit(fetch, client, cluster_id, kind, file_name) for file_name in file_names]
+        return [future.result() for future in futures]
+
+
+def write(module, dest, content):
+    # Replaces dest atomically when content differs, returns whether it changed
+    if os.path.exists(dest):
+        with open(dest, 'rb') as f:
+            if f.read() == content:
+                return False
+    if module.check_mode:
+        return True
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix='.download-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    module.atomic_move(tmp, dest)
+    return True
+
+
+def download(module, client, kind):
+    # Implements download_files and download_credentials, a single
+    # file_name/dest pair or a files list fetched concurrently. With the wait
+    # option the GETs are retried until they all succeed, nothing is written before.
+    if module.params['files']:
+        files = module.params['files']
+    else:
+        files = [dict(file_name=module.params['file_name'], dest=module.params['dest'])]
+
+    def fetch_files():
+        return fetch_all(client, module.params['cluster_id'], kind, [item['file_name'] for item in files])
+
+    attempts = 1
+    if module.params.get('wait'):
+        contents, attempts = client.wait_until(
+            fetch_files, module.params['wait_timeout'], module.params['delay'], module.params['max_delay'])
+    else:
+        contents = fetch_files()
+    downloaded = []
+    for item, content in zip(files, contents):
+        try:
+            changed = write(module, item['dest'], content)
+        except (IOError, OSError) as e:
+            raise AssistedError('ERROR: ' + str(e))
+        downloaded.append(dict(file_name=item['file_name'], dest=item['dest'], changed=changed, size=len(content)))
+    return downloaded, contents, attempts
+
+
+def _read_meta(dest):
+    if not os.path.exists(dest):
+        return None
+    try:
+        with open(dest + META_SUFFIX) as f:
+            meta = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if meta.get('size') != os.path.getsize(dest):
+        return None
+    return meta
+
+
+def _validators(response):
+    # Content-Length is the size on disk unless the body is encoded
+    size = None
+    if 'Content-Length' in response.headers and not response.headers.get('Content-Encoding'):
+        size = int(response.headers['Content-Length'])
+    return dict(
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified'),
+        size=size,
+    )
+
+
+def _unchanged(meta, validators):
+    # The file on disk is what the server has when it announces the same
+    # ETag or Last-Modified, and the same size when it tells it
+    if meta is None or not (validators['etag'] or validators['last_modified']):
+        return False
+    if validators['size'] is not None and validators['size'] != meta['size']:
+        return False
+    return all(meta.get(key) == validators[key] for key in ('etag', 'last_modified') if validators[key])
+
+
+def stream(module, client, url, dest, chunk_size=CHUNK_SIZE):
+    # Streams a presigned URL to dest without holding the body in memory.
+    # The GET is conditional on the validators of the previous download, a
+    # file the server did not change is neither read nor written again.
+    meta = _read_meta(dest)
+    headers = {}
+    if meta is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    response = client.get_presigned(url, stream=True, headers=headers)
+    try:
+        if response.status_code == 304 and meta is not None:
+            return dict(dest=dest, changed=False, size=meta['size'], sha256=meta.get('sha256'))
+        if response.status_code >= 400:
+            raise AssistedError('Download failed: ', {
+                'code': str(response.status_code), 'reason': redact_url(response.url or url)})
+        validators = _validators(response)
+        if _unchanged(meta, validators):
+            return dict(dest=dest, changed=False, size=meta['size'], sha256=meta.get('sha256'))
+        if module.check_mode:
+            return dict(dest=dest, changed=True, size=validators['size'], sha256=None)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix='.download-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.remove(tmp)
+            raise
+    finally:
+        response.close()
+    if validators['size'] is not None and size != validators['size']:
+        os.remove(tmp)
+        raise AssistedError('Download failed: ', {
+            'code': 'truncated', 'reason': '%s: got %d of %d bytes' % (dest, size, validators['size'])})
+    module.atomic_move(tmp, dest)
+    validators.update(size=size, sha256=digest.hexdigest())
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)), prefix='.download-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(validators, f)
+    module.atomic_move(tmp, dest + META_SUFFIX)
+    return dict(dest=dest, changed=True, size=size, sha256=validators['sha256'])
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Drift between the parameters given to create_cluster/create_infra_env and
+# the live objects. Both sides are brought to the same canonical form, one
+# per section, and only sections whose digests differ are compared field by
+# field. Only what the desired spec sets is compared, values left to the
+# service defaults are not drift.
+import hashlib
+import ipaddress
+import json
+import re
+
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+SECTIONS = ('networking', 'proxy', 'operators', 'static_network_config')
+
+# Separators of the per-host entries of a stored static network config
+STATIC_NETWORK_CONFIG_DELIMITER_RE = re.compile(r'ZZZZZ|HOST_STATIC_NETWORK_CONFIG')
+
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')).hexdigest()
+
+
+def _cidr(value):
+    try:
+        return str(ipaddress.ip_network(u'%s' % value, strict=False))
+    except ValueError:
+        return value
+
+
+def _ip(value):
+    try:
+        return str(ipaddress.ip_address(u'%s' % value))
+    except ValueError:
+        return value
+
+
+def _sorted(items):
+    return sorted(items, key=lambda item: json.dumps(item, sort_keys=True, default=str))
+
+
+def _networks(items, host_prefix=False):
+    networks = []
+    for item in items or []:
+        network = dict(cidr=_cidr(item.get('cidr')))
+        if host_prefix:
+            network['host_prefix'] = item.get('host_prefix')
+        networks.append(network)
+    return _sorted(networks)
+
+
+def _vips(items):
+    return sorted(_ip(item['ip'] if isinstance(item, dict) else item) for item in items or [])
+
+
+def _no_proxy(value):
+    return ','.join(sorted(set(entry.strip() for entry in (value or '').split(',') if entry.strip())))
+
+
+def _proxy(source):
+    proxy = {}
+    for key in ('http_proxy', 'https_proxy'):
+        if source.get(key) is not None:
+            proxy[key] = source[key] or ''
+    if source.get('no_proxy') is not None:
+        proxy['no_proxy'] = _no_proxy(source['no_proxy'])
+    return proxy
+
+
+def _network_yaml(text):
+    # Whitespace, key order and quoting of the nmstate YAML do not matter
+    if HAS_YAML:
+        try:
+            return yaml.safe_load(text)
+        except yaml.YAMLError:
+            pass
+    return '\n'.join(line.rstrip() for line in (text or '').strip().splitlines())
+
+
+def parse_static_network_config(value):
+    # The service returns the field as it stores it: one JSON object per
+    # host, sorted and joined by a delimiter (ZZZZZ, HOST_STATIC_NETWORK_CONFIG
+    # in some releases), or a JSON list in the releases that store JSON
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, list):
+        return parsed
+    if isinstance(parsed, dict):
+        return [parsed]
+    hosts = []
+    for entry in STATIC_NETWORK_CONFIG_DELIMITER_RE.split(value):
+        if entry.strip():
+            hosts.append(json.loads(entry))
+    return hosts
+
+
+def _static_network_config(value):
+    if isinstance(value, str):
+        try:
+            value = parse_static_network_config(value)
+        except ValueError:
+            # Unknown format, compared as is
+            return value
+    hosts = []
+    for host in value or []:
+        interfaces = _sorted(
+            dict(mac_address=(item.get('mac_address') or '').lower(), logical_nic_name=item.get('logical_nic_name'))
+            for item in host.get('mac_interface_map') or []
+        )
+        hosts.append(dict(network_yaml=_network_yaml(host.get('network_yaml')), mac_interface_map=interfaces))
+    return _sorted(hosts)
+
+
+def desired_sections(cluster, infra_env=None):
+    # Canonical sections of the create_cluster and create_infra_env
+    # parameters, a section the spec does not touch is left out
+    cluster = cluster or {}
+    infra_env = infra_env or {}
+    sections = {}
+
+    networking = {}
+    if cluster.get('cluster_networks') is not None:
+        networking['cluster_networks'] = _networks(cluster['cluster_networks'], host_prefix=True)
+    elif cluster.get('cluster_network_cidr') is not None:
+        networking['cluster_networks'] = _networks(
+            [dict(cidr=cluster['cluster_network_cidr'], host_prefix=cluster.get('cluster_network_host_prefix'))],
+            host_prefix=True)
+    if cluster.get('service_networks') is not None:
+        networking['service_networks'] = _networks(cluster['service_networks'])
+    elif cluster.get('service_network_cidr') is not None:
+        networking['service_networks'] = _networks([dict(cidr=cluster['service_network_cidr'])])
+    if cluster.get('machine_networks') is not None:
+        networking['machine_networks'] = _networks(cluster['machine_networks'])
+    for key in ('api_vips', 'ingress_vips'):
+        if cluster.get(key) is not None:
+            networking[key] = _vips(cluster[key])
+        elif cluster.get(key[:-1]) is not None:
+            networking[key] = _vips([cluster[key[:-1]]])
+    for key in ('network_type', 'vip_dhcp_allocation'):
+        if cluster.get(key) is not None:
+            networking[key] = cluster[key]
+    if networking:
+        sections['networking'] = networking
+
+    proxy = {}
+    if _proxy(cluster):
+        proxy['cluster'] = _proxy(cluster)
+    if infra_env.get('proxy') is not None:
+        proxy['infra_env'] = _proxy(infra_env['proxy'])
+    if proxy:
+        sections['proxy'] = proxy
+
+    if cluster.get('olm_operators') is not None:
+        sections['operators'] = sorted(operator['name'] for operator in cluster['olm_operators'])
+
+    if infra_env.get('static_network_config') is not None:
+        sections['static_network_config'] = _static_network_config(infra_env['static_network_config'])
+    return sections
+
+
+def live_sections(desired, cluster, infra_env=None):
+    # The same sections read from the live objects, with the fields of desired only
+    cluster = cluster or {}
+    infra_env = infra_env or {}
+    sections = {}
+    if 'networking' in desired:
+        networking = {}
+        for key in desired['networking']:
+            if key == 'cluster_networks':
+                networking[key] = _networks(cluster.get(key), host_prefix=True)
+            elif key in ('service_networks', 'machine_networks'):
+                networking[key] = _networks(cluster.get(key))
+            elif key in ('api_vips', 'ingress_vips'):
+                networking[key] = _vips(cluster.get(key))
+            else:
+                networking[key] = cluster.get(key)
+        sections['networking'] = networking
+    if 'proxy' in desired:
+        proxy = {}
+        for kind, source in (('cluster', cluster), ('infra_env', infra_env.get('proxy') or {})):
+            if kind in desired['proxy']:
+                proxy[kind] = _proxy(dict((key, source.get(key) or '') for key in desired['proxy'][kind]))
+        sections['proxy'] = proxy
+    if 'operators' in desired:
+        # The service adds the dependencies of the operators asked for (lso
+        # for odf), only the desired operators missing from the cluster drift
+        installed = set(operator['name'] for operator in cluster.get('monitored_operators') or []
+                        if operator.get('operator_type') == 'olm')
+        sections['operators'] = [name for name in desired['operators'] if name in installed]
+    if 'static_network_config' in desired:
+        sections['static_network_config'] = _static_network_config(infra_env.get('static_network_config'))
+    return sections
+
+
+def differences(desired, live):
+    # Fields of one section that differ, keyed by field name
+    if isinstance(desired, dict) and isinstance(live, dict):
+        changed = {}
+        for key in sorted(set(desired) | set(live)):
+            if desired.get(key) != live.get(key):
+                changed[key] = dict(desired=desired.get(key), live=live.get(key))
+        return changed
+    return dict(value=dict(desired=desired, live=live))
+
+
+def compare(desired, live, sections=SECTIONS):
+    # Digests of every compared section, and the differences of the ones whose digests differ
+    digests = {}
+    drift = {}
+    for section in sections:
+        if section not in desired:
+            continue
+        desired_digest = digest(desired[section])
+        live_digest = digest(live.get(section))
+        digests[section] = dict(desired=desired_digest, live=live_digest)
+        if desired_digest != live_digest:
+            drift[section] = differences(desired[section], live.get(section))
+    return digests, drift
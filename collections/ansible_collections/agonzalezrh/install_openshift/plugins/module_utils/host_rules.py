@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+GB = 1000 ** 3
+
+# Sorting keys for the role rules, hosts without the value go last
+ORDER_KEYS = {
+    'mac': lambda host: (min(host.macs) if host.macs else '~'),
+    'hostname': lambda host: (host.hostname or '~'),
+    'serial': lambda host: (min(host.serials) if host.serials else '~'),
+}
+
+
+def _eligible(disk):
+    eligibility = disk.get('installation_eligibility')
+    if eligibility is None:
+        return True
+    return bool(eligibility.get('eligible'))
+
+
+def disk_id(disk):
+    # Identifier of a disk in disks_selected_config, disks without a by-id
+    # link are known by their by-path link or device path
+    return disk.get('id') or disk.get('by_path') or disk.get('path')
+
+
+def select_disk(host, rule):
+    # Returns the disk of host matching the installation_disk rule, or None
+    candidates = []
+    for disk in host.disks:
+        if not _eligible(disk) or disk.get('drive_type') == 'ODD' or not disk_id(disk):
+            continue
+        size = disk.get('size_bytes') or 0
+        if rule.get('min_size_gb') and size < rule['min_size_gb'] * GB:
+            continue
+        if rule.get('max_size_gb') and size > rule['max_size_gb'] * GB:
+            continue
+        if rule.get('rotational') is not None and (disk.get('drive_type') == 'HDD') != rule['rotational']:
+            continue
+        candidates.append((size, disk_id(disk), disk))
+    if not candidates:
+        return None
+    candidates.sort(key=lambda candidate: (candidate[0], candidate[1]))
+    if rule.get('prefer') == 'largest':
+        return candidates[-1][2]
+    return candidates[0][2]
+
+
+def assign(index, host_rules, expected_hosts=None, skip=None):
+    # Evaluates the rules over all the hosts of one poll and returns the
+    # target {host_id: {'role': ..., 'disk': ...}}. Role rules only run once
+    # every expected host was discovered so "first N" is stable.
+    skip = skip or set()
+    targets = {}
+    hosts = [host for host in index if host.hostname not in skip]
+    role_rules = host_rules.get('roles') or []
+    if role_rules and len(index) >= (expected_hosts or 0):
+        unassigned = list(hosts)
+        for rule in role_rules:
+            pattern = re.compile(rule['hostname_regex']) if rule.get('hostname_regex') else None
+            matched = [host for host in unassigned if pattern is None or pattern.search(host.hostname or '')]
+            # Hosts already holding the role keep it, so a host discovered
+            # later never takes it over, the others follow order_by
+            order = ORDER_KEYS[rule.get('order_by') or 'mac']
+            matched.sort(key=lambda host: (host.role != rule['role'], order(host), host.id))
+            if rule.get('count') is not None:
+                matched = matched[:rule['count']]
+            for host in matched:
+                targets.setdefault(host.id, {})['role'] = rule['role']
+            assigned = set(host.id for host in matched)
+            unassigned = [host for host in unassigned if host.id not in assigned]
+    disk_rule = host_rules.get('installation_disk')
+    if disk_rule:
+        for host in hosts:
+            disk = select_disk(host, disk_rule)
+            if disk is not None:
+                targets.setdefault(host.id, {})['disk'] = disk
+    return targets
+
+
+def plan(index, host_rules, expected_hosts=None, skip=None):
+    # (host, PATCH body) for every host whose role or disk differs from the target
+    patches = []
+    if not host_rules:
+        return patches
+    for host_id, target in assign(index, host_rules, expected_hosts, skip).items():
+        host = index.by_id[host_id]
+        data = {}
+        if 'role' in target and host.role != target['role']:
+            data["host_role"] = target['role']
+        installation_disk = (host.data.get('installation_disk_id'), host.data.get('installation_disk_path'))
+        if 'disk' in target and disk_id(target['disk']) not in installation_disk:
+            data["disks_selected_config"] = [{"id": disk_id(target['disk']), "role": "install"}]
+        if data:
+            patches.append((host, data))
+    return patches
+
+
+def merge(*patch_lists):
+    # One body per host, the first list that sets a field wins
+    merged = {}
+    order = []
+    for patches in patch_lists:
+        for host, data in patches:
+            if host.id not in merged:
+                merged[host.id] = (host, {})
+                order.append(host.id)
+            for key, value in data.items():
+                merged[host.id][1].setdefault(key, value)
+    return [merged[host_id] for host_id in order]
+
+
+def apply(client, infra_env_id, patches, max_workers=5):
+    # Sends the PATCHes of one poll together, AssistedError is raised on the first failure
+    if not patches:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(patches), max_workers)) as executor:
+        futures = [executor.submit(client.update_host, infra_env_id, host.id, data) for host, data in patches]
+        return [future.result() for future in futures]
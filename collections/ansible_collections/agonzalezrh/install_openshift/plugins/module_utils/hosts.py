@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+
+# Decoded inventories by host ID, kept with the updated_at they belong to so
+# that a wait loop only decodes the inventory of the hosts that changed. The
+# cache starts over once it holds INVENTORY_CACHE_SIZE hosts.
+INVENTORY_CACHE_SIZE = 1000
+_INVENTORY_CACHE = {}
+
+
+def clear_inventory_cache():
+    _INVENTORY_CACHE.clear()
+
+
+class Host(object):
+    # Thin view over a host returned by the API. The inventory, a JSON string
+    # inside the JSON, is only decoded when one of its fields is needed.
+    __slots__ = ('data', '_inventory')
+
+    def __init__(self, data):
+        self.data = data
+        self._inventory = None
+
+    @property
+    def id(self):
+        return self.data.get('id')
+
+    @property
+    def status(self):
+        return self.data.get('status')
+
+    @property
+    def role(self):
+        return self.data.get('role')
+
+    @property
+    def hostname(self):
+        return self.data.get('requested_hostname') or self.inventory.get('hostname')
+
+    @property
+    def inventory(self):
+        if self._inventory is None:
+            updated_at = self.data.get('updated_at')
+            cached = _INVENTORY_CACHE.get(self.id)
+            if cached is not None and cached[0] == updated_at and updated_at is not None:
+                self._inventory = cached[1]
+            else:
+                try:
+                    self._inventory = json.loads(self.data.get('inventory') or '{}')
+                except ValueError:
+                    self._inventory = {}
+                if self.id not in _INVENTORY_CACHE and len(_INVENTORY_CACHE) >= INVENTORY_CACHE_SIZE:
+                    clear_inventory_cache()
+                _INVENTORY_CACHE[self.id] = (updated_at, self._inventory)
+        return self._inventory
+
+    @property
+    def macs(self):
+        return [
+            interface['mac_address'].lower()
+            for interface in self.inventory.get('interfaces') or []
+            if interface.get('mac_address')
+        ]
+
+    @property
+    def disks(self):
+        return self.inventory.get('disks') or []
+
+    @property
+    def serials(self):
+        serials = [disk['serial'] for disk in self.disks if disk.get('serial')]
+        system_serial = (self.inventory.get('system_vendor') or {}).get('serial_number')
+        if system_serial:
+            serials.append(system_serial)
+        return serials
+
+    @property
+    def cpu_count(self):
+        return (self.inventory.get('cpu') or {}).get('count', 0)
+
+    @property
+    def memory_bytes(self):
+        return (self.inventory.get('memory') or {}).get('physical_bytes', 0)
+
+
+class HostIndex(object):
+    # Hosts of one poll indexed by ID, hostname, MAC address and serial.
+    # The MAC and serial indexes need the inventories and are built on first use.
+    __slots__ = ('hosts', 'by_id', '_by_hostname', '_by_mac', '_by_serial')
+
+    def __init__(self, hosts):
+        self.hosts = [Host(host) for host in hosts or []]
+        self.by_id = dict((host.id, host) for host in self.hosts)
+        self._by_hostname = None
+        self._by_mac = None
+        self._by_serial = None
+
+    def __iter__(self):
+        return iter(self.hosts)
+
+    def __len__(self):
+        return len(self.hosts)
+
+    @property
+    def by_hostname(self):
+        if self._by_hostname is None:
+            self._by_hostname = dict((host.hostname, host) for host in self.hosts)
+        return self._by_hostname
+
+    @property
+    def by_mac(self):
+        if self._by_mac is None:
+            self._by_mac = {}
+            for host in self.hosts:
+                for mac in host.macs:
+                    self._by_mac[mac] = host
+        return self._by_mac
+
+    @property
+    def by_serial(self):
+        if self._by_serial is None:
+            self._by_serial = {}
+            for host in self.hosts:
+                for serial in host.serials:
+                    self._by_serial[serial] = host
+        return self._by_serial
+
+    def find(self, hostname=None, mac=None, serial=None):
+        if hostname is not None:
+            return self.by_hostname.get(hostname)
+        if mac is not None:
+            return self.by_mac.get(mac.lower())
+        if serial is not None:
+            return self.by_serial.get(serial)
+        return None
+
+    def count(self, status):
+        return len([host for host in self.hosts if host.status == status])
+
+
+def host_state(host, identity=None):
+    # What is known of a host that is not ready yet
+    return dict(id=identity or host.id, hostname=host.hostname, status=host.status,
+                status_info=host.data.get('status_info'))
+
+
+class ExpectedHosts(object):
+    # Hosts a wait expects, by MAC address, hostname or serial number
+
+    def __init__(self, macs=None, hostnames=None, serials=None):
+        self.identities = (
+            [('mac', mac.lower()) for mac in macs or []]
+            + [('hostname', hostname) for hostname in hostnames or []]
+            + [('serial', serial) for serial in serials or []]
+        )
+
+    def __len__(self):
+        return len(self.identities)
+
+    def match(self, index, status='known'):
+        # Returns the expected hosts in status, a state per expected host
+        # that is not, and the hostnames of the hosts nobody expects
+        ready = []
+        missing = []
+        seen = set()
+        for kind, value in self.identities:
+            identity = '%s=%s' % (kind, value)
+            host = index.find(**{kind: value})
+            if host is None:
+                missing.append(dict(id=identity, hostname=None, status='not discovered', status_info=None))
+                continue
+            seen.add(host.id)
+            if host.status == status:
+                ready.append(host)
+            else:
+                missing.append(host_state(host, identity))
+        unexpected = sorted(host.hostname or host.id for host in index if host.id not in seen)
+        return ready, missing, unexpected
+
+
+def configure_host_patch(host, configure_host):
+    # Returns the single PATCH body that brings host in line with its
+    # configure_hosts entry, or None when nothing has to change
+    data = {}
+    if configure_host.get('role') and host.role != configure_host['role']:
+        data["host_role"] = configure_host['role']
+    if "installation_disk" in configure_host:
+        if host.data.get('installation_disk_path') != configure_host['installation_disk']:
+            data["disks_selected_config"] = [{"id": configure_host['installation_disk'], "role": "install"}]
+    return data or None
+
+
+def configure_hosts_patches(index, configure_hosts):
+    # (host, body) for every configured host present in index that needs a PATCH
+    patches = []
+    for configure_host in configure_hosts or []:
+        host = index.find(hostname=configure_host['hostname'])
+        if host is None:
+            continue
+        data = configure_host_patch(host, configure_host)
+        if data is not None:
+            patches.append((host, data))
+    return patches
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import time
+from collections import OrderedDict
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.hosts import Host
+
+# Host installation stages after which nothing moves anymore
+TERMINAL_STAGES = ('Done', 'Failed')
+
+# Stages where a host waits for the others, as long as they take, never stuck
+WAITING_STAGES = ('Waiting for control plane', 'Waiting for bootkube', 'Waiting for controller',
+                  'Waiting for ignition')
+
+
+class InstallTimeline(object):
+    # Stages of every host as seen by the polls of install_cluster. Every
+    # time is read from clock, the clock of the client, at the poll that saw
+    # the change: the service times are never mixed in so that clock skew
+    # with the service does not matter.
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.hosts = OrderedDict()
+
+    def observe(self, cluster, now=None):
+        if now is None:
+            now = self.clock()
+        for data in cluster.get('hosts') or []:
+            progress = data.get('progress') or {}
+            stage = progress.get('current_stage')
+            if not stage:
+                continue
+            entry = self.hosts.get(data['id'])
+            if entry is None:
+                entry = self.hosts[data['id']] = dict(
+                    hostname=Host(data).hostname or data['id'], stages=[], progress=None, moved_at=now)
+            if not entry['stages'] or entry['stages'][-1][0] != stage:
+                entry['stages'].append([stage, now])
+            current = (stage, progress.get('progress_info'), progress.get('installation_percentage'))
+            if current != entry['progress']:
+                entry['progress'] = current
+                entry['moved_at'] = now
+            entry['status'] = data.get('status')
+
+    def stuck(self, timeout, now=None):
+        # Hosts whose progress did not change for more than timeout seconds
+        if now is None:
+            now = self.clock()
+        stuck = []
+        for entry in self.hosts.values():
+            stage = entry['stages'][-1][0]
+            if stage in TERMINAL_STAGES or stage in WAITING_STAGES or entry['status'] == 'installed':
+                continue
+            seconds = now - entry['moved_at']
+            if seconds > timeout:
+                stuck.append(dict(hostname=entry['hostname'], stage=stage, seconds=int(seconds)))
+        return stuck
+
+    def report(self, now=None):
+        # Compact timeline: one [stage, started, duration] row per stage,
+        # started in seconds since the first stage of any host
+        if now is None:
+            now = self.clock()
+        starts = [entry['stages'][0][1] for entry in self.hosts.values()]
+        origin = min(starts) if starts else now
+        hosts = OrderedDict()
+        for entry in self.hosts.values():
+            rows = []
+            stages = entry['stages']
+            for index, (stage, started) in enumerate(stages):
+                if index + 1 < len(stages):
+                    duration = round(stages[index + 1][1] - started, 1)
+                elif stage in TERMINAL_STAGES:
+                    duration = None
+                else:
+                    duration = round(now - started, 1)
+                rows.append([stage, round(started - origin, 1), duration])
+            hosts[entry['hostname']] = rows
+        return dict(
+            fields=['stage', 'started', 'duration'],
+            started_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(origin)),
+            hosts=hosts,
+        )
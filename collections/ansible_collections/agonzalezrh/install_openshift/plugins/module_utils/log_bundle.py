@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Log bundles of /clusters/{id}/logs are read as a stream: tarfile walks the
+# members while the response is downloaded, only the members matching the
+# patterns are written to disk. The bundle holds one archive per host, these
+# nested archives are walked the same way, from the stream of the outer one.
+import fnmatch
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+
+NESTED_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.xz')
+
+
+class ChunkReader(object):
+    # Read-only file object over the chunks of a streamed response, every
+    # chunk is also written to tee when given
+
+    def __init__(self, chunks, tee=None):
+        self.chunks = iter(chunks)
+        self.tee = tee
+        self.buf = b''
+        self.pos = 0
+        self.size = 0
+
+    def _next(self):
+        for chunk in self.chunks:
+            if chunk:
+                self.size += len(chunk)
+                if self.tee is not None:
+                    self.tee.write(chunk)
+                return chunk
+        return b''
+
+    def read(self, size=-1):
+        parts = []
+        while size != 0:
+            if self.pos >= len(self.buf):
+                self.buf = self._next()
+                self.pos = 0
+                if not self.buf:
+                    break
+            end = len(self.buf) if size < 0 else min(len(self.buf), self.pos + size)
+            parts.append(self.buf[self.pos:end])
+            if size > 0:
+                size -= end - self.pos
+            self.pos = end
+        return b''.join(parts)
+
+    def drain(self):
+        # Reads what tarfile left after the end of archive marker
+        while self._next():
+            pass
+
+
+def safe_path(dest, name):
+    # Path of a member below dest, None for absolute names and names leaving dest
+    name = posixpath.normpath(name.replace('\\', '/'))
+    if name.startswith('/') or name == '..' or name.startswith('../') or name in ('', '.'):
+        return None
+    return os.path.join(dest, *name.split('/'))
+
+
+def nested_root(name):
+    for suffix in NESTED_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+class BundleWalker(object):
+    # Indexes every member of a log bundle and extracts the ones matching
+    # patterns, fnmatch patterns on the member names. Members of nested
+    # archives are named "archive.tar.gz/member" and extracted below
+    # "archive/". A nested archive matching the patterns is extracted as is.
+
+    def __init__(self, module, dest, patterns, nested=True):
+        self.module = module
+        self.dest = dest
+        self.patterns = patterns or []
+        self.nested = nested
+        self.members = []
+        self.extracted = []
+
+    def matches(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def walk(self, fileobj, prefix='', root=''):
+        tar = tarfile.open(fileobj=fileobj, mode='r|*')
+        try:
+            for member in tar:
+                if not member.isfile():
+                    continue
+                member_name = member.name[2:] if member.name.startswith('./') else member.name
+                name = prefix + member_name
+                entry = dict(name=name, size=member.size, mtime=member.mtime)
+                self.members.append(entry)
+                if self.matches(name):
+                    path = safe_path(self.dest, root + member_name)
+                    if path is not None:
+                        entry['extracted'] = path
+                        self.extract(tar.extractfile(member), path, name, member.size)
+                elif self.nested and nested_root(member_name) is not None:
+                    self.walk(tar.extractfile(member), name + '/', root + nested_root(member_name) + '/')
+        finally:
+            tar.close()
+
+    def extract(self, source, path, name, size):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.extract-')
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(source, f)
+        self.module.atomic_move(tmp, path)
+        self.extracted.append(dict(name=name, dest=path, size=size))
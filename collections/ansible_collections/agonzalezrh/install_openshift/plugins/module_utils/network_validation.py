@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import bisect
+import ipaddress
+
+
+class NetworkIndex(object):
+    # Sorted interval index over a set of CIDRs, one list per IP family.
+    # Overlaps are found with a single sweep and address lookups use bisect,
+    # so hundreds of networks are checked in O(n log n).
+
+    def __init__(self):
+        self._entries = {4: [], 6: []}
+        self._starts = None
+
+    def add(self, network, label):
+        self._entries[network.version].append(
+            (int(network.network_address), int(network.broadcast_address), label, network)
+        )
+        self._starts = None
+
+    def _sort(self):
+        if self._starts is None:
+            self._starts = {}
+            for version, entries in self._entries.items():
+                entries.sort(key=lambda entry: (entry[0], entry[1]))
+                self._starts[version] = [entry[0] for entry in entries]
+
+    def overlaps(self):
+        self._sort()
+        found = []
+        for entries in self._entries.values():
+            widest = None
+            for entry in entries:
+                if widest is not None and entry[0] <= widest[1]:
+                    found.append((widest, entry))
+                if widest is None or entry[1] > widest[1]:
+                    widest = entry
+        return [(first[2], first[3], second[2], second[3]) for first, second in found]
+
+    def lookup(self, address):
+        # Returns the labels of every indexed network containing address
+        self._sort()
+        value = int(address)
+        entries = self._entries[address.version]
+        position = bisect.bisect_right(self._starts[address.version], value)
+        labels = []
+        for entry in reversed(entries[:position]):
+            if entry[0] <= value <= entry[1]:
+                labels.append((entry[2], entry[3]))
+        return labels
+
+
+def _parse_network(value, label, errors):
+    try:
+        return ipaddress.ip_network(u"%s" % value, strict=True)
+    except ValueError as e:
+        errors.append("%s: invalid CIDR %s (%s)" % (label, value, e))
+    return None
+
+
+def _parse_address(value, label, errors):
+    try:
+        return ipaddress.ip_address(u"%s" % value)
+    except ValueError as e:
+        errors.append("%s: invalid IP address %s (%s)" % (label, value, e))
+    return None
+
+
+def _collect_networks(params, errors):
+    networks = {'machine_networks': [], 'cluster_networks': [], 'service_networks': []}
+    for key in networks:
+        for position, item in enumerate(params.get(key) or []):
+            label = "%s[%d]" % (key, position)
+            cidr = item.get('cidr') if isinstance(item, dict) else item
+            if not cidr:
+                errors.append("%s: missing cidr" % label)
+                continue
+            network = _parse_network(cidr, label, errors)
+            if network is not None:
+                host_prefix = item.get('host_prefix') if isinstance(item, dict) else None
+                networks[key].append((label, network, host_prefix))
+    # Legacy single-value parameters are only used when the list form is absent
+    if not networks['cluster_networks'] and params.get('cluster_network_cidr'):
+        network = _parse_network(params['cluster_network_cidr'], 'cluster_network_cidr', errors)
+        if network is not None:
+            networks['cluster_networks'].append(('cluster_network_cidr', network, None))
+    if not networks['service_networks'] and params.get('service_network_cidr'):
+        network = _parse_network(params['service_network_cidr'], 'service_network_cidr', errors)
+        if network is not None:
+            networks['service_networks'].append(('service_network_cidr', network, None))
+    return networks
+
+
+def _collect_vips(params, key, errors):
+    vips = []
+    for position, item in enumerate(params.get(key + 's') or []):
+        label = "%ss[%d]" % (key, position)
+        ip = item.get('ip') if isinstance(item, dict) else item
+        address = _parse_address(ip, label, errors)
+        if address is not None:
+            vips.append((label, address))
+    if params.get(key):
+        address = _parse_address(params[key], key, errors)
+        if address is not None:
+            if vips and vips[0][1] != address:
+                errors.append("%s %s does not match %ss[0] %s" % (key, address, key, vips[0][1]))
+            elif not vips:
+                vips.append((key, address))
+    return vips
+
+
+def _stack_order(items):
+    order = []
+    for item in items:
+        if item.version not in order:
+            order.append(item.version)
+    return order
+
+
+def _check_stacks(name, items, errors):
+    versions = [item.version for item in items]
+    for version in set(versions):
+        if name.endswith('vips') and versions.count(version) > 1:
+            errors.append("%s: at most one IPv%d address is allowed" % (name, version))
+    if len(items) > 1 and len(set(versions)) > 1 and versions[0] != 4:
+        errors.append("%s: dual-stack configurations must list IPv4 before IPv6" % name)
+
+
+def expected_node_count(params):
+    if params.get('expected_hosts'):
+        return params['expected_hosts']
+    if params.get('high_availability_mode') == 'None':
+        return 1
+    return 3
+
+
+def validate(params, node_count=None):
+    errors = []
+    if node_count is None:
+        node_count = expected_node_count(params)
+    networks = _collect_networks(params, errors)
+    vips = {
+        'api_vips': _collect_vips(params, 'api_vip', errors),
+        'ingress_vips': _collect_vips(params, 'ingress_vip', errors),
+    }
+
+    # Overlaps between any pair of machine, cluster and service networks
+    index = NetworkIndex()
+    machine_index = NetworkIndex()
+    for key, entries in networks.items():
+        for label, network, host_prefix in entries:
+            index.add(network, label)
+            if key == 'machine_networks':
+                machine_index.add(network, label)
+    for first_label, first, second_label, second in index.overlaps():
+        errors.append("%s %s overlaps with %s %s" % (first_label, first, second_label, second))
+
+    # Host prefix must fit inside the cluster network and leave one subnet per node
+    default_prefix = params.get('cluster_network_host_prefix')
+    for label, network, host_prefix in networks['cluster_networks']:
+        host_prefix = host_prefix or default_prefix
+        if host_prefix is None:
+            continue
+        host_prefix = int(host_prefix)
+        if host_prefix < network.prefixlen or host_prefix > network.max_prefixlen:
+            errors.append("%s: host prefix /%d is outside %s" % (label, host_prefix, network))
+            continue
+        capacity = 2 ** (host_prefix - network.prefixlen)
+        if capacity < node_count:
+            errors.append(
+                "%s: %s with host prefix /%d only fits %d nodes, %d expected"
+                % (label, network, host_prefix, capacity, node_count)
+            )
+
+    # VIPs must be usable addresses inside a machine network and outside pod/service ranges
+    seen = {}
+    for key, entries in vips.items():
+        for label, address in entries:
+            if str(address) in seen:
+                errors.append("%s %s is already used by %s" % (label, address, seen[str(address)]))
+            seen[str(address)] = label
+            if networks['machine_networks']:
+                containing = machine_index.lookup(address)
+                if not containing:
+                    errors.append("%s %s is not inside any machine network" % (label, address))
+                for network_label, network in containing:
+                    if network.num_addresses > 2 and address in (network.network_address, network.broadcast_address):
+                        errors.append("%s %s is not a usable address of %s" % (label, address, network))
+            for network_label, network in index.lookup(address):
+                if not network_label.startswith('machine_networks'):
+                    errors.append("%s %s is inside %s %s" % (label, address, network_label, network))
+
+    # Dual-stack: one entry per family, IPv4 first and the same order everywhere
+    orders = {}
+    for key, entries in networks.items():
+        items = [network for label, network, host_prefix in entries]
+        _check_stacks(key, items, errors)
+        if items:
+            orders[key] = _stack_order(items)
+    for key, entries in vips.items():
+        items = [address for label, address in entries]
+        _check_stacks(key, items, errors)
+        if items:
+            orders[key] = _stack_order(items)
+    dual = [key for key, order in orders.items() if len(order) > 1]
+    if dual:
+        reference = orders[dual[0]]
+        for key, order in sorted(orders.items()):
+            if key.endswith('networks') and order != reference:
+                errors.append("%s: IP families must follow the order %s" % (
+                    key, ", ".join("IPv%d" % version for version in reference)))
+            elif key.endswith('vips') and order != reference[:len(order)]:
+                errors.append("%s: IP families must follow the order %s" % (
+                    key, ", ".join("IPv%d" % version for version in reference)))
+    return errors
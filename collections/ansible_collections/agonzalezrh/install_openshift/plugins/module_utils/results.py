@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+# Fields kept by result_mode=summary, host inventories are always dropped
+HOST_SUMMARY = [
+    'id', 'requested_hostname', 'role', 'status', 'status_info', 'progress', 'installation_disk_path',
+    'infra_env_id', 'updated_at',
+]
+SUMMARY = {
+    'Cluster': [
+        'id', 'kind', 'name', 'status', 'status_info', 'openshift_version', 'cpu_architecture',
+        'high_availability_mode', 'base_dns_domain', 'api_vips', 'ingress_vips', 'progress',
+        'install_started_at', 'install_completed_at', 'updated_at', 'status_updated_at', 'user_name',
+    ] + ['hosts.' + field for field in HOST_SUMMARY],
+    'InfraEnv': [
+        'id', 'kind', 'name', 'cluster_id', 'type', 'download_url', 'expires_at', 'openshift_version',
+        'cpu_architecture', 'updated_at',
+    ],
+    'Host': HOST_SUMMARY + ['kind', 'cluster_id'],
+}
+
+
+def field_tree(fields):
+    # ['id', 'hosts.status'] -> {'id': None, 'hosts': {'status': None}}
+    tree = {}
+    for field in fields:
+        node = tree
+        parts = field.split('.')
+        for part in parts[:-1]:
+            child = node.get(part)
+            if child is None:
+                if part in node:
+                    # The whole parent was requested already
+                    break
+                child = node[part] = {}
+            node = child
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def project(value, tree):
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return dict((key, project(value[key], subtree)) for key, subtree in tree.items() if key in value)
+    return value
+
+
+def summarize(value):
+    if isinstance(value, list):
+        return [summarize(item) for item in value]
+    if isinstance(value, dict) and value.get('kind') in SUMMARY:
+        return project(value, field_tree(SUMMARY[value['kind']]))
+    return value
+
+
+def transformer(params):
+    # Function applying result_mode and return_fields to one API object,
+    # None when objects are returned as they are
+    mode = params.get('result_mode') or 'full'
+    fields = params.get('return_fields')
+    if mode == 'full' and not fields:
+        return None
+    if fields:
+        tree = field_tree(fields)
+        return lambda value: project(value, tree)
+    return summarize
+
+
+def trim(result, params, keys=('result',)):
+    # Applies result_mode and return_fields to the API objects in result
+    transform = transformer(params)
+    if transform is None:
+        return result
+    result = dict(result)
+    result.pop('access_token', None)
+    for key in keys:
+        if key in result:
+            result[key] = transform(result[key])
+    return result
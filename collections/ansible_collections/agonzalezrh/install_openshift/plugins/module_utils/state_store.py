@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import hashlib
+import json
+import os
+import time
+
+try:
+    import sqlite3
+    HAS_SQLITE = True
+except ImportError:
+    HAS_SQLITE = False
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS objects (
+        kind TEXT NOT NULL,
+        id TEXT NOT NULL,
+        name TEXT,
+        status TEXT,
+        owner TEXT,
+        parent_id TEXT,
+        hash TEXT NOT NULL,
+        updated_at TEXT,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (kind, id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS snapshots (
+        kind TEXT NOT NULL,
+        id TEXT NOT NULL,
+        hash TEXT NOT NULL,
+        first_seen REAL NOT NULL,
+        last_seen REAL NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (kind, id, hash)
+    )""",
+    """CREATE TABLE IF NOT EXISTS syncs (
+        kind TEXT PRIMARY KEY,
+        fetched_at REAL NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS objects_name ON objects (kind, name)",
+    "CREATE INDEX IF NOT EXISTS objects_status ON objects (kind, status)",
+    "CREATE INDEX IF NOT EXISTS objects_owner ON objects (kind, owner)",
+    "CREATE INDEX IF NOT EXISTS objects_parent ON objects (kind, parent_id)",
+    "CREATE INDEX IF NOT EXISTS objects_fetched ON objects (kind, fetched_at)",
+    "CREATE INDEX IF NOT EXISTS snapshots_seen ON snapshots (kind, id, last_seen)",
+]
+
+
+def snapshot_hash(data):
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+
+
+class StateStore(object):
+    # Local SQLite history of the objects returned by the Assisted Installer API.
+    # Only the latest state of every object is kept in `objects`, the full JSON
+    # is stored once per distinct content hash in `snapshots`.
+
+    def __init__(self, path):
+        path = os.path.expanduser(path)
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+
+    def close(self):
+        self.conn.close()
+
+    def record(self, kind, data, parent_id=None, now=None):
+        # Returns True when the snapshot differs from the last recorded one
+        if now is None:
+            now = time.time()
+        digest = snapshot_hash(data)
+        with self.conn:
+            changed = self._record(kind, data, digest, parent_id, now)
+            if kind == 'cluster':
+                for host in data.get('hosts') or []:
+                    self._record('host', host, snapshot_hash(host), data.get('id'), now)
+        return changed
+
+    def record_many(self, kind, items, full_sync=False, now=None):
+        if now is None:
+            now = time.time()
+        # A full sync is a listing of every object of kind, the objects
+        # missing from it were deleted and are forgotten
+        changed = 0
+        seen = set()
+        with self.conn:
+            for data in items:
+                seen.add(data.get('id'))
+                if self._record(kind, data, snapshot_hash(data), None, now):
+                    changed += 1
+                if kind == 'cluster':
+                    for host in data.get('hosts') or []:
+                        self._record('host', host, snapshot_hash(host), data.get('id'), now)
+            if full_sync:
+                known = [row['id'] for row in self.conn.execute("SELECT id FROM objects WHERE kind = ?", (kind,))]
+                self._forget(kind, [object_id for object_id in known if object_id not in seen])
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO syncs (kind, fetched_at) VALUES (?, ?)", (kind, now)
+                )
+        return changed
+
+    def forget(self, kind, object_ids):
+        # Drops deleted objects and their hosts, their snapshots stay in the history
+        with self.conn:
+            self._forget(kind, object_ids)
+
+    def _forget(self, kind, object_ids):
+        for object_id in object_ids:
+            self.conn.execute("DELETE FROM objects WHERE kind = ? AND id = ?", (kind, object_id))
+            if kind in ('cluster', 'infra_env'):
+                self.conn.execute("DELETE FROM objects WHERE kind = 'host' AND parent_id = ?", (object_id,))
+
+    def _record(self, kind, data, digest, parent_id, now):
+        object_id = data.get('id')
+        if object_id is None:
+            return False
+        row = self.conn.execute(
+            "SELECT hash FROM objects WHERE kind = ? AND id = ?", (kind, object_id)
+        ).fetchone()
+        if parent_id is None:
+            parent_id = data.get('cluster_id')
+        name = data.get('name') or data.get('requested_hostname')
+        self.conn.execute(
+            "INSERT OR REPLACE INTO objects (kind, id, name, status, owner, parent_id, hash, updated_at, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, object_id, name, data.get('status'), data.get('user_name'), parent_id,
+             digest, data.get('updated_at'), now)
+        )
+        if row is not None and row['hash'] == digest:
+            self.conn.execute(
+                "UPDATE snapshots SET last_seen = ? WHERE kind = ? AND id = ? AND hash = ?",
+                (now, kind, object_id, digest)
+            )
+            return False
+        self.conn.execute(
+            "INSERT OR IGNORE INTO snapshots (kind, id, hash, first_seen, last_seen, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, object_id, digest, now, now, json.dumps(data, separators=(',', ':')))
+        )
+        self.conn.execute(
+            "UPDATE snapshots SET last_seen = ? WHERE kind = ? AND id = ? AND hash = ?",
+            (now, kind, object_id, digest)
+        )
+        return True
+
+    def last_sync(self, kind):
+        row = self.conn.execute("SELECT fetched_at FROM syncs WHERE kind = ?", (kind,)).fetchone()
+        if row is None:
+            return None
+        return row['fetched_at']
+
+    def is_fresh(self, kind, max_age, now=None):
+        fetched_at = self.last_sync(kind)
+        if fetched_at is None or max_age is None:
+            return False
+        if now is None:
+            now = time.time()
+        return now - fetched_at <= max_age
+
+    def query(self, kind, object_id=None, name=None, status=None, owner=None, parent_id=None,
+              max_age=None, now=None):
+        clauses = ["o.kind = ?"]
+        values = [kind]
+        for column, value in (('id', object_id), ('name', name), ('owner', owner), ('parent_id', parent_id)):
+            if value is not None:
+                clauses.append("o.%s = ?" % column)
+                values.append(value)
+        if status is not None:
+            if isinstance(status, (list, tuple)):
+                clauses.append("o.status IN (%s)" % ", ".join("?" for dummy in status))
+                values.extend(status)
+            else:
+                clauses.append("o.status = ?")
+                values.append(status)
+        if max_age is not None:
+            if now is None:
+                now = time.time()
+            clauses.append("o.fetched_at >= ?")
+            values.append(now - max_age)
+        rows = self.conn.execute(
+            "SELECT s.data FROM objects o JOIN snapshots s ON s.kind = o.kind AND s.id = o.id AND s.hash = o.hash "
+            "WHERE " + " AND ".join(clauses) + " ORDER BY o.name, o.id",
+            values
+        )
+        return [json.loads(row['data']) for row in rows]
+
+    def history(self, kind, object_id):
+        rows = self.conn.execute(
+            "SELECT first_seen, last_seen, data FROM snapshots WHERE kind = ? AND id = ? ORDER BY first_seen",
+            (kind, object_id)
+        )
+        return [
+            dict(first_seen=row['first_seen'], last_seen=row['last_seen'], data=json.loads(row['data']))
+            for row in rows
+        ]
+
+
+def open_store(module):
+    # Returns None when the module was not given a state_store path
+    path = module.params.get('state_store')
+    if not path:
+        return None
+    if not HAS_SQLITE:
+        module.fail_json(msg='The state_store option requires the Python sqlite3 module')
+    try:
+        return StateStore(path)
+    except Exception as e:
+        module.fail_json(msg='Unable to open state store %s: %s' % (path, e))
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import codecs
+import itertools
+import json
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedError
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+# What may follow a complete element
+_DELIMITERS = _WHITESPACE + ',]'
+
+
+def iter_json_array(chunks):
+    # Yields the elements of a top-level JSON array read from an iterable of
+    # byte chunks. Only the element being decoded is kept in memory.
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    pos = 0
+    # Text received since the last decode, joined to the buffer only when it
+    # is decoded again so a large element is not copied on every chunk
+    pending = []
+    pending_size = 0
+    # Size the buffer must reach before an incomplete element is decoded again,
+    # grown geometrically so a large element is not re-parsed on every chunk
+    retry_at = 0
+    started = False
+    expect_value = True
+    # None marks the end of the body, whatever is buffered is decoded then
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        data = text.decode(b'' if final else chunk, final)
+        if data:
+            pending.append(data)
+            pending_size += len(data)
+        if not final and len(buf) - pos + pending_size < retry_at:
+            continue
+        # Only the undecoded end of the buffer is kept
+        buf = buf[pos:] + ''.join(pending)
+        pos = 0
+        pending = []
+        pending_size = 0
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos >= len(buf):
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError('Expected a JSON array')
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            if not expect_value:
+                if buf[pos] != ',':
+                    raise ValueError('Expected , at position %d' % pos)
+                expect_value = True
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Incomplete element, wait for more data
+                retry_at = 2 * (len(buf) - pos)
+                break
+            if not final and not isinstance(value, (dict, list, str)) and (
+                    end == len(buf) or buf[end] not in _DELIMITERS):
+                # A number, or a literal, not followed by a delimiter may
+                # continue in the next chunk: "1." then "5", "1.5e" then "3"
+                retry_at = len(buf) - pos + 1
+                break
+            retry_at = 0
+            pos = end
+            expect_value = False
+            yield value
+    raise ValueError('Truncated JSON array' if started else 'Expected a JSON array')
+
+
+def iter_list(client, path, params=None, chunk_size=CHUNK_SIZE):
+    # Streams the objects returned by a list endpoint
+    response = client.request("GET", path, params=params, stream=True)
+    try:
+        if response.status_code >= 400:
+            raise AssistedError('Request failed: ', response.json())
+        for item in iter_json_array(response.iter_content(chunk_size)):
+            yield item
+    finally:
+        response.close()
+
+
+def collect(items, predicate=None, transform=None, consume=None):
+    # Returns the transformed items matching predicate. consume, for example
+    # StateStore.record_many, also sees every item while it is streamed.
+    kept = []
+
+    def feed():
+        for item in items:
+            if predicate is None or predicate(item):
+                kept.append(item if transform is None else transform(item))
+            yield item
+
+    if consume is None:
+        for item in feed():
+            pass
+    else:
+        consume(feed())
+    return kept
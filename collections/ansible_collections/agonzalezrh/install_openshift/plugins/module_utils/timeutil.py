@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import calendar
+import time
+
+
+def parse_time(value):
+    # "2023-05-10T12:00:00.123Z" -> epoch seconds, None for the API zero time
+    if not value or value.startswith('0001-'):
+        return None
+    try:
+        seconds, _, fraction = value.rstrip('Z').partition('.')
+        epoch = calendar.timegm(time.strptime(seconds, '%Y-%m-%dT%H:%M:%S'))
+    except ValueError:
+        return None
+    if fraction.isdigit():
+        epoch += float('0.' + fraction)
+    return epoch
@@ -0,0 +1,254 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import drift
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+
+
+DOCUMENTATION = r'''
+---
+module: cluster_drift
+
+short_description: Reports the clusters that no longer match their create_cluster and create_infra_env parameters.
+
+version_added: "1.1.0"
+
+description:
+    - Brings the parameters given to create_cluster and create_infra_env and the live cluster and infra-env to the
+      same canonical form, CIDRs and addresses normalized and lists sorted, and hashes them by section.
+    - Only the sections whose digests differ are compared field by field, only the fields set in the parameters are
+      compared so values left to the service defaults are not reported.
+    - Operators are drift only when one asked for is missing, the ones the service adds as dependencies, lso for odf,
+      are not reported.
+    - The static network config of the infra-env is read in the format the service stores it, one entry per host.
+    - The clusters are read concurrently, the module never changes anything.
+
+options:
+    clusters:
+        description: Clusters to check.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            cluster_id:
+                description: ID of the cluster
+                required: true
+                type: str
+            cluster:
+                description: Parameters given to create_cluster for this cluster.
+                required: false
+                type: dict
+            infra_env:
+                description: Parameters given to create_infra_env for this cluster.
+                required: false
+                type: dict
+            infra_env_id:
+                description:
+                    - ID of the infra-env to compare with O(clusters[].infra_env).
+                    - When not given, the infra-env of the cluster named like O(clusters[].infra_env), or its only infra-env.
+                required: false
+                type: str
+    sections:
+        description: Sections compared.
+        required: false
+        type: list
+        elements: str
+        choices: ['networking', 'proxy', 'operators', 'static_network_config']
+        default: ['networking', 'proxy', 'operators', 'static_network_config']
+    max_workers:
+        description: Number of clusters read at the same time.
+        required: false
+        type: int
+        default: 10
+    fail_on_drift:
+        description: Whether the task fails when a cluster drifted.
+        required: false
+        type: bool
+        default: false
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+
+author:
+    - Alberto Gonzalez (@agonzalezrh)
+'''
+
+EXAMPLES = r'''
+# fleet is a list of {cluster_id, cluster, infra_env}, cluster and infra_env
+# holding the parameters the playbooks pass to create_cluster and create_infra_env
+- name: Check the fleet against its inventory
+  agonzalezrh.install_openshift.cluster_drift:
+    offline_token: "{{ offline_token }}"
+    clusters: "{{ fleet }}"
+    max_workers: 20
+  register: audit
+
+- name: Check the networking of one cluster
+  agonzalezrh.install_openshift.cluster_drift:
+    offline_token: "{{ offline_token }}"
+    sections: [networking]
+    fail_on_drift: true
+    clusters:
+      - cluster_id: "{{ newcluster.result.id }}"
+        cluster:
+          cluster_networks:
+            - cidr: 10.128.0.0/14
+              host_prefix: 23
+          service_networks:
+            - cidr: 172.30.0.0/16
+          api_vips:
+            - ip: 192.168.10.5
+'''
+
+RETURN = r'''
+drifted:
+    description: IDs of the clusters with at least one drifted section.
+    type: list
+    elements: str
+    returned: always
+clusters:
+    description: One entry per cluster, in the order of O(clusters).
+    type: list
+    elements: dict
+    returned: always
+    contains:
+        cluster_id:
+            description: ID of the cluster
+            type: str
+        name:
+            description: Name of the cluster, when it was read
+            type: str
+        drifted:
+            description: Whether a section differs
+            type: bool
+        digests:
+            description: SHA-256 digests of the desired and live canonical form of every compared section.
+            type: dict
+        drift:
+            description: For every drifted section, the fields that differ with their desired and live values.
+            type: dict
+        error:
+            description: Why the cluster could not be checked
+            type: str
+api_profile:
+    description: Timing of every SSO and API request made by the module, read by the api_profile callback plugin.
+    type: dict
+    returned: always
+'''
+
+CLUSTER_SECTIONS = ('networking', 'operators')
+INFRA_ENV_SECTIONS = ('static_network_config',)
+
+
+def find_infra_env(client, item):
+    if item.get('infra_env_id'):
+        return client.call('GET', '/infra-envs/' + item['infra_env_id'])
+    infra_envs = client.call('GET', '/infra-envs', params={'cluster_id': item['cluster_id']}) or []
+    name = (item.get('infra_env') or {}).get('name')
+    if name:
+        infra_envs = [infra_env for infra_env in infra_envs if infra_env.get('name') == name]
+    if len(infra_envs) != 1:
+        raise AssistedError('%d infra-env(s) %sfound for cluster %s, set infra_env_id' % (
+            len(infra_envs), 'named %s ' % name if name else '', item['cluster_id']))
+    return infra_envs[0]
+
+
+def check(client, item, sections):
+    # Reads only the objects the desired sections need
+    entry = dict(cluster_id=item['cluster_id'], name=None, drifted=False, digests={}, drift={})
+    desired = drift.desired_sections(item.get('cluster'), item.get('infra_env'))
+    desired = dict((section, value) for section, value in desired.items() if section in sections)
+    cluster = None
+    infra_env = None
+    try:
+        if any(section in desired for section in CLUSTER_SECTIONS) or 'cluster' in desired.get('proxy', {}):
+            cluster = client.get_cluster(item['cluster_id'])
+            entry['name'] = cluster.get('name')
+        if any(section in desired for section in INFRA_ENV_SECTIONS) or 'infra_env' in desired.get('proxy', {}):
+            infra_env = find_infra_env(client, item)
+    except AssistedError as e:
+        # The messages end with ": " waiting for the reason of the answer
+        entry['error'] = e.msg.rstrip(': ')
+        if e.result.get('reason'):
+            entry['error'] = '%s: %s' % (entry['error'], e.result['reason'])
+        return entry
+    live = drift.live_sections(desired, cluster, infra_env)
+    entry['digests'], entry['drift'] = drift.compare(desired, live, sections)
+    entry['drifted'] = bool(entry['drift'])
+    return entry
+
+
+def run_module():
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        clusters=dict(type='list', elements='dict', required=True, options=dict(
+            cluster_id=dict(type='str', required=True),
+            cluster=dict(type='dict', required=False),
+            infra_env=dict(type='dict', required=False),
+            infra_env_id=dict(type='str', required=False),
+        )),
+        sections=dict(type='list', elements='str', required=False, choices=list(drift.SECTIONS),
+                      default=list(drift.SECTIONS)),
+        max_workers=dict(type='int', required=False, default=10),
+        fail_on_drift=dict(type='bool', required=False, default=False),
+    )
+    module_args.update(auth_argument_spec())
+
+    # seed the result dict in the object
+    # we primarily care about changed and state
+    # changed is if this module effectively modified the target
+    # state will include any data that you want your module to pass back
+    # for consumption, for example, in a subsequent task
+    result = dict(
+        changed=False,
+    )
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    result['access_token'] = client.token
+
+    items = module.params['clusters']
+    sections = module.params['sections']
+    if items:
+        # All the reads share the client session and its connection pool
+        with ThreadPoolExecutor(max_workers=max(1, min(len(items), module.params['max_workers']))) as executor:
+            result['clusters'] = list(executor.map(lambda item: check(client, item, sections), items))
+    else:
+        result['clusters'] = []
+    result['drifted'] = [entry['cluster_id'] for entry in result['clusters'] if entry['drifted']]
+
+    errors = [entry for entry in result['clusters'] if entry.get('error')]
+    if errors:
+        module.fail_json(msg='Could not check %d cluster(s): %s' % (
+            len(errors), '; '.join(entry['cluster_id'] + ': ' + entry['error'] for entry in errors)), **result)
+    if module.params['fail_on_drift'] and result['drifted']:
+        module.fail_json(msg='%d cluster(s) drifted: %s' % (len(result['drifted']), ', '.join(result['drifted'])),
+                         **result)
+
+    # in the event of a successful module execution, you will want to
+    # simple AnsibleModule.exit_json(), passing the key/value results
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,11 +4,16 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
 import json
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import catalog
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import change_plan
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, AUTH_OPTIONS, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import network_validation
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import streaming
 
 DOCUMENTATION = r'''
 ---
@@ -25,10 +30,6 @@ options:
         description: Name of the cluster
         required: true
         type: str
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
-        type: str
     openshift_version:
         description: OpenShift version to be installed
         required: true
@@ -149,6 +150,28 @@ options:
         description: Indicate if virtual IP DHCP allocation mode is enabled.
         required: false
         type: bool
+    validate_networks:
+        description: Validate machine, cluster and service networks, VIPs and host prefix locally before calling the API. Overlapping CIDRs, VIPs outside the machine network, host prefixes too small for the expected nodes and inconsistent dual-stack ordering are rejected.
+        required: false
+        type: bool
+        default: true
+    expected_hosts:
+        description: Number of nodes the cluster networks must have room for when validating the host prefix. Defaults to 1 for SNO and 3 otherwise.
+        required: false
+        type: int
+    max_age:
+        description:
+            - In check mode, maximum age in seconds of the last full cluster listing recorded in O(state_store).
+            - When it is fresh enough the plan is computed from the store without contacting SSO nor the API,
+              otherwise the clusters are listed once.
+        required: false
+        type: int
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.catalog
+    - agonzalezrh.install_openshift.results
+    - agonzalezrh.install_openshift.state_store
 
 author:
     - Alberto Gonzalez (@agonzalezrh)
@@ -166,6 +189,18 @@ EXAMPLES = r'''
     service_networks:
       - cidr: "172.31.0.0/16"
   register: newcluster
+
+- name: Show the request that would create the cluster, from a listing up to 10 minutes old
+  agonzalezrh.install_openshift.create_cluster:
+    name: "{{ cluster_name }}"
+    openshift_version: "{{ cluster_version }}"
+    base_dns_domain: "{{ cluster_domain }}"
+    offline_token: "{{ offline_token }}"
+    pull_secret: "{{ pull_secret }}"
+    state_store: ~/.cache/install_openshift/state.db
+    max_age: 600
+  check_mode: true
+  diff: true
 '''
 
 RETURN = r'''
@@ -173,6 +208,25 @@ result:
     description: Result from the API call
     type: dict
     returned: always
+openshift_version:
+    description: Full OpenShift version requested when O(openshift_version) was a minor version resolved through the catalog.
+    type: str
+    returned: when the version was resolved
+    sample: 4.14.10
+plan:
+    description: Requests a run without check mode sends, with the pull secret masked.
+    type: list
+    elements: dict
+    returned: in check mode
+    sample: [{"method": "POST", "path": "/clusters", "body": {"name": "sno", "pull_secret": "********"}}]
+plan_source:
+    description: Where the state the plan was computed against came from, V(state_store) or V(api).
+    type: str
+    returned: in check mode
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: when O(result_mode=full) and O(return_fields) is not set
 '''
 
 
@@ -180,7 +234,6 @@ def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         name=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
         openshift_version=dict(type='str', required=True),
         pull_secret=dict(type='str', required=True),
         base_dns_domain=dict(type='str', required=True),
@@ -210,11 +263,18 @@ def run_module():
         service_network_cidr=dict(type='str', required=False),
         ssh_public_key=dict(type='str', required=False),
         tags=dict(type='str', required=False),
-        vip_dhcp_allocation=dict(type='bool', required=False)
+        vip_dhcp_allocation=dict(type='bool', required=False),
+        validate_networks=dict(type='bool', required=False, default=True),
+        validate_catalog=dict(type='bool', required=False, default=True),
+        catalog_cache=dict(type='path', required=False, default=catalog.DEFAULT_CACHE),
+        catalog_ttl=dict(type='int', required=False, default=catalog.DEFAULT_TTL),
+        expected_hosts=dict(type='int', required=False),
+        state_store=dict(type='path', required=False),
+        max_age=dict(type='int', required=False),
+        result_mode=dict(type='str', required=False, choices=['full', 'summary'], default='full'),
+        return_fields=dict(type='list', elements='str', required=False),
     )
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
     result = dict(
         changed=False,
     )
@@ -226,37 +286,92 @@ def run_module():
         argument_spec=module_args,
         supports_check_mode=True,
     )
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
-    # if the user is working with this module in only check mode we do not
-    # want to make any changes to the environment, just return the current
-    # state with no modifications
-    if module.check_mode:
-        module.exit_json(**result)
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
+    # Reject inconsistent networking before any API call is made
+    if module.params['validate_networks']:
+        errors = network_validation.validate(module.params)
+        if errors:
+            module.fail_json(msg='Invalid network configuration: ' + '; '.join(errors), errors=errors)
+    client = AssistedClient.from_module(module)
+    store = state_store.open_store(module)
+    # A check run planned from a fresh state store contacts neither SSO nor
+    # the API, other check runs authenticate on their first read
+    offline = module.check_mode and change_plan.is_fresh(store, 'cluster', module.params['max_age'])
+    if not module.check_mode:
+        try:
+            client.authenticate()
+        except AssistedError as e:
+            module.fail_json(msg=e.msg, **e.result)
+    # Unknown versions, architectures and operators are rejected before
+    # anything is created, "4.14" becomes its latest patch release
+    version_catalog = catalog.open_catalog(module, client, offline=offline)
+    if version_catalog is not None:
+        errors, changes = version_catalog.validate(module.params)
+        if errors:
+            module.fail_json(msg='Invalid cluster configuration: ' + '; '.join(errors), errors=errors)
+        for warning in version_catalog.warnings:
+            module.warn(warning)
+        module.params.update(changes)
+        if 'openshift_version' in changes:
+            result['openshift_version'] = changes['openshift_version']
     params = module.params.copy()
-    params.pop("offline_token")
+    for key in AUTH_OPTIONS:
+        params.pop(key)
+    params.pop("validate_networks")
+    params.pop("expected_hosts")
+    params.pop("state_store")
+    params.pop("max_age")
+    params.pop("validate_catalog")
+    params.pop("catalog_cache")
+    params.pop("catalog_ttl")
+    params.pop("result_mode")
+    params.pop("return_fields")
     if "cluster_id" in params:
         params.pop("cluster_id")
     params["pull_secret"] = json.loads(params["pull_secret"])
-    response = session.post(
-        "https://api.openshift.com/api/assisted-install/v2/clusters",
-        headers=headers,
+    # if the user is working with this module in only check mode we do not
+    # want to make any changes to the environment, just return the requests
+    # that would be sent
+    if module.check_mode:
+        name = module.params['name']
+        if offline:
+            existing = store.query('cluster', name=name)
+            source = 'state_store'
+        else:
+            def consume(items):
+                store.record_many('cluster', items, full_sync=True)
+
+            try:
+                existing = streaming.collect(
+                    streaming.iter_list(client, "/clusters"), lambda cluster: cluster.get('name') == name,
+                    consume=consume if store is not None else None)
+            except AssistedError as e:
+                module.fail_json(msg=e.msg, **e.result)
+            source = 'api'
+        if store is not None:
+            store.close()
+        if existing:
+            module.warn('%d cluster(s) named %s already exist, a run without check mode creates one more' % (len(existing), name))
+        change_plan.exit_plan(
+            module, result, [change_plan.planned('POST', '/clusters', params)],
+            [change_plan.creation_diff('cluster', name, params, existing)], source)
+    response = client.request(
+        "POST",
+        "/clusters",
         json=params
     )
     result['result'] = response.json()
     # Key code only appears if there is an error
     if "code" in response.json():
-        module.fail_json(msg='Request failed: ', **result)
+        module.fail_json(msg='Request failed: ', **results.trim(result, module.params))
     else:
         result['changed'] = True
+        if store is not None:
+            store.record('cluster', result['result'])
+    if store is not None:
+        store.close()
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
-    module.exit_json(**result)
+    module.exit_json(**results.trim(result, module.params))
 
 
 def main():
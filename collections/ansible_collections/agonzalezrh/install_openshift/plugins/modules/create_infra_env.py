@@ -4,11 +4,14 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
 import json
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import catalog
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import change_plan
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, AUTH_OPTIONS, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
 
 
 DOCUMENTATION = r'''
@@ -50,6 +53,14 @@ options:
         description: List of kernel arugment objects that define the operations and values to be applied.
         required: false
         type: list
+    max_age:
+        description:
+            - In check mode, maximum age in seconds of the last full infra-env listing recorded in O(state_store).
+            - When it is fresh enough the plan is computed from the store without contacting SSO nor the API,
+              otherwise the infra-envs are listed once, all of them when O(state_store) is set so that the listing
+              is recorded as a full one.
+        required: false
+        type: int
     name:
         description: Name of the infra-env.
         required: false
@@ -74,6 +85,12 @@ options:
         description: Static network configuration
         required: false
         type: list
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.catalog
+    - agonzalezrh.install_openshift.results
+    - agonzalezrh.install_openshift.state_store
 author:
     - Alberto Gonzalez (@agonzalezrh)
 '''  # noqa
@@ -88,12 +105,40 @@ EXAMPLES = r'''
     offline_token: "{{ offline_token }}"
     pull_secret: "{{ pull_secret }}"
   register: newinfraenv
+
+- name: Show the request that would create the infra-env
+  agonzalezrh.install_openshift.create_infra_env:
+    name: "{{ cluster_name }}-infra-env"
+    cluster_id: "{{ cluster_id }}"
+    offline_token: "{{ offline_token }}"
+    pull_secret: "{{ pull_secret }}"
+  check_mode: true
+  diff: true
 '''
 RETURN = r'''
 result:
     description: Result from the API call
     type: dict
     returned: always
+openshift_version:
+    description: Full OpenShift version requested when O(openshift_version) was a minor version resolved through the catalog.
+    type: str
+    returned: when the version was resolved
+    sample: 4.14.10
+plan:
+    description: Requests a run without check mode sends, with the pull secret masked.
+    type: list
+    elements: dict
+    returned: in check mode
+    sample: [{"method": "POST", "path": "/infra-envs", "body": {"name": "sno-infra-env", "pull_secret": "********"}}]
+plan_source:
+    description: Where the state the plan was computed against came from, V(state_store) or V(api).
+    type: str
+    returned: in check mode
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: when O(result_mode=full) and O(return_fields) is not set
 '''
 
 
@@ -101,7 +146,6 @@ def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         name=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
         cluster_id=dict(type='str', required=True),
         pull_secret=dict(type='str', required=True),
         image_type=dict(type='str', required=False),
@@ -114,11 +158,15 @@ def run_module():
         openshift_version=dict(type='str', required=False),
         proxy=dict(type='dict', required=False),
         static_network_config=dict(type='list', required=False),
+        state_store=dict(type='path', required=False),
+        max_age=dict(type='int', required=False),
+        validate_catalog=dict(type='bool', required=False, default=True),
+        catalog_cache=dict(type='path', required=False, default=catalog.DEFAULT_CACHE),
+        catalog_ttl=dict(type='int', required=False, default=catalog.DEFAULT_TTL),
+        result_mode=dict(type='str', required=False, choices=['full', 'summary'], default='full'),
+        return_fields=dict(type='list', elements='str', required=False),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -138,41 +186,97 @@ def run_module():
         supports_check_mode=True
     )
 
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
+    client = AssistedClient.from_module(module)
+    store = state_store.open_store(module)
+    # A check run planned from a fresh state store contacts neither SSO nor
+    # the API, other check runs authenticate on their first read
+    offline = module.check_mode and change_plan.is_fresh(store, 'infra_env', module.params['max_age'])
+    if not module.check_mode:
+        try:
+            client.authenticate()
+        except AssistedError as e:
+            module.fail_json(msg=e.msg, **e.result)
+
+    # Unknown versions, architectures and operators are rejected before
+    # anything is created, "4.14" becomes its latest patch release
+    version_catalog = catalog.open_catalog(module, client, offline=offline)
+    if version_catalog is not None:
+        errors, changes = version_catalog.validate(module.params)
+        if errors:
+            module.fail_json(msg='Invalid infra-env configuration: ' + '; '.join(errors), errors=errors)
+        for warning in version_catalog.warnings:
+            module.warn(warning)
+        module.params.update(changes)
+        if 'openshift_version' in changes:
+            result['openshift_version'] = changes['openshift_version']
+
+    params = module.params.copy()
+    for key in AUTH_OPTIONS:
+        params.pop(key)
+    params.pop("state_store")
+    params.pop("max_age")
+    params.pop("validate_catalog")
+    params.pop("catalog_cache")
+    params.pop("catalog_ttl")
+    params.pop("result_mode")
+    params.pop("return_fields")
+    params["pull_secret"] = json.loads(params["pull_secret"])
 
     # if the user is working with this module in only check mode we do not
-    # want to make any changes to the environment, just return the current
-    # state with no modifications
+    # want to make any changes to the environment, just return the requests
+    # that would be sent
     if module.check_mode:
-        module.exit_json(**result)
+        name = module.params['name']
+        cluster_id = module.params['cluster_id']
+        if offline:
+            if not store.query('cluster', object_id=cluster_id):
+                module.warn('Cluster %s is not in the state store, a run without check mode may fail' % cluster_id)
+            infra_envs = store.query('infra_env', parent_id=cluster_id)
+            source = 'state_store'
+        else:
+            # Only a listing of every infra-env makes the store fresh for
+            # the next offline plans, infra-envs of other clusters included
+            try:
+                if store is None:
+                    infra_envs = client.call("GET", "/infra-envs", params=dict(cluster_id=cluster_id))
+                else:
+                    infra_envs = client.call("GET", "/infra-envs") or []
+                    store.record_many('infra_env', infra_envs, full_sync=True)
+                    infra_envs = [infra_env for infra_env in infra_envs if infra_env.get('cluster_id') == cluster_id]
+            except AssistedError as e:
+                module.fail_json(msg=e.msg, **e.result)
+            source = 'api'
+        if store is not None:
+            store.close()
+        existing = [infra_env for infra_env in infra_envs if infra_env.get('name') == name]
+        if existing:
+            module.warn('%d infra-env(s) named %s already exist, a run without check mode creates one more' % (len(existing), name))
+        change_plan.exit_plan(
+            module, result, [change_plan.planned('POST', '/infra-envs', params)],
+            [change_plan.creation_diff('infra-env', name, params, existing)], source)
 
-    result['access_token'] = response.json()["access_token"]
+    result['access_token'] = client.token
 
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
-    params = module.params.copy()
-    params.pop("offline_token")
-    params["pull_secret"] = json.loads(params["pull_secret"])
-    response = session.post(
-        "https://api.openshift.com/api/assisted-install/v2/infra-envs",
-        headers=headers,
+    response = client.request(
+        "POST",
+        "/infra-envs",
         json=params
     )
 
     result['result'] = response.json()
 
     if "code" in response.json():
-        module.fail_json(msg='Request failed: ', **result)
+        module.fail_json(msg='Request failed: ', **results.trim(result, module.params))
     else:
         result['changed'] = True
+        if store is not None:
+            store.record('infra_env', result['result'])
+    if store is not None:
+        store.close()
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
-    module.exit_json(**result)
+    module.exit_json(**results.trim(result, module.params))
 
 
 def main():
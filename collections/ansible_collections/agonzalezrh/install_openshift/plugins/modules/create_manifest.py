@@ -4,11 +4,11 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
-import json
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import change_plan
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, AUTH_OPTIONS, auth_argument_spec
 
 
 DOCUMENTATION = r'''
@@ -38,9 +38,17 @@ options:
         description: The folderfor the new manifest to create.
         required: true
         type: str
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
+    max_age:
+        description:
+            - In check mode, maximum age in seconds of the last full cluster listing recorded in O(state_store).
+            - When it is fresh enough the plan is computed from the store without contacting SSO nor the API,
+              otherwise the manifests of O(cluster_id) are listed once.
+        required: false
+        type: int
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.state_store
+
 author:
     - Alberto Gonzalez (@agonzalezrh)
 '''  # noqa
@@ -61,6 +69,19 @@ result:
     description: Result from the API call
     type: dict
     returned: always
+plan:
+    description: Requests a run without check mode sends.
+    type: list
+    elements: dict
+    returned: in check mode
+plan_source:
+    description: Where the state the plan was computed against came from, V(state_store) or V(api).
+    type: str
+    returned: in check mode
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: always
 '''
 
 
@@ -68,15 +89,13 @@ def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         cluster_id=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
         content=dict(type='str', required=True),
         file_name=dict(type='str', required=True),
         folder=dict(type='str', required=True),
+        state_store=dict(type='path', required=False),
+        max_age=dict(type='int', required=False),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -96,29 +115,53 @@ def run_module():
         supports_check_mode=True
     )
 
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
-
-    # if the user is working with this module in only check mode we do not
-    # want to make any changes to the environment, just return the current
-    # state with no modifications
-    if module.check_mode:
-        module.exit_json(**result)
-
-    result['access_token'] = response.json()["access_token"]
+    client = AssistedClient.from_module(module)
 
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
     params = module.params.copy()
     params.pop("cluster_id")
-    params.pop("offline_token")
-    response = session.post(
-        "https://api.openshift.com/api/assisted-install/v2/clusters/"
-        + module.params["cluster_id"] + "/manifests",
-        headers=headers,
+    params.pop("state_store")
+    params.pop("max_age")
+    for key in AUTH_OPTIONS:
+        params.pop(key)
+    path = "/clusters/" + module.params["cluster_id"] + "/manifests"
+
+    # if the user is working with this module in only check mode we do not
+    # want to make any changes to the environment, just return the requests
+    # that would be sent. A fresh state store answers without SSO nor API.
+    if module.check_mode:
+        store = state_store.open_store(module)
+        name = module.params['folder'] + '/' + module.params['file_name']
+        existing = []
+        if change_plan.is_fresh(store, 'cluster', module.params['max_age']):
+            if not store.query('cluster', object_id=module.params['cluster_id']):
+                module.warn('Cluster %s is not in the state store, a run without check mode may fail' % module.params['cluster_id'])
+            source = 'state_store'
+        else:
+            try:
+                manifests = client.call("GET", path)
+            except AssistedError as e:
+                module.fail_json(msg=e.msg, **e.result)
+            existing = [dict(manifest, id=name) for manifest in manifests or []
+                        if manifest.get('folder') == module.params['folder'] and manifest.get('file_name') == module.params['file_name']]
+            source = 'api'
+        if store is not None:
+            store.close()
+        if existing:
+            module.warn('Manifest %s already exists in cluster %s' % (name, module.params['cluster_id']))
+        change_plan.exit_plan(
+            module, result, [change_plan.planned('POST', path, params)],
+            [change_plan.creation_diff('manifest', name, params, existing)], source)
+
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+
+    result['access_token'] = client.token
+
+    response = client.request(
+        "POST",
+        path,
         json=params
     )
 
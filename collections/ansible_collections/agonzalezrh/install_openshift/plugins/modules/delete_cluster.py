@@ -4,10 +4,12 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import change_plan
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import streaming
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
 
 DOCUMENTATION = r'''
 ---
@@ -18,10 +20,6 @@ version_added: "1.0.0"
 description: Delete an OpenShift cluster definition from console
 
 options:
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
-        type: str
     cluster_id:
         description: Cluster ID to be delete
         required: false
@@ -31,7 +29,19 @@ options:
         required: false
         type: str
         default: false
+    max_age:
+        description:
+            - In check mode, maximum age in seconds of the last full cluster and infra-env listings recorded in
+              O(state_store).
+            - When both are fresh enough the plan is computed from the store without contacting SSO nor the API,
+              otherwise the infra-envs are listed once, all of them when O(state_store) is set.
+        required: false
+        type: int
+        version_added: "1.1.0"
 
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.state_store
 
 author:
     - Alberto Gonzalez (@agonzalezrh)
@@ -42,6 +52,15 @@ EXAMPLES = r'''
   agonzalezrh.install_openshift.delete_cluster:
     cluster_id: "{{ cluster_id }}"
     offline_token: "{{ offline_token }}"
+
+- name: Show what deleting the cluster would remove
+  agonzalezrh.install_openshift.delete_cluster:
+    cluster_id: "{{ cluster_id }}"
+    offline_token: "{{ offline_token }}"
+    state_store: ~/.cache/install_openshift/state.db
+    max_age: 600
+  check_mode: true
+  diff: true
 '''
 
 RETURN = r'''
@@ -49,6 +68,20 @@ result:
     description: Result from the API call
     type: dict
     returned: always
+plan:
+    description: Requests a run without check mode sends, the cluster DELETE and one DELETE per infra-env.
+    type: list
+    elements: dict
+    returned: in check mode
+    sample: [{"method": "DELETE", "path": "/clusters/b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11"}]
+plan_source:
+    description: Where the state the plan was computed against came from, V(state_store) or V(api).
+    type: str
+    returned: in check mode
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: always
 '''
 
 
@@ -56,13 +89,11 @@ def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         cluster_id=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
         cancel=dict(type='bool', required=False, default=False),
+        state_store=dict(type='path', required=False),
+        max_age=dict(type='int', required=False),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -82,24 +113,57 @@ def run_module():
         supports_check_mode=True,
     )
 
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
+    client = AssistedClient.from_module(module)
+    store = state_store.open_store(module)
+    cluster_id = module.params["cluster_id"]
 
     # if the user is working with this module in only check mode we do not
-    # want to make any changes to the environment, just return the current
-    # state with no modifications
+    # want to make any changes to the environment, just return the requests
+    # that would be sent. A check run planned from fresh cluster and infra-env
+    # listings contacts neither SSO nor the API.
     if module.check_mode:
-        module.exit_json(**result)
+        max_age = module.params['max_age']
+        offline = change_plan.is_fresh(store, 'cluster', max_age) and change_plan.is_fresh(store, 'infra_env', max_age)
+        if offline:
+            infra_envs = store.query('infra_env', parent_id=cluster_id)
+            source = 'state_store'
+        else:
+            # Only a listing of every infra-env makes the store fresh for
+            # the next offline plans, infra-envs of other clusters included
+            try:
+                if store is None:
+                    infra_envs = client.call("GET", "/infra-envs", params=dict(cluster_id=cluster_id)) or []
+                else:
+                    infra_envs = client.call("GET", "/infra-envs") or []
+                    store.record_many('infra_env', infra_envs, full_sync=True)
+                    infra_envs = [infra_env for infra_env in infra_envs if infra_env.get('cluster_id') == cluster_id]
+            except AssistedError as e:
+                module.fail_json(msg=e.msg, **e.result)
+            source = 'api'
+        clusters = store.query('cluster', object_id=cluster_id) if store is not None else []
+        if store is not None:
+            store.close()
+        if offline and not clusters:
+            module.warn('Cluster %s is not in the state store, a run without check mode may fail' % cluster_id)
+        plan = []
+        if module.params['cancel']:
+            plan.append(change_plan.planned('POST', '/clusters/' + cluster_id + '/actions/cancel'))
+        plan.append(change_plan.planned('DELETE', '/clusters/' + cluster_id))
+        diffs = [change_plan.deletion_diff('cluster', cluster_id, clusters[0] if clusters else dict(id=cluster_id))]
+        for infra_env in infra_envs:
+            plan.append(change_plan.planned('DELETE', '/infra-envs/' + infra_env['id']))
+            diffs.append(change_plan.deletion_diff('infra-env', infra_env.get('name') or infra_env['id'], infra_env))
+        change_plan.exit_plan(module, result, plan, diffs, source)
+
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
 
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
     if module.params['cancel']:
-        response = session.post(
-            "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params["cluster_id"] + "/actions/cancel",
-            headers=headers,
+        response = client.request(
+            "POST",
+            "/clusters/" + module.params["cluster_id"] + "/actions/cancel"
         )
         if len(response.content) > 0 and "code" in response.json():
             result['result'] = response.json()
@@ -107,9 +171,9 @@ def run_module():
         else:
             result['changed'] = True
 
-    response = session.delete(
-        "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params["cluster_id"],
-        headers=headers,
+    response = client.request(
+        "DELETE",
+        "/clusters/" + module.params["cluster_id"]
     )
     # Key code only appears if there is an error
     if len(response.content) > 0 and "code" in response.json():
@@ -118,20 +182,32 @@ def run_module():
     else:
         result['changed'] = True
 
-    response = session.get(
-        "https://api.openshift.com/api/assisted-install/v2/infra-envs/",
-        headers=headers,
-        params={"cluster_id": module.params["cluster_id"]}
-    )
-    for infra_env in response.json():
-        response = session.delete(
-            "https://api.openshift.com/api/assisted-install/v2/infra-envs/" + infra_env['id'],
-            headers=headers,
+    # Only the IDs of the infra-envs are kept while the listing is decoded
+    try:
+        infra_env_ids = streaming.collect(
+            streaming.iter_list(client, "/infra-envs/", params={"cluster_id": module.params["cluster_id"]}),
+            transform=lambda infra_env: infra_env['id'],
+        )
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    except ValueError as e:
+        module.fail_json(msg='Invalid response: ' + str(e))
+    for infra_env_id in infra_env_ids:
+        response = client.request(
+            "DELETE",
+            "/infra-envs/" + infra_env_id
         )
         if len(response.content) > 0 and "code" in response.json():
             result['result'] = response.json()
             module.fail_json(msg='Request failed: ', **result)
 
+    # The cached listings of list_clusters and the check mode plans must not
+    # see the deleted cluster anymore
+    if store is not None:
+        store.forget('cluster', [module.params["cluster_id"]])
+        store.forget('infra_env', infra_env_ids)
+        store.close()
+
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
     module.exit_json(**result)
@@ -0,0 +1,386 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import host_rules
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import network_validation
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.checkpoint import INSTALL_STARTED_STATUSES
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.circuit_breaker import CircuitBreaker
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.hosts import HostIndex, configure_hosts_patches
+
+
+DOCUMENTATION = r'''
+---
+module: deploy_cluster
+
+short_description: Creates, configures and installs an OpenShift cluster in a single task.
+
+version_added: "1.1.0"
+
+description:
+    - Runs the create_cluster, create_infra_env, create_manifest, wait_for_hosts and install_cluster steps in one process,
+      sharing one HTTPS session and one access token.
+    - Manifests are uploaded while the hosts are being discovered.
+    - The stages to run can be selected, so that VMs can be booted from the discovery ISO between two calls.
+
+options:
+    stages:
+        description: Stages to run, in pipeline order.
+        required: false
+        type: list
+        elements: str
+        choices: [ cluster, infra_env, manifests, hosts, install ]
+        default: [ cluster, infra_env, manifests, hosts, install ]
+    cluster:
+        description:
+            - Cluster definition, accepts the same parameters as the create_cluster module.
+            - Required when the cluster stage runs, with its C(name), C(openshift_version), C(base_dns_domain) and
+              C(pull_secret).
+        required: false
+        type: dict
+    cluster_id:
+        description: ID of an existing cluster. Required when the cluster stage does not run.
+        required: false
+        type: str
+    infra_env:
+        description:
+            - Infrastructure environment definition, accepts the same parameters as the create_infra_env module.
+            - O(infra_env.cluster_id) and O(infra_env.pull_secret) default to the cluster ones.
+        required: false
+        type: dict
+    infra_env_id:
+        description: ID of an existing infra-env. Required to configure hosts when the infra_env stage does not run.
+        required: false
+        type: str
+    manifests:
+        description: Manifests to upload, each with C(file_name), C(folder) and C(content).
+        required: false
+        type: list
+        elements: dict
+    expected_hosts:
+        description: Expected number of the hosts. Required when the hosts stage runs.
+        required: false
+        type: int
+    configure_hosts:
+        description: Role and installation disk per hostname, same format as in the wait_for_hosts module.
+        required: false
+        type: list
+        elements: dict
+    hosts_timeout:
+        description: Timeout in seconds for the hosts to be ready.
+        required: false
+        type: int
+        default: 600
+    install_timeout:
+        description: Timeout in seconds for the installation.
+        required: false
+        type: int
+        default: 1800
+    delay:
+        description: Delay time between checks while waiting for the hosts.
+        required: false
+        type: int
+        default: 10
+    install_delay:
+        description: Delay time between checks while waiting for the installation.
+        required: false
+        type: int
+        default: 60
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.outage
+    - agonzalezrh.install_openshift.results
+
+author:
+    - Alberto Gonzalez (@agonzalezrh)
+'''
+
+EXAMPLES = r'''
+- name: Create the cluster and the discovery ISO
+  agonzalezrh.install_openshift.deploy_cluster:
+    offline_token: "{{ offline_token }}"
+    stages: [ cluster, infra_env ]
+    cluster:
+      name: "{{ cluster_name }}"
+      openshift_version: "{{ cluster_version }}"
+      base_dns_domain: "{{ cluster_domain }}"
+      pull_secret: "{{ pull_secret }}"
+      high_availability_mode: "Full"
+    infra_env:
+      name: "{{ cluster_name }}-infra-env"
+      image_type: "{{ cluster_iso_type }}"
+      ssh_authorized_key: "{{ ssh_authorized_key }}"
+  register: deploy
+
+- name: Upload manifests while the hosts boot, then install
+  agonzalezrh.install_openshift.deploy_cluster:
+    offline_token: "{{ offline_token }}"
+    stages: [ manifests, hosts, install ]
+    cluster_id: "{{ deploy.cluster_id }}"
+    infra_env_id: "{{ deploy.infra_env_id }}"
+    expected_hosts: 3
+    manifests:
+      - file_name: 10-masters-storage-config
+        folder: manifests
+        content: "{{ etcd_disk }}"
+'''
+
+RETURN = r'''
+result:
+    description: Last cluster definition returned by the API.
+    type: dict
+    returned: always
+cluster_id:
+    description: ID of the cluster.
+    type: str
+    returned: always
+infra_env_id:
+    description: ID of the infra-env.
+    type: str
+    returned: when known
+infra_env:
+    description: Infra-env created by the infra_env stage, including its C(download_url).
+    type: dict
+    returned: when the infra_env stage ran
+updated_hosts:
+    description: Updates sent to the hosts by hostname, from O(configure_hosts).
+    type: dict
+    returned: always
+timings:
+    description: Wall clock seconds spent in every stage. Manifests and hosts run at the same time.
+    type: dict
+    returned: always
+outages:
+    description: API outages ridden out while polling, with their start offset and duration in seconds, failures and last error.
+    type: list
+    elements: dict
+    returned: always
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: when O(result_mode=full) and O(return_fields) is not set
+'''
+
+STAGES = ['cluster', 'infra_env', 'manifests', 'hosts', 'install']
+
+# Parameters create_cluster requires
+CLUSTER_REQUIRED = ('name', 'openshift_version', 'base_dns_domain', 'pull_secret')
+
+
+def _pull_secret(value):
+    if isinstance(value, dict):
+        return value
+    return json.loads(value)
+
+
+def _validate(cluster, infra_env):
+    # Errors of the cluster and infra_env definitions, before anything is created
+    errors = ['cluster.%s is required' % key for key in CLUSTER_REQUIRED if not cluster.get(key)]
+    for name, params in (('cluster', cluster), ('infra_env', infra_env)):
+        if params.get('pull_secret'):
+            try:
+                _pull_secret(params['pull_secret'])
+            except ValueError:
+                errors.append('%s.pull_secret is not valid JSON' % name)
+    return errors
+
+
+def _upload_manifests(client, cluster_id, manifests):
+    with ThreadPoolExecutor(max_workers=min(len(manifests), 5)) as executor:
+        futures = [executor.submit(client.create_manifest, cluster_id, manifest) for manifest in manifests]
+        return [future.result() for future in futures]
+
+
+def _wait_for_hosts(client, breaker, cluster_id, infra_env_id, expected_hosts, configure_hosts, timeout, delay, updated):
+    # updated collects the PATCH bodies sent, by hostname
+    deadline = client.clock() + timeout
+    while True:
+        cluster = breaker.call(client.get_cluster, cluster_id, deadline=deadline)
+        if cluster['status'] in INSTALL_STARTED_STATUSES:
+            return cluster
+        hosts = HostIndex(cluster.get('hosts'))
+        ready_hosts = hosts.count("known")
+        patches = configure_hosts_patches(hosts, configure_hosts)
+        host_rules.apply(client, infra_env_id, patches)
+        for host, data in patches:
+            updated.setdefault(host.hostname or host.id, {}).update(data)
+        if ready_hosts == expected_hosts and cluster['status'] == "ready":
+            return cluster
+        remaining = deadline - client.clock()
+        if remaining <= 0:
+            raise AssistedError('Timeout waiting for the hosts, %d of %d ready' % (ready_hosts, expected_hosts), cluster)
+        client.sleep(min(delay, remaining))
+
+
+def _install(client, breaker, cluster_id, timeout, delay, result):
+    cluster = breaker.call(client.get_cluster, cluster_id)
+    if cluster['status'] not in INSTALL_STARTED_STATUSES:
+        client.install_cluster(cluster_id)
+        result['changed'] = True
+    deadline = client.clock() + timeout
+    while cluster['status'] != "installed":
+        remaining = deadline - client.clock()
+        if remaining <= 0:
+            raise AssistedError('Timeout waiting for the cluster installation, status: ' + cluster['status'], cluster)
+        client.sleep(min(delay, remaining))
+        cluster = breaker.call(client.get_cluster, cluster_id, deadline=deadline)
+        # error and cancelled never turn into installed, see install_cluster install_retries
+        if cluster['status'] in ('error', 'cancelled'):
+            raise AssistedError('Installation %s: %s' % (cluster['status'], cluster.get('status_info') or 'no reason given by the API'), cluster)
+    return cluster
+
+
+def run_module():
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        stages=dict(type='list', elements='str', required=False, choices=STAGES, default=STAGES),
+        cluster=dict(type='dict', required=False),
+        cluster_id=dict(type='str', required=False),
+        infra_env=dict(type='dict', required=False),
+        infra_env_id=dict(type='str', required=False),
+        manifests=dict(type='list', elements='dict', required=False),
+        expected_hosts=dict(type='int', required=False),
+        configure_hosts=dict(type='list', elements='dict', required=False),
+        hosts_timeout=dict(type='int', required=False, default=600),
+        install_timeout=dict(type='int', required=False, default=1800),
+        delay=dict(type='int', required=False, default=10),
+        install_delay=dict(type='int', required=False, default=60),
+        outage_budget=dict(type='int', required=False, default=300),
+        result_mode=dict(type='str', required=False, choices=['full', 'summary'], default='full'),
+        return_fields=dict(type='list', elements='str', required=False),
+    )
+    module_args.update(auth_argument_spec())
+
+    result = dict(
+        changed=False,
+        timings=dict(),
+        outages=[],
+        updated_hosts=dict(),
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+    )
+    stages = module.params['stages']
+    if 'cluster' in stages and not module.params['cluster']:
+        module.fail_json(msg='cluster is required when the cluster stage runs')
+    if 'cluster' not in stages and not module.params['cluster_id']:
+        module.fail_json(msg='cluster_id is required when the cluster stage does not run')
+    if 'hosts' in stages and module.params['expected_hosts'] is None:
+        module.fail_json(msg='expected_hosts is required when the hosts stage runs')
+
+    cluster_params = dict(module.params['cluster'] or {})
+    if 'cluster' in stages:
+        errors = _validate(cluster_params, module.params['infra_env'] or {})
+        if errors:
+            module.fail_json(msg='Invalid cluster definition: ' + '; '.join(errors), errors=errors)
+        validation_params = dict(cluster_params)
+        validation_params.setdefault('expected_hosts', module.params['expected_hosts'])
+        errors = network_validation.validate(validation_params)
+        if errors:
+            module.fail_json(msg='Invalid network configuration: ' + '; '.join(errors), errors=errors)
+
+    # if the user is working with this module in only check mode we do not
+    # want to make any changes to the environment, just return the current
+    # state with no modifications
+    if module.check_mode:
+        module.exit_json(**result)
+
+    client = AssistedClient.from_module(module)
+    breaker = CircuitBreaker(client, module.params['outage_budget'])
+    result['outages'] = breaker.outages
+    timings = result['timings']
+
+    def timed(stage, func, *args):
+        start = time.time()
+        try:
+            return func(*args)
+        finally:
+            timings[stage] = round(time.time() - start, 3)
+
+    cluster_id = module.params['cluster_id']
+    infra_env_id = module.params['infra_env_id']
+    try:
+        if 'cluster' in stages:
+            cluster_params['pull_secret'] = _pull_secret(cluster_params['pull_secret'])
+            cluster = timed('cluster', client.create_cluster, cluster_params)
+            cluster_id = cluster['id']
+            result['result'] = cluster
+            result['changed'] = True
+        result['cluster_id'] = cluster_id
+
+        if 'infra_env' in stages:
+            infra_env_params = dict(module.params['infra_env'] or {})
+            infra_env_params.setdefault('cluster_id', cluster_id)
+            infra_env_params.setdefault('name', "%s-infra-env" % cluster_params.get('name', cluster_id))
+            infra_env_params.setdefault('pull_secret', cluster_params.get('pull_secret'))
+            if infra_env_params['pull_secret'] is None:
+                raise AssistedError('infra_env.pull_secret is required when the cluster stage does not run')
+            infra_env_params['pull_secret'] = _pull_secret(infra_env_params['pull_secret'])
+            infra_env = timed('infra_env', client.create_infra_env, infra_env_params)
+            infra_env_id = infra_env['id']
+            result['infra_env'] = infra_env
+            result['changed'] = True
+        if infra_env_id is not None:
+            result['infra_env_id'] = infra_env_id
+
+        if module.params['configure_hosts'] and infra_env_id is None:
+            raise AssistedError('infra_env_id is required to configure hosts')
+
+        # Manifests do not depend on the hosts, upload them while they are discovered
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            manifests = None
+            hosts = None
+            if 'manifests' in stages and module.params['manifests']:
+                manifests = executor.submit(
+                    timed, 'manifests', _upload_manifests, client, cluster_id, module.params['manifests'])
+            if 'hosts' in stages:
+                hosts = executor.submit(
+                    timed, 'hosts', _wait_for_hosts, client, breaker, cluster_id, infra_env_id,
+                    module.params['expected_hosts'], module.params['configure_hosts'],
+                    module.params['hosts_timeout'], module.params['delay'], result['updated_hosts'])
+            try:
+                if manifests is not None:
+                    manifests.result()
+                    result['changed'] = True
+                if hosts is not None:
+                    result['result'] = hosts.result()
+            finally:
+                # Only the hosts really updated change the cluster, failed runs included
+                if result['updated_hosts']:
+                    result['changed'] = True
+
+        if 'install' in stages:
+            result['result'] = timed('install', _install, client, breaker, cluster_id,
+                                     module.params['install_timeout'], module.params['install_delay'], result)
+    except AssistedError as e:
+        if e.result:
+            result['result'] = e.result
+        module.fail_json(msg=e.msg, **results.trim(result, module.params, keys=('result', 'infra_env')))
+    except (ValueError, requests.exceptions.RequestException) as e:
+        module.fail_json(msg='ERROR: ' + str(e), **results.trim(result, module.params, keys=('result', 'infra_env')))
+
+    # in the event of a successful module execution, you will want to
+    # simple AnsibleModule.exit_json(), passing the key/value results
+    module.exit_json(**results.trim(result, module.params, keys=('result', 'infra_env')))
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
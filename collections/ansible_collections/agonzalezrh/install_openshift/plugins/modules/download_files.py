@@ -4,11 +4,10 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
-import os
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import downloads
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
 
 
 DOCUMENTATION = r'''
@@ -26,33 +25,79 @@ options:
         description: ID of the cluster
         required: true
         type: str
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
-        type: str
     file_name:
-        description: The credential file to be downloaded.
-        required: true
+        description:
+            - The cluster file to be downloaded.
+            - Required unless O(files) is used.
+        required: false
         type: str
     dest:
-        description: Destination path
-        required: true
+        description:
+            - Destination path
+            - Required with O(file_name).
+        required: false
         type: str
+    files:
+        description:
+            - List of files to download, fetched concurrently.
+            - Each file is only written when its content changed, replacing the destination atomically.
+        required: false
+        type: list
+        elements: dict
+        version_added: "1.1.0"
+        suboptions:
+            file_name:
+                description: The cluster file to be downloaded.
+                required: true
+                type: str
+            dest:
+                description: Destination path
+                required: true
+                type: str
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+
 author:
     - Alberto Gonzalez (@agonzalezrh)
 '''
 
 EXAMPLES = r'''
-- name: Obtain OpenShift cluster credentials
-  register: credentials
-  agonzalezrh.install_openshift.get_credentials:
+- name: Download the install config and the discovery ignition
+  agonzalezrh.install_openshift.download_files:
     cluster_id: "{{ newcluster.result.id }}"
     offline_token: "{{ offline_token }}"
+    files:
+      - file_name: install-config.yaml
+        dest: /tmp/install-config.yaml
+      - file_name: discovery.ign
+        dest: /tmp/discovery.ign
 '''
 
 RETURN = r'''
 result:
-    description: Result from the API call
+    description: Content of the downloaded file
+    type: str
+    returned: when O(file_name) is used
+files:
+    description: One entry per downloaded file.
+    type: list
+    elements: dict
+    returned: always
+    contains:
+        file_name:
+            description: Name of the file in the API
+            type: str
+        dest:
+            description: Destination path
+            type: str
+        changed:
+            description: Whether the destination was written
+            type: bool
+        size:
+            description: Size of the file in bytes
+            type: int
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
     type: dict
     returned: always
 '''
@@ -62,14 +107,14 @@ def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         cluster_id=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
-        file_name=dict(type='str', required=True),
-        dest=dict(type='str', required=True)
+        file_name=dict(type='str', required=False),
+        dest=dict(type='str', required=False),
+        files=dict(type='list', elements='dict', required=False, options=dict(
+            file_name=dict(type='str', required=True),
+            dest=dict(type='str', required=True),
+        )),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -86,38 +131,25 @@ def run_module():
     # supports check mode
     module = AnsibleModule(
         argument_spec=module_args,
-        supports_check_mode=True
+        supports_check_mode=True,
+        required_one_of=[['file_name', 'files']],
+        mutually_exclusive=[['file_name', 'files']],
+        required_together=[['file_name', 'dest']],
     )
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
-    result['access_token'] = response.json()["access_token"]
-    params = module.params.copy()
-    params.pop("offline_token")
-
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
-    response = session.get(
-        "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params['cluster_id'] + "/downloads/files",
-        headers=headers,
-        params=params
-    )
-    if "code" in response:
-        module.fail_json(msg='Request failed: ' + response)
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    result['access_token'] = client.token
 
     try:
-        currentcontent = None
-        if os.path.exists(module.params['dest']):
-            currentcontent = open(module.params['dest'], 'rb').read()
-        if currentcontent != response.content:
-            open(module.params['dest'], 'wb').write(response.content)
-            result['changed'] = True
-    except IOError as e:
-        module.fail_json(msg='ERROR: ' + str(e))
-
-    result['result'] = response.content
+        result['files'], contents, attempts = downloads.download(module, client, "files")
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    result['changed'] = any(item['changed'] for item in result['files'])
+    if module.params['file_name']:
+        result['result'] = contents[0]
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
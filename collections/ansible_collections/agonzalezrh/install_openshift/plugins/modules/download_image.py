@@ -0,0 +1,302 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import downloads
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.timeutil import parse_time
+
+
+DOCUMENTATION = r'''
+---
+module: download_image
+
+short_description: Refreshes the image URL of an infra-env and downloads its ISO or PXE artifacts.
+
+version_added: "1.1.0"
+
+description:
+    - Returns a presigned download URL of the discovery image of an infra-env that is valid for at least
+      O(refresh_margin) seconds, a new URL is only requested when the current one is about to expire.
+    - Optionally streams the ISO, or the kernel, initrd and rootfs used to boot the hosts over PXE, to disk.
+      Every file is downloaded with a conditional request and only replaced, atomically, when it changed.
+    - The validators of every download are kept next to the file, in a C(.download.json) file.
+
+options:
+    infra_env_id:
+        description: ID of the infra-env
+        required: true
+        type: str
+    image_type:
+        description:
+            - Type of image wanted, full-iso or minimal-iso.
+            - The infra-env is only updated, and its image regenerated, when its type differs.
+        required: false
+        type: str
+        choices: ['full-iso', 'minimal-iso']
+    download_url:
+        description:
+            - Current download URL of the image, for example the C(download_url) returned by create_infra_env.
+            - Used as is while it does not expire within O(refresh_margin) seconds. The infra-env is read when it is not given.
+        required: false
+        type: str
+    expires_at:
+        description: Expiration time of O(download_url), as returned by create_infra_env.
+        required: false
+        type: str
+    refresh_margin:
+        description: A new download URL is requested when the current one expires within this many seconds.
+        required: false
+        type: int
+        default: 900
+    iso_dest:
+        description: Path the ISO is downloaded to.
+        required: false
+        type: path
+    pxe_dest:
+        description:
+            - Directory the PXE artifacts are downloaded to, as C(vmlinuz), C(initrd.img) and C(rootfs.img).
+            - Their URLs are read from the iPXE script of the infra-env.
+        required: false
+        type: path
+    pxe_artifacts:
+        description: PXE artifacts downloaded to O(pxe_dest).
+        required: false
+        type: list
+        elements: str
+        choices: ['kernel', 'initrd', 'rootfs']
+        default: ['kernel', 'initrd', 'rootfs']
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+
+author:
+    - Alberto Gonzalez (@agonzalezrh)
+'''
+
+EXAMPLES = r'''
+- name: Download the minimal ISO
+  agonzalezrh.install_openshift.download_image:
+    infra_env_id: "{{ newinfraenv.result.id }}"
+    image_type: minimal-iso
+    iso_dest: /var/lib/isos/{{ cluster_name }}.iso
+    offline_token: "{{ offline_token }}"
+
+- name: Download the PXE artifacts
+  agonzalezrh.install_openshift.download_image:
+    infra_env_id: "{{ newinfraenv.result.id }}"
+    pxe_dest: /var/lib/tftpboot/{{ cluster_name }}
+    offline_token: "{{ offline_token }}"
+
+- name: Get a download URL valid for at least one more hour
+  agonzalezrh.install_openshift.download_image:
+    infra_env_id: "{{ newinfraenv.result.id }}"
+    download_url: "{{ newinfraenv.result.download_url }}"
+    expires_at: "{{ newinfraenv.result.expires_at }}"
+    refresh_margin: 3600
+    offline_token: "{{ offline_token }}"
+  register: image
+'''
+
+RETURN = r'''
+download_url:
+    description: Presigned download URL of the image.
+    type: str
+    returned: always
+expires_at:
+    description: Expiration time of RV(download_url).
+    type: str
+    returned: always
+refreshed:
+    description: Whether a new download URL was requested.
+    type: bool
+    returned: always
+image_type:
+    description: Type of the image of the infra-env, when it was read or updated.
+    type: str
+    returned: when the infra-env was read or updated
+pxe_urls:
+    description: URLs of the kernel, initrd and rootfs read from the iPXE script.
+    type: dict
+    returned: when O(pxe_dest) is used
+files:
+    description: One entry per downloaded file.
+    type: list
+    elements: dict
+    returned: always
+    contains:
+        artifact:
+            description: iso, kernel, initrd or rootfs
+            type: str
+        dest:
+            description: Destination path
+            type: str
+        changed:
+            description: Whether the destination was written
+            type: bool
+        size:
+            description: Size of the file in bytes
+            type: int
+        sha256:
+            description: SHA-256 digest of the file, null in check mode when it would be downloaded
+            type: str
+api_profile:
+    description: Timing of every SSO and API request made by the module, read by the api_profile callback plugin.
+    type: dict
+    returned: always
+'''
+
+PXE_FILES = {
+    'kernel': 'vmlinuz',
+    'initrd': 'initrd.img',
+    'rootfs': 'rootfs.img',
+}
+
+
+def pxe_urls(script):
+    # URLs of the kernel, initrd and rootfs of an iPXE script:
+    #   initrd --name initrd https://.../pxe-initrd?api_key=...
+    #   kernel https://.../kernel?arch=x86_64 initrd=initrd coreos.live.rootfs_url=https://.../rootfs?arch=x86_64 ...
+    urls = {}
+    for line in script.splitlines():
+        words = line.split()
+        if not words or words[0] not in ('kernel', 'initrd'):
+            continue
+        found = [word for word in words[1:] if '://' in word and '=' not in word.split('://')[0]]
+        if words[0] == 'initrd' and found:
+            urls['initrd'] = found[-1]
+        elif words[0] == 'kernel':
+            if found:
+                urls['kernel'] = found[0]
+            for word in words[1:]:
+                if word.startswith('coreos.live.rootfs_url='):
+                    urls['rootfs'] = word.split('=', 1)[1]
+    return urls
+
+
+def needs_refresh(download_url, expires_at, margin):
+    # URLs of the zero expiration time never expire
+    if not download_url:
+        return True
+    expires = parse_time(expires_at)
+    return expires is not None and expires - time.time() < margin
+
+
+def run_module():
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        infra_env_id=dict(type='str', required=True),
+        image_type=dict(type='str', required=False, choices=['full-iso', 'minimal-iso']),
+        download_url=dict(type='str', required=False),
+        expires_at=dict(type='str', required=False),
+        refresh_margin=dict(type='int', required=False, default=900),
+        iso_dest=dict(type='path', required=False),
+        pxe_dest=dict(type='path', required=False),
+        pxe_artifacts=dict(type='list', elements='str', required=False, choices=['kernel', 'initrd', 'rootfs'],
+                           default=['kernel', 'initrd', 'rootfs']),
+    )
+    module_args.update(auth_argument_spec())
+
+    # seed the result dict in the object
+    # we primarily care about changed and state
+    # changed is if this module effectively modified the target
+    # state will include any data that you want your module to pass back
+    # for consumption, for example, in a subsequent task
+    result = dict(
+        changed=False,
+        refreshed=False,
+        files=[],
+    )
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+        required_together=[['download_url', 'expires_at']],
+    )
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    result['access_token'] = client.token
+
+    infra_env_id = module.params['infra_env_id']
+    path = '/infra-envs/' + infra_env_id
+    download_url = module.params['download_url']
+    expires_at = module.params['expires_at']
+    try:
+        # The infra-env is only read when its type matters or no URL was given
+        if module.params['image_type'] or not download_url:
+            infra_env = client.call('GET', path)
+            download_url = infra_env.get('download_url')
+            expires_at = infra_env.get('expires_at')
+            result['image_type'] = infra_env.get('type')
+            if module.params['image_type'] and infra_env.get('type') != module.params['image_type']:
+                # Changing the type regenerates the image and its URL
+                result['changed'] = True
+                result['image_type'] = module.params['image_type']
+                if module.check_mode:
+                    module.exit_json(download_url=None, expires_at=None, **result)
+                infra_env = client.call('PATCH', path, json={'image_type': module.params['image_type']})
+                download_url = infra_env.get('download_url')
+                expires_at = infra_env.get('expires_at')
+        if needs_refresh(download_url, expires_at, module.params['refresh_margin']):
+            image_url = client.call('GET', path + '/downloads/image-url')
+            download_url = image_url['url']
+            expires_at = image_url.get('expires_at')
+            result['refreshed'] = True
+        result['download_url'] = download_url
+        result['expires_at'] = expires_at
+
+        targets = []
+        if module.params['iso_dest']:
+            targets.append(('iso', download_url, module.params['iso_dest']))
+        if module.params['pxe_dest']:
+            response = client.request('GET', path + '/downloads/files', params={'file_name': 'ipxe-script'})
+            if response.status_code >= 400:
+                raise AssistedError('Request failed: ', response.json())
+            result['pxe_urls'] = pxe_urls(response.text)
+            for artifact in module.params['pxe_artifacts']:
+                if artifact not in result['pxe_urls']:
+                    raise AssistedError('No %s in the iPXE script of infra-env %s' % (artifact, infra_env_id))
+                targets.append((artifact, result['pxe_urls'][artifact],
+                                os.path.join(module.params['pxe_dest'], PXE_FILES[artifact])))
+            if not module.check_mode and not os.path.isdir(module.params['pxe_dest']):
+                os.makedirs(module.params['pxe_dest'])
+
+        # Every artifact is a separate streamed GET, the PXE ones run concurrently
+        if targets:
+            with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+                futures = [executor.submit(downloads.stream, module, client, url, dest) for _, url, dest in targets]
+                for (artifact, _, _), future in zip(targets, futures):
+                    entry = future.result()
+                    entry['artifact'] = artifact
+                    result['files'].append(entry)
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    except (IOError, OSError) as e:
+        module.fail_json(msg='ERROR: ' + str(e))
+    if any(entry['changed'] for entry in result['files']):
+        result['changed'] = True
+
+    # in the event of a successful module execution, you will want to
+    # simple AnsibleModule.exit_json(), passing the key/value results
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import hashlib
+import json
+import os
+import tarfile
+import tempfile
+
+import requests
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import log_bundle
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.downloads import CHUNK_SIZE
+
+
+DOCUMENTATION = r'''
+---
+module: download_logs
+
+short_description: Downloads the logs of a cluster and extracts the members needed.
+
+version_added: "1.1.0"
+
+description:
+    - Streams the log bundle of a cluster, or of one of its hosts, and extracts only the members whose names match
+      O(patterns) while it is downloaded. The bundle is never held in memory nor unpacked as a whole.
+    - The per-host archives inside the bundle are walked too, their members are named C(archive.tar.gz/member).
+    - An index of every member, with its size and where it was extracted, is written to C(index.json) in O(dest).
+
+options:
+    cluster_id:
+        description: ID of the cluster
+        required: true
+        type: str
+    logs_type:
+        description: Logs to download, all of them, the ones of one host or the ones of the assisted controller.
+        required: false
+        type: str
+        choices: ['all', 'host', 'controller']
+        default: all
+    host_id:
+        description: ID of the host, required when O(logs_type=host).
+        required: false
+        type: str
+    dest:
+        description: Directory the members and the index are written to.
+        required: true
+        type: path
+    patterns:
+        description:
+            - Shell-style patterns of the members to extract, matched against the whole member name.
+            - With no pattern only the index is written.
+        required: false
+        type: list
+        elements: str
+        default: []
+    nested:
+        description: Whether the archives inside the bundle are walked.
+        required: false
+        type: bool
+        default: true
+    archive:
+        description: Path the whole bundle is also written to, as it is downloaded.
+        required: false
+        type: path
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+
+author:
+    - Alberto Gonzalez (@agonzalezrh)
+'''
+
+EXAMPLES = r'''
+- name: Get the installer logs and journals of a failed installation
+  agonzalezrh.install_openshift.download_logs:
+    cluster_id: "{{ newcluster.result.id }}"
+    dest: /tmp/{{ cluster_name }}-logs
+    patterns:
+      - "*installer*"
+      - "*journal*"
+    offline_token: "{{ offline_token }}"
+
+- name: Index the logs of one host
+  agonzalezrh.install_openshift.download_logs:
+    cluster_id: "{{ newcluster.result.id }}"
+    logs_type: host
+    host_id: "{{ host_id }}"
+    dest: /tmp/{{ cluster_name }}-logs
+    offline_token: "{{ offline_token }}"
+'''
+
+RETURN = r'''
+index:
+    description: Path of the index, a JSON document with the size and digest of the bundle and its members.
+    type: str
+    returned: unless in check mode
+members:
+    description: Number of files in the bundle, nested archive members included.
+    type: int
+    returned: unless in check mode
+size:
+    description: Size of the bundle in bytes.
+    type: int
+    returned: unless in check mode
+extracted:
+    description: One entry per extracted member.
+    type: list
+    elements: dict
+    returned: always
+    contains:
+        name:
+            description: Name of the member in the bundle
+            type: str
+        dest:
+            description: Path it was extracted to
+            type: str
+        size:
+            description: Size in bytes
+            type: int
+api_profile:
+    description: Timing of every SSO and API request made by the module, read by the api_profile callback plugin.
+    type: dict
+    returned: always
+'''
+
+
+class HashingWriter(object):
+    # Digest of the bundle, and its copy when O(archive) is set
+
+    def __init__(self, f=None):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def write(self, chunk):
+        self.digest.update(chunk)
+        if self.f is not None:
+            self.f.write(chunk)
+
+
+def run_module():
+    # define available arguments/parameters a user can pass to the module
+    module_args = dict(
+        cluster_id=dict(type='str', required=True),
+        logs_type=dict(type='str', required=False, choices=['all', 'host', 'controller'], default='all'),
+        host_id=dict(type='str', required=False),
+        dest=dict(type='path', required=True),
+        patterns=dict(type='list', elements='str', required=False, default=[]),
+        nested=dict(type='bool', required=False, default=True),
+        archive=dict(type='path', required=False),
+    )
+    module_args.update(auth_argument_spec())
+
+    # seed the result dict in the object
+    # we primarily care about changed and state
+    # changed is if this module effectively modified the target
+    # state will include any data that you want your module to pass back
+    # for consumption, for example, in a subsequent task
+    result = dict(
+        changed=False,
+        extracted=[],
+    )
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+        required_if=[('logs_type', 'host', ['host_id'])],
+    )
+
+    # if the user is working with this module in only check mode we do not
+    # want to download gigabytes of logs, only report that they would be written
+    if module.check_mode:
+        result['changed'] = True
+        module.exit_json(**result)
+
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    result['access_token'] = client.token
+
+    dest = module.params['dest']
+    params = {'logs_type': module.params['logs_type']}
+    if module.params['host_id']:
+        params['host_id'] = module.params['host_id']
+    archive_tmp = None
+    try:
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+        response = client.request('GET', '/clusters/' + module.params['cluster_id'] + '/logs', params=params,
+                                  stream=True)
+        try:
+            if response.status_code >= 400:
+                try:
+                    error = response.json()
+                except ValueError:
+                    error = {'code': str(response.status_code), 'reason': response.text[:200]}
+                raise AssistedError('Request failed: ', error)
+            archive_file = None
+            if module.params['archive']:
+                fd, archive_tmp = tempfile.mkstemp(
+                    dir=os.path.dirname(os.path.abspath(module.params['archive'])), prefix='.download-')
+                archive_file = os.fdopen(fd, 'wb')
+            writer = HashingWriter(archive_file)
+            reader = log_bundle.ChunkReader(response.iter_content(CHUNK_SIZE), tee=writer)
+            walker = log_bundle.BundleWalker(module, dest, module.params['patterns'], module.params['nested'])
+            try:
+                walker.walk(reader)
+                reader.drain()
+            finally:
+                if archive_file is not None:
+                    archive_file.close()
+        finally:
+            response.close()
+        if archive_tmp is not None:
+            module.atomic_move(archive_tmp, module.params['archive'])
+            archive_tmp = None
+
+        index = dict(
+            cluster_id=module.params['cluster_id'],
+            logs_type=module.params['logs_type'],
+            host_id=module.params['host_id'],
+            size=reader.size,
+            sha256=writer.digest.hexdigest(),
+            members=walker.members,
+        )
+        fd, tmp = tempfile.mkstemp(dir=dest, prefix='.index-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=1)
+        result['index'] = os.path.join(dest, 'index.json')
+        module.atomic_move(tmp, result['index'])
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    except (tarfile.TarError, requests.exceptions.RequestException) as e:
+        module.fail_json(msg='Error reading the log bundle: ' + str(e))
+    except (IOError, OSError) as e:
+        module.fail_json(msg='ERROR: ' + str(e))
+    finally:
+        if archive_tmp is not None and os.path.exists(archive_tmp):
+            os.remove(archive_tmp)
+
+    result['changed'] = True
+    result['members'] = len(walker.members)
+    result['size'] = reader.size
+    result['extracted'] = walker.extracted
+
+    # in the event of a successful module execution, you will want to
+    # simple AnsibleModule.exit_json(), passing the key/value results
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
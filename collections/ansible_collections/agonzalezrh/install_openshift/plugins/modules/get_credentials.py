@@ -4,10 +4,9 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
 
 
 DOCUMENTATION = r'''
@@ -26,10 +25,10 @@ options:
         required: true
         type: str
 
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
-        type: str
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.wait
 
 author:
     - Alberto Gonzalez (@agonzalezrh)
@@ -41,6 +40,14 @@ EXAMPLES = r'''
   agonzalezrh.install_openshift.get_credentials:
     cluster_id: "{{ newcluster.result.id }}"
     offline_token: "{{ offline_token }}"
+
+- name: Wait up to one hour for the credentials of a cluster being installed
+  register: credentials
+  agonzalezrh.install_openshift.get_credentials:
+    cluster_id: "{{ newcluster.result.id }}"
+    offline_token: "{{ offline_token }}"
+    wait: true
+    wait_timeout: 3600
 '''
 
 RETURN = r'''
@@ -48,6 +55,14 @@ result:
     description: Result from the API call
     type: dict
     returned: always
+attempts:
+    description: Number of requests made until the credentials were available.
+    type: int
+    returned: when O(wait=true)
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: always
 '''
 
 
@@ -55,12 +70,12 @@ def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         cluster_id=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
+        wait=dict(type='bool', required=False, default=False),
+        wait_timeout=dict(type='int', required=False, default=1800),
+        delay=dict(type='int', required=False, default=10),
+        max_delay=dict(type='int', required=False, default=60),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -79,23 +94,24 @@ def run_module():
         argument_spec=module_args,
         supports_check_mode=True
     )
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
-    result['access_token'] = response.json()["access_token"]
-
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
-    response = session.get(
-        "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params['cluster_id'] + "/credentials",
-        headers=headers,
-    )
-    if "code" in response.json():
-        module.fail_json(msg='Request failed: ' + response)
-    else:
-        result['result'] = response.json()
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    result['access_token'] = client.token
+
+    def get_credentials():
+        return client.call('GET', "/clusters/" + module.params['cluster_id'] + "/credentials")
+
+    try:
+        if module.params['wait']:
+            result['result'], result['attempts'] = client.wait_until(
+                get_credentials, module.params['wait_timeout'], module.params['delay'], module.params['max_delay'])
+        else:
+            result['result'] = get_credentials()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
 
     # simple AnsibleModule.exit_json(), passing the key/value results
     module.exit_json(**result)
@@ -4,11 +4,15 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
-import time
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.checkpoint import Checkpoint, INSTALL_STARTED_STATUSES
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.circuit_breaker import CircuitBreaker
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.hosts import Host
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.install_timeline import InstallTimeline
 
 
 DOCUMENTATION = r'''
@@ -31,15 +35,45 @@ options:
         required: False
         type: int
         default: 1800
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
-        type: str
     delay:
         description: Delay time between checks
         required: False
         type: int
         default: 60
+    stuck_host_timeout:
+        description:
+            - Seconds without any progress of a host (stage, progress info or percentage) before it is reported as stuck.
+            - Stuck detection is disabled when not set.
+            - Hosts waiting for the other hosts, at a C(Waiting for) stage such as C(Waiting for control plane), are
+              never reported as stuck.
+        required: False
+        type: int
+        version_added: "1.1.0"
+    stuck_host_action:
+        description: Fail the task at once or only warn when a host is stuck.
+        required: False
+        type: str
+        choices: ['fail', 'warn']
+        default: warn
+        version_added: "1.1.0"
+    install_retries:
+        description:
+            - How many times an installation that ends in V(error) is reset and started again.
+            - After the reset the module waits for every host to be V(known) again, hosts that were written to disk
+              have to boot the discovery ISO again for that. All the attempts share O(wait_timeout).
+            - Installations in V(error) or V(cancelled) always end the task at once with the failure reason,
+              V(cancelled) installations are never retried.
+        required: False
+        type: int
+        default: 0
+        version_added: "1.1.0"
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.checkpoint
+    - agonzalezrh.install_openshift.outage
+    - agonzalezrh.install_openshift.results
+    - agonzalezrh.install_openshift.state_store
 
 author:
     - Alberto Gonzalez (@agonzalezrh)
@@ -52,6 +86,27 @@ EXAMPLES = r'''
     offline_token: "{{ offline_token }}"
     wait_timeout: 1800
     delay: 60
+
+- name: Start or resume the installation, keeping the original deadline across reruns
+  agonzalezrh.install_openshift.install_cluster:
+    cluster_id: "{{ newcluster.result.id }}"
+    offline_token: "{{ offline_token }}"
+    wait_timeout: 1800
+    checkpoint_file: "{{ output_dir }}/{{ cluster_name }}/install.checkpoint"
+
+- name: Install and warn when a host makes no progress for 20 minutes
+  agonzalezrh.install_openshift.install_cluster:
+    cluster_id: "{{ newcluster.result.id }}"
+    offline_token: "{{ offline_token }}"
+    stuck_host_timeout: 1200
+    stuck_host_action: warn
+
+- name: Install, resetting and trying again up to twice when the installation fails
+  agonzalezrh.install_openshift.install_cluster:
+    cluster_id: "{{ newcluster.result.id }}"
+    offline_token: "{{ offline_token }}"
+    wait_timeout: 7200
+    install_retries: 2
 '''
 
 RETURN = r'''
@@ -59,22 +114,109 @@ result:
     description: Result from the API call
     type: dict
     returned: always
-
+resumed:
+    description: Whether the installation was already running and the module only resumed waiting for it.
+    type: bool
+    returned: success
+host_timeline:
+    description:
+        - Installation stages of every host seen while polling, one C([stage, started, duration]) row per stage.
+        - C(started) is in seconds since C(started_at), the start of the first stage of any host.
+        - The duration of the stage in progress runs until the last poll, it is null for the final stage.
+    type: dict
+    returned: when the installation was polled
+    sample: {"fields": ["stage", "started", "duration"], "started_at": "2023-05-10T12:00:00Z",
+             "hosts": {"master-0": [["Starting installation", 0.0, 12.4], ["Installing", 12.4, 95.1], ["Writing image to disk", 107.5, 240.0]]}}
+stuck_hosts:
+    description: Hosts whose progress did not change for more than O(stuck_host_timeout) seconds at the last poll.
+    type: list
+    elements: dict
+    returned: when O(stuck_host_timeout) is set
+    sample: [{"hostname": "worker-1", "stage": "Rebooting", "seconds": 1260}]
+attempts:
+    description:
+        - Installation attempts followed by the module, with their start offset and duration in seconds, final status,
+          failure reason and the hosts that failed.
+        - An installation already running or failed when the module starts is the first attempt.
+    type: list
+    elements: dict
+    returned: when the installation was polled
+    sample: [{"attempt": 1, "started": 0.0, "duration": 1510.2, "status": "error", "reason": "Timeout while waiting for cluster version to be available",
+              "failed_hosts": [{"hostname": "master-1", "status": "error", "stage": "Writing image to disk", "status_info": "Failed to pull image"}]},
+             {"attempt": 2, "started": 2105.7, "duration": 2650.1, "status": "installed", "reason": null, "failed_hosts": []}]
+outages:
+    description: API outages ridden out while polling, with their start offset and duration in seconds, failures and last error.
+    type: list
+    elements: dict
+    returned: always
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: when O(result_mode=full) and O(return_fields) is not set
 '''
 
 
+# Cluster statuses ending an installation attempt without a cluster
+FAILED_STATUSES = ("error", "cancelled")
+
+
+def _attempt(client, number):
+    return dict(attempt=number, started=round(client.clock() - client.started, 1), duration=None,
+                status=None, reason=None, failed_hosts=[])
+
+
+def _end_attempt(client, attempt, cluster):
+    # Records the final status of the attempt and, when it failed, why
+    attempt['duration'] = round(client.clock() - client.started - attempt['started'], 1)
+    attempt['status'] = cluster['status']
+    if cluster['status'] in FAILED_STATUSES:
+        attempt['reason'] = cluster.get('status_info') or 'no reason given by the API'
+        attempt['failed_hosts'] = [
+            dict(hostname=Host(data).hostname or data.get('id'), status=data.get('status'),
+                 stage=(data.get('progress') or {}).get('current_stage'), status_info=data.get('status_info'))
+            for data in cluster.get('hosts') or [] if data.get('status') in FAILED_STATUSES
+        ]
+    return attempt
+
+
+def _reinstall(module, client, breaker, cluster_id, deadline, delay):
+    # Resets the failed installation, waits for every host to be known and
+    # the cluster ready again, then starts the installation once more
+    cluster = client.reset_cluster(cluster_id)
+    warned = False
+    while True:
+        remaining = deadline - client.clock()
+        if remaining <= 0:
+            raise AssistedError('Timeout waiting for the hosts after the reset, status: ' + cluster['status'], cluster)
+        client.sleep(min(delay, remaining))
+        cluster = breaker.call(client.get_cluster, cluster_id, deadline=deadline)
+        hosts = cluster.get('hosts') or []
+        pending = [Host(data).hostname or data.get('id') for data in hosts if data.get('status') == 'resetting-pending-user-action']
+        if pending and not warned:
+            warned = True
+            module.warn('Hosts waiting to be booted from the discovery ISO after the reset: ' + ', '.join(pending))
+        if cluster['status'] == 'ready' and hosts and all(data.get('status') == 'known' for data in hosts):
+            break
+    client.install_cluster(cluster_id)
+    return cluster
+
+
 def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         cluster_id=dict(type='str', required=True),
-        offline_token=dict(type='str', required=True),
         wait_timeout=dict(type='int', required=False, default=1800),
         delay=dict(type='int', required=False, default=60),
+        state_store=dict(type='path', required=False),
+        checkpoint_file=dict(type='path', required=False),
+        outage_budget=dict(type='int', required=False, default=300),
+        stuck_host_timeout=dict(type='int', required=False),
+        stuck_host_action=dict(type='str', required=False, choices=['fail', 'warn'], default='warn'),
+        install_retries=dict(type='int', required=False, default=0),
+        result_mode=dict(type='str', required=False, choices=['full', 'summary'], default='full'),
+        return_fields=dict(type='list', elements='str', required=False),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -83,6 +225,7 @@ def run_module():
     # for consumption, for example, in a subsequent task
     result = dict(
         changed=False,
+        outages=[],
     )
 
     # the AnsibleModule object will be our abstraction working with Ansible
@@ -93,58 +236,107 @@ def run_module():
         argument_spec=module_args,
         supports_check_mode=True
     )
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
-    response = session.post(
-        "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params['cluster_id'] + "/actions/install",
-        headers=headers,
-    )
-    if "code" in response.json():
-        module.fail_json(msg='ERROR: ', **response.json())
-
-    retries = 0
-    cluster_installed = False
-    max_retries = module.params['wait_timeout'] / module.params['delay']
-
-    while retries < max_retries and cluster_installed is False:
-        response = access_token._get_access_token(module.params['offline_token'])
-        if response.status_code != 200:
-            module.fail_json(msg='Error getting access token ', **response.json())
-
+    store = state_store.open_store(module)
+    checkpoint = Checkpoint(module.params['checkpoint_file'], 'install_cluster', module.params['cluster_id'])
+    checkpoint.load()
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    breaker = CircuitBreaker(client, module.params['outage_budget'])
+    result['outages'] = breaker.outages
+    # A rerun must not trigger the install again when it is already running
+    try:
+        cluster = breaker.call(client.get_cluster, module.params['cluster_id'])
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    # A failed installation is picked up by the polling below, which resets
+    # it when retries are left
+    if cluster['status'] in INSTALL_STARTED_STATUSES + FAILED_STATUSES:
+        result['resumed'] = True
+    else:
         # if the user is working with this module in only check mode we do not
         # want to make any changes to the environment, just return the current
         # state with no modifications
         if module.check_mode:
+            result['changed'] = True
             module.exit_json(**result)
-
-        # manipulate or modify the state as needed (this is going to be the
-        # part where your module will do what it needs to do)
-        result['access_token'] = response.json()["access_token"]
-
-        headers = {
-            "Authorization": "Bearer " + response.json()["access_token"],
-            "Content-Type": "application/json"
-        }
-        response = session.get(
-            "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params['cluster_id'],
-            headers=headers,
+        checkpoint.clear()
+        response = client.request(
+            "POST",
+            "/clusters/" + module.params['cluster_id'] + "/actions/install"
         )
         if "code" in response.json():
             module.fail_json(msg='ERROR: ', **response.json())
-        if response.json()['status'] == "installed":
-            cluster_installed = True
-            result['result'] = response.json()
-        else:
-            time.sleep(module.params['delay'])
+        result['changed'] = True
+        result['resumed'] = False
+    if module.check_mode:
+        module.exit_json(**result)
+
+    deadline = checkpoint.start(module.params['wait_timeout'])
+    timeline = InstallTimeline(client.clock)
+    warned = set()
+    result['attempts'] = [_attempt(client, 1)]
+
+    # The access token is kept between polls, the client exchanges it again
+    # shortly before it expires or when the API answers 401
+    while True:
+        try:
+            cluster = breaker.call(client.get_cluster, module.params['cluster_id'], deadline=deadline)
+        except AssistedError as e:
+            module.fail_json(msg=e.msg, outages=breaker.outages, **e.result)
+        # manipulate or modify the state as needed (this is going to be the
+        # part where your module will do what it needs to do)
+        result['access_token'] = client.token
+        if store is not None:
+            store.record('cluster', cluster)
+        checkpoint.update(cluster['status'], cluster.get('status_updated_at'))
+        timeline.observe(cluster)
+        result['host_timeline'] = timeline.report()
+        if module.params['stuck_host_timeout'] is not None:
+            result['stuck_hosts'] = timeline.stuck(module.params['stuck_host_timeout'])
+            if result['stuck_hosts'] and module.params['stuck_host_action'] == 'fail':
+                result['result'] = cluster
+                module.fail_json(msg='Hosts stuck: ' + ', '.join(
+                    '%(hostname)s at "%(stage)s" for %(seconds)d seconds' % host for host in result['stuck_hosts']),
+                    **results.trim(result, module.params))
+            for host in result['stuck_hosts']:
+                if (host['hostname'], host['stage']) not in warned:
+                    warned.add((host['hostname'], host['stage']))
+                    module.warn('Host %(hostname)s has not progressed at stage "%(stage)s" for %(seconds)d seconds' % host)
+        if cluster['status'] == "installed":
+            _end_attempt(client, result['attempts'][-1], cluster)
+            result['result'] = cluster
+            checkpoint.clear()
+            break
+        if cluster['status'] in FAILED_STATUSES:
+            attempt = _end_attempt(client, result['attempts'][-1], cluster)
+            if cluster['status'] != 'error' or len(result['attempts']) > module.params['install_retries']:
+                result['result'] = cluster
+                checkpoint.clear()
+                module.fail_json(msg='Installation %s after %d attempt(s): %s' % (
+                    cluster['status'], len(result['attempts']), attempt['reason']), **results.trim(result, module.params))
+            module.warn('Installation attempt %d failed, resetting the cluster: %s' % (len(result['attempts']), attempt['reason']))
+            try:
+                cluster = _reinstall(module, client, breaker, module.params['cluster_id'], deadline, module.params['delay'])
+            except AssistedError as e:
+                module.fail_json(msg=e.msg, attempts=result['attempts'], outages=breaker.outages, **e.result)
+            result['attempts'].append(_attempt(client, len(result['attempts']) + 1))
+            timeline = InstallTimeline(client.clock)
+            warned = set()
+            continue
+        remaining = deadline - client.clock()
+        if remaining <= 0:
+            _end_attempt(client, result['attempts'][-1], cluster)
+            result['result'] = cluster
+            checkpoint.clear()
+            module.fail_json(msg='Timeout waiting for the cluster installation, status: ' + cluster['status'], **results.trim(result, module.params))
+        client.sleep(min(module.params['delay'], remaining))
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
-    module.exit_json(**result)
+    module.exit_json(**results.trim(result, module.params))
 
 
 def main():
@@ -4,10 +4,12 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import streaming
 
 
 DOCUMENTATION = r'''
@@ -42,16 +44,42 @@ options:
         description: If provided, returns only clusters that are owned by the specified user.
         required: false
         type: str
-    offline_token:
-        description: Offline token from console.redhat.com
-        required: true
+    name:
+        description: Only return the clusters with this name.
+        required: false
         type: str
+    status:
+        description: Only return the clusters in one of these statuses.
+        required: false
+        type: list
+        elements: str
+    max_age:
+        description:
+            - Maximum age in seconds of the last full listing recorded in O(state_store).
+            - When the listing is recent enough the clusters are returned from the state store without calling the API.
+            - The state store is not used when O(get_unregistered_clusters), O(openshift_cluster_id),
+              O(ams_subscription_ids) or O(with_hosts) is set.
+        required: false
+        type: int
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.results
+    - agonzalezrh.install_openshift.state_store
 
 author:
     - Alberto Gonzalez (@agonzalezrh)
 '''
 
 EXAMPLES = r'''
+- name: Find the clusters named sno, reusing a listing up to 5 minutes old
+  agonzalezrh.install_openshift.list_clusters:
+    offline_token: "{{ offline_token }}"
+    name: sno
+    state_store: ~/.cache/install_openshift/state.db
+    max_age: 300
+  register: listclusters
+
 - name: Create a new SNO Assisted Installer Cluster
   agonzalezrh.install_openshift.clusters:
     name: "{{ cluster_name }}"
@@ -69,8 +97,22 @@ result:
     description: Result from the API call
     type: dict
     returned: always
+cached:
+    description: Whether the clusters were returned from the state store instead of the API.
+    type: bool
+    returned: when the state store was used
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: when O(result_mode=full) and O(return_fields) is not set
 '''
 
+# Options sent as query parameters of GET /clusters
+QUERY_PARAMS = ('get_unregistered_clusters', 'openshift_cluster_id', 'ams_subscription_ids', 'with_hosts', 'owner')
+
+# Filters the state store cannot apply, the API is called when one is set
+UNCACHED_PARAMS = ('get_unregistered_clusters', 'openshift_cluster_id', 'ams_subscription_ids', 'with_hosts')
+
 
 def run_module():
     # define available arguments/parameters a user can pass to the module
@@ -80,12 +122,14 @@ def run_module():
         ams_subscription_ids=dict(type='list', required=False),
         with_hosts=dict(type='bool', required=False),
         owner=dict(type='str', required=False),
-        offline_token=dict(type='str', required=True)
+        name=dict(type='str', required=False),
+        status=dict(type='list', elements='str', required=False),
+        max_age=dict(type='int', required=False),
+        state_store=dict(type='path', required=False),
+        result_mode=dict(type='str', required=False, choices=['full', 'summary'], default='full'),
+        return_fields=dict(type='list', elements='str', required=False),
     )
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -105,28 +149,54 @@ def run_module():
         supports_check_mode=True,
     )
 
-    response = access_token._get_access_token(module.params['offline_token'])
-    if response.status_code != 200:
-        module.fail_json(msg='Error getting access token ', **response.json())
-
-    # if the user is working with this module in only check mode we do not
-    # want to make any changes to the environment, just return the current
-    # state with no modifications
-    if module.check_mode:
-        module.exit_json(**result)
-
-    headers = {
-        "Authorization": "Bearer " + response.json()["access_token"],
-        "Content-Type": "application/json"
-    }
-    params = module.params.copy()
-    params.pop("offline_token")
-    response = session.get(
-        "https://api.openshift.com/api/assisted-install/v2/clusters",
-        headers=headers,
+    store = state_store.open_store(module)
+    # The store holds the last unfiltered listing, without unregistered
+    # clusters and not always with hosts: only name, status and owner can be
+    # answered from it, the other filters are left to the API
+    cacheable = not [key for key in UNCACHED_PARAMS if module.params[key] not in (None, False)]
+    if store is not None and cacheable and store.is_fresh('cluster', module.params['max_age']):
+        result['result'] = store.query('cluster', name=module.params['name'], status=module.params['status'],
+                                       owner=module.params['owner'])
+        result['cached'] = True
+        module.exit_json(**results.trim(result, module.params))
+
+    client = AssistedClient.from_module(module)
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+
+    # Listing changes nothing, check mode runs it as well so that the
+    # following tasks can be planned against real clusters
+    query = dict(
+        (key, module.params[key]) for key in QUERY_PARAMS if module.params[key] is not None
     )
 
-    result['result'] = response.json()
+    def matches(cluster):
+        if module.params['name'] is not None and cluster.get('name') != module.params['name']:
+            return False
+        if module.params['status'] is not None and cluster.get('status') not in module.params['status']:
+            return False
+        return True
+
+    # The clusters are decoded one at a time and only the projection of the
+    # matching ones is kept, so memory does not grow with the full response
+    clusters = streaming.iter_list(client, "/clusters", params=query)
+    # Only an unfiltered listing refreshes the max_age of the store
+    full_sync = not [key for key in query if key != 'with_hosts']
+
+    def consume(items):
+        store.record_many('cluster', items, full_sync=full_sync)
+
+    try:
+        result['result'] = streaming.collect(clusters, matches, results.transformer(module.params),
+                                             consume if store is not None else None)
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+    except ValueError as e:
+        module.fail_json(msg='Invalid response: ' + str(e))
+    if store is not None:
+        store.close()
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
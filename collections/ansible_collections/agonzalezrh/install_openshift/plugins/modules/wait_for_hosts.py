@@ -4,11 +4,16 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
-import time
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import access_token
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import change_plan
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import host_rules
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import AssistedClient, AssistedError, auth_argument_spec
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import state_store
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.checkpoint import Checkpoint, INSTALL_STARTED_STATUSES
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.circuit_breaker import CircuitBreaker
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.hosts import ExpectedHosts, HostIndex, configure_hosts_patches, host_state
 
 
 DOCUMENTATION = r'''
@@ -31,9 +36,47 @@ options:
         required: false
         type: str
     expected_hosts:
-        description: Expected number of the hosts
-        required: true
+        description:
+            - Expected number of the hosts
+            - Required unless the hosts are expected by O(expected_macs), O(expected_hostnames) or O(expected_serials),
+              whose count is used by default.
+        required: false
         type: int
+    expected_macs:
+        description:
+            - MAC addresses of the expected hosts, one per host.
+            - When hosts are expected by MAC, hostname or serial, the wait ends once every one of them is V(known),
+              whatever the other hosts and the cluster status. Other hosts are returned in RV(unexpected_hosts).
+        required: false
+        type: list
+        elements: str
+        version_added: "1.1.0"
+    expected_hostnames:
+        description: Hostnames of the expected hosts, see O(expected_macs).
+        required: false
+        type: list
+        elements: str
+        version_added: "1.1.0"
+    expected_serials:
+        description: System or disk serial numbers of the expected hosts, see O(expected_macs).
+        required: false
+        type: list
+        elements: str
+        version_added: "1.1.0"
+    min_hosts:
+        description:
+            - Quorum of hosts to proceed with when not all of them become ready.
+            - Once at least this many expected hosts are V(known), the wait goes on for O(quorum_grace_period) seconds
+              more for the others and then ends successfully, returning the hosts still missing.
+        required: false
+        type: int
+        version_added: "1.1.0"
+    quorum_grace_period:
+        description: Seconds to wait for the remaining hosts once O(min_hosts) is reached.
+        required: false
+        type: int
+        default: 300
+        version_added: "1.1.0"
     wait_timeout:
         description: Wait timeout in seconds
         required: False
@@ -44,6 +87,76 @@ options:
         required: False
         type: int
         default: 10
+    host_rules:
+        description:
+            - Rules assigning the role and the installation disk of the discovered hosts.
+            - They are evaluated over all the hosts on every poll and the resulting updates are sent together.
+            - Hosts listed in O(configure_hosts) keep the values configured there.
+        required: false
+        type: dict
+        version_added: "1.1.0"
+        suboptions:
+            roles:
+                description:
+                    - Role rules, applied in order once O(expected_hosts) hosts have been discovered.
+                    - Each rule takes hosts not matched by a previous rule.
+                type: list
+                elements: dict
+                suboptions:
+                    role:
+                        description: Role to assign.
+                        required: true
+                        type: str
+                        choices: ['master', 'worker', 'auto-assign']
+                    hostname_regex:
+                        description: Only hosts whose hostname matches this regular expression.
+                        type: str
+                    count:
+                        description: Assign the role to this many hosts at most. All the matching hosts when unset.
+                        type: int
+                    order_by:
+                        description:
+                            - Order used to pick the first O(host_rules.roles[].count) hosts.
+                            - Hosts that already have the role come first, so that a host discovered later does not
+                              take it from them.
+                        type: str
+                        choices: ['mac', 'hostname', 'serial']
+                        default: mac
+            installation_disk:
+                description:
+                    - Selects the installation disk among the eligible disks of each host.
+                    - Disks are selected by ID, or by their by-path link or device path when they have no ID.
+                type: dict
+                suboptions:
+                    min_size_gb:
+                        description: Minimum disk size in GB.
+                        type: int
+                    max_size_gb:
+                        description: Maximum disk size in GB.
+                        type: int
+                    rotational:
+                        description: Only rotational (HDD) disks when true, only SSD and NVMe disks when false.
+                        type: bool
+                    prefer:
+                        description: Pick the smallest or the largest matching disk.
+                        type: str
+                        choices: ['smallest', 'largest']
+                        default: smallest
+    max_age:
+        description:
+            - In check mode, maximum age in seconds of the cluster and hosts recorded in O(state_store).
+            - When it is fresh enough the host updates are planned from the store without contacting SSO nor the API,
+              otherwise the cluster is read once.
+        required: false
+        type: int
+        version_added: "1.1.0"
+
+extends_documentation_fragment:
+    - agonzalezrh.install_openshift.auth
+    - agonzalezrh.install_openshift.checkpoint
+    - agonzalezrh.install_openshift.outage
+    - agonzalezrh.install_openshift.results
+    - agonzalezrh.install_openshift.state_store
 
 author:
     - Alberto Gonzalez (@agonzalezrh)
@@ -56,6 +169,46 @@ EXAMPLES = r'''
     offline_token: "{{ offline_token }}"
     expected_hosts: 1
     wait_timeout: 1200
+
+- name: Wait for the hosts and only keep their names and statuses
+  agonzalezrh.install_openshift.wait_for_hosts:
+    cluster_id: "{{ newcluster.result.id }}"
+    offline_token: "{{ offline_token }}"
+    expected_hosts: 6
+    return_fields:
+      - status
+      - hosts.requested_hostname
+      - hosts.status
+
+- name: Wait for the hosts, the 3 lowest MAC addresses are masters and install on the smallest SSD
+  agonzalezrh.install_openshift.wait_for_hosts:
+    cluster_id: "{{ newcluster.result.id }}"
+    infra_env_id: "{{ newinfraenv.result.id }}"
+    offline_token: "{{ offline_token }}"
+    expected_hosts: 5
+    host_rules:
+      roles:
+        - role: master
+          count: 3
+          order_by: mac
+        - role: worker
+      installation_disk:
+        min_size_gb: 120
+        rotational: false
+
+- name: Wait for the rack by MAC address, going on with 10 of them after 5 more minutes
+  agonzalezrh.install_openshift.wait_for_hosts:
+    cluster_id: "{{ newcluster.result.id }}"
+    offline_token: "{{ offline_token }}"
+    expected_macs: "{{ groups['workers'] | map('extract', hostvars, 'mac_address') | list }}"
+    min_hosts: 10
+    quorum_grace_period: 300
+    checkpoint_file: /tmp/wait_for_hosts.json
+  register: rack
+
+- name: Show the hosts that did not make it
+  ansible.builtin.debug:
+    var: rack.missing_hosts
 '''
 
 RETURN = r'''
@@ -63,20 +216,144 @@ result:
     description: Result from the API call
     type: dict
     returned: always
+resumed:
+    description: Set when the cluster installation had already started, so there were no hosts left to wait for.
+    type: bool
+    returned: when the installation had already started
+updated_hosts:
+    description: Updates sent to the hosts by hostname, from O(configure_hosts) and O(host_rules).
+    type: dict
+    returned: always
+    sample: {"master-0": {"host_role": "master", "disks_selected_config": [{"id": "/dev/disk/by-id/wwn-0x5000c500a0", "role": "install"}]}}
+missing_hosts:
+    description:
+        - Expected hosts not V(known) at the end of the wait, with their identity, hostname, status and status info.
+        - Hosts not discovered yet have the status V(not discovered). Without O(expected_macs), O(expected_hostnames)
+          and O(expected_serials) only the discovered hosts can be listed.
+        - The list is also saved in O(checkpoint_file) every time it changes during the wait.
+    type: list
+    elements: dict
+    returned: always
+    sample: [{"id": "mac=52:54:00:aa:bb:01", "hostname": "worker-7", "status": "insufficient", "status_info": "Host does not meet the minimum hardware requirements"}]
+unexpected_hosts:
+    description: Hostnames of the discovered hosts that are not among the expected ones.
+    type: list
+    elements: str
+    returned: when hosts are expected by MAC, hostname or serial
+quorum:
+    description: Set when the wait ended with O(min_hosts) hosts ready but not all of them.
+    type: bool
+    returned: when the quorum was used
+outages:
+    description: API outages ridden out while polling, with their start offset and duration in seconds, failures and last error.
+    type: list
+    elements: dict
+    returned: always
+plan:
+    description:
+        - Host updates a run without check mode sends from O(configure_hosts) and O(host_rules), against the hosts
+          discovered so far.
+    type: list
+    elements: dict
+    returned: in check mode
+    sample: [{"method": "PATCH", "path": "/infra-envs/0f3c5e2a-7d1b-4c6e-8b5f-2a9d4e6c8b10/hosts/3e1f9a7c-5b2d-4e8a-9c6f-1d7b3a5e9f20",
+              "body": {"host_role": "master"}}]
+plan_source:
+    description: Where the state the plan was computed against came from, V(state_store) or V(api).
+    type: str
+    returned: in check mode
+api_profile:
+    description: Timing of every SSO and API request made by the module and of the sleeps between polls, read by the api_profile callback plugin.
+    type: dict
+    returned: when O(result_mode=full) and O(return_fields) is not set
 '''
 
 
+def host_patches(hosts, params, expected_hosts):
+    # (host, PATCH body) of one poll, configure_hosts wins over host_rules
+    configured = set(configure_host['hostname'] for configure_host in params['configure_hosts'] or [])
+    return host_rules.merge(
+        configure_hosts_patches(hosts, params['configure_hosts']),
+        host_rules.plan(hosts, params['host_rules'], expected_hosts, skip=configured),
+    )
+
+
+def plan_updates(module, client, store, expected_hosts):
+    # Check mode: the host PATCHes of the current hosts, read from a fresh
+    # state store or with one GET of the cluster
+    cluster_id = module.params['cluster_id']
+    cluster = None
+    source = 'api'
+    if store is not None and module.params['max_age'] is not None:
+        # Cluster listings are recorded without their hosts, the hosts
+        # recorded with the cluster are needed too
+        clusters = store.query('cluster', object_id=cluster_id, max_age=module.params['max_age'])
+        hosts = store.query('host', parent_id=cluster_id, max_age=module.params['max_age'])
+        if clusters and hosts:
+            cluster = dict(clusters[0], hosts=hosts)
+            source = 'state_store'
+    if cluster is None:
+        try:
+            cluster = client.get_cluster(cluster_id)
+        except AssistedError as e:
+            module.fail_json(msg=e.msg, **e.result)
+        if store is not None:
+            store.record('cluster', cluster)
+    if store is not None:
+        store.close()
+    plan = []
+    diffs = []
+    if cluster['status'] in INSTALL_STARTED_STATUSES:
+        return plan, diffs, source
+    for host, data in host_patches(HostIndex(cluster.get('hosts')), module.params, expected_hosts):
+        before = {}
+        if 'host_role' in data:
+            before['host_role'] = host.role
+        if 'disks_selected_config' in data:
+            disk = host.data.get('installation_disk_id') or host.data.get('installation_disk_path')
+            before['disks_selected_config'] = [{"id": disk, "role": "install"}] if disk else []
+        plan.append(change_plan.planned(
+            'PATCH', '/infra-envs/' + module.params['infra_env_id'] + '/hosts/' + host.id, data))
+        diffs.append(change_plan.update_diff('host', host.hostname or host.id, before, data))
+    return plan, diffs, source
+
+
 def run_module():
     # define available arguments/parameters a user can pass to the module
     module_args = dict(
         cluster_id=dict(type='str', required=True),
         infra_env_id=dict(type='str', required=False),
-        offline_token=dict(type='str', required=True),
-        expected_hosts=dict(type='int', required=True),
+        expected_hosts=dict(type='int', required=False),
+        expected_macs=dict(type='list', elements='str', required=False),
+        expected_hostnames=dict(type='list', elements='str', required=False),
+        expected_serials=dict(type='list', elements='str', required=False),
+        min_hosts=dict(type='int', required=False),
+        quorum_grace_period=dict(type='int', required=False, default=300),
         wait_timeout=dict(type='int', required=False, default=600),
         delay=dict(type='int', required=False, default=10),
         configure_hosts=dict(type='list', required=False),
+        host_rules=dict(type='dict', required=False, options=dict(
+            roles=dict(type='list', elements='dict', options=dict(
+                role=dict(type='str', required=True, choices=['master', 'worker', 'auto-assign']),
+                hostname_regex=dict(type='str'),
+                count=dict(type='int'),
+                order_by=dict(type='str', choices=['mac', 'hostname', 'serial'], default='mac'),
+            )),
+            installation_disk=dict(type='dict', options=dict(
+                min_size_gb=dict(type='int'),
+                max_size_gb=dict(type='int'),
+                rotational=dict(type='bool'),
+                prefer=dict(type='str', choices=['smallest', 'largest'], default='smallest'),
+            )),
+        )),
+        state_store=dict(type='path', required=False),
+        max_age=dict(type='int', required=False),
+        checkpoint_file=dict(type='path', required=False),
+        outage_budget=dict(type='int', required=False, default=300),
+        result_mode=dict(type='str', required=False, choices=['full', 'summary'], default='full'),
+        return_fields=dict(type='list', elements='str', required=False),
     )
+    module_args.update(auth_argument_spec())
 
     # seed the result dict in the object
     # we primarily care about changed and state
@@ -85,6 +362,9 @@ def run_module():
     # for consumption, for example, in a subsequent task
     result = dict(
         changed=False,
+        updated_hosts={},
+        missing_hosts=[],
+        outages=[],
     )
 
     # the AnsibleModule object will be our abstraction working with Ansible
@@ -94,79 +374,113 @@ def run_module():
     module = AnsibleModule(
         argument_spec=module_args,
         supports_check_mode=True,
-        required_together=[['configure_hosts', 'infra_env_id']]
+        required_by={'configure_hosts': 'infra_env_id', 'host_rules': 'infra_env_id'},
+        required_one_of=[['expected_hosts', 'expected_macs', 'expected_hostnames', 'expected_serials']],
     )
 
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=5)
-    session.mount('https://', adapter)
+    expected = ExpectedHosts(module.params['expected_macs'], module.params['expected_hostnames'], module.params['expected_serials'])
+    expected_hosts = module.params['expected_hosts'] or len(expected)
+    min_hosts = module.params['min_hosts']
+    if min_hosts is not None and not 0 < min_hosts <= expected_hosts:
+        module.fail_json(msg='min_hosts must be between 1 and the %d expected hosts' % expected_hosts)
 
-    retries = 0
-    cluster_ready = False
-    max_retries = module.params['wait_timeout'] / module.params['delay']
-    while retries < max_retries and cluster_ready is False:
-        response = access_token._get_access_token(module.params['offline_token'])
-        if response.status_code != 200:
-            module.fail_json(msg='Error getting access token ', **response.json())
+    store = state_store.open_store(module)
 
-        # if the user is working with this module in only check mode we do not
-        # want to make any changes to the environment, just return the current
-        # state with no modifications
-        if module.check_mode:
-            module.exit_json(**result)
+    checkpoint_file = None if module.check_mode else module.params['checkpoint_file']
+    checkpoint = Checkpoint(checkpoint_file, 'wait_for_hosts', module.params['cluster_id'])
+    checkpoint.load()
+    deadline = checkpoint.start(module.params['wait_timeout'])
 
+    client = AssistedClient.from_module(module)
+
+    # if the user is working with this module in only check mode we do not
+    # want to make any changes to the environment, just return the host
+    # updates that would be sent
+    if module.check_mode:
+        plan, diffs, source = plan_updates(module, client, store, expected_hosts)
+        change_plan.exit_plan(module, result, plan, diffs, source)
+
+    try:
+        client.authenticate()
+    except AssistedError as e:
+        module.fail_json(msg=e.msg, **e.result)
+
+    breaker = CircuitBreaker(client, module.params['outage_budget'])
+    result['outages'] = breaker.outages
+    quorum_since = (checkpoint.data or {}).get('quorum_since')
+    # The access token is kept between polls, the client exchanges it again
+    # shortly before it expires or when the API answers 401
+    while True:
+        try:
+            cluster = breaker.call(client.get_cluster, module.params['cluster_id'], deadline=deadline)
+        except AssistedError as e:
+            module.fail_json(msg=e.msg, outages=breaker.outages, **e.result)
         # manipulate or modify the state as needed (this is going to be the
         # part where your module will do what it needs to do)
-        result['access_token'] = response.json()["access_token"]
-
-        headers = {
-            "Authorization": "Bearer " + response.json()["access_token"],
-            "Content-Type": "application/json"
-        }
-        response = session.get(
-            "https://api.openshift.com/api/assisted-install/v2/clusters/" + module.params['cluster_id'],
-            headers=headers,
-        )
-        if "code" in response.json():
-            module.fail_json(msg='Request failed: ', **response.json())
-        ready_hosts = 0
-        for host in response.json()['hosts']:
-            if host['status'] == "known":
-                ready_hosts = ready_hosts + 1
-            if 'configure_hosts' in module.params and module.params['configure_hosts'] is not None:
-                for configure_host in module.params['configure_hosts']:
-                    if host['requested_hostname'] == configure_host['hostname']:
-                        if host['role'] != configure_host['role']:
-                            data = {"host_role": configure_host['role']}
-                            responsepatch = session.patch(
-                                "https://api.openshift.com/api/assisted-install/v2/infra-envs/" + module.params['infra_env_id'] + "/hosts/" + host['id'],
-                                headers=headers,
-                                json=data
-                            )
-                            if "code" in responsepatch.json():
-                                module.fail_json(msg='Request failed: ', **responsepatch.json())
-                        if "installation_disk" in configure_host:
-                            if host['installation_disk_path'] != configure_host['installation_disk']:
-                                data = {"disks_selected_config": [{"id": configure_host['installation_disk'], "role": "install"}]}
-                                responsepatch = session.patch(
-                                    "https://api.openshift.com/api/assisted-install/v2/infra-envs/" + module.params['infra_env_id'] + "/hosts/" + host['id'],
-                                    headers=headers,
-                                    json=data
-                                )
-                                if "code" in responsepatch.json():
-                                    module.fail_json(msg='Request failed: ', **responsepatch.json())
-
-            if ready_hosts == module.params['expected_hosts'] and response.json()['status'] == "ready":
-                cluster_ready = True
-                result['result'] = response.json()
-            else:
-                time.sleep(module.params['delay'])
-
-    result['result'] = response.json()
+        result['access_token'] = client.token
+        if store is not None:
+            store.record('cluster', cluster)
+        checkpoint.update(cluster['status'], cluster.get('status_updated_at'))
+        # Hosts are already validated once the installation has started
+        if cluster['status'] in INSTALL_STARTED_STATUSES:
+            result['resumed'] = True
+            checkpoint.clear()
+            break
+        hosts = HostIndex(cluster['hosts'])
+        ready_hosts = hosts.count("known")
+        patches = host_patches(hosts, module.params, expected_hosts)
+        try:
+            host_rules.apply(client, module.params['infra_env_id'], patches)
+        except AssistedError as e:
+            module.fail_json(msg=e.msg, **e.result)
+        for host, data in patches:
+            result['changed'] = True
+            result['updated_hosts'].setdefault(host.hostname or host.id, {}).update(data)
+
+        # Hosts expected by identity only count when they are the right
+        # ones, stray hosts and the cluster status do not hold the wait
+        if len(expected):
+            ready, missing, result['unexpected_hosts'] = expected.match(hosts)
+            ready_hosts = len(ready)
+            done = not missing
+        else:
+            missing = [host_state(host) for host in hosts if host.status != "known"]
+            done = ready_hosts == expected_hosts and cluster['status'] == "ready"
+        result['missing_hosts'] = missing
+        checkpoint.note(missing_hosts=missing)
+        if done:
+            checkpoint.clear()
+            break
+        # The grace period starts the first time the quorum is reached and
+        # starts over when it is lost, a rerun keeps it through the checkpoint
+        if min_hosts is not None and ready_hosts >= min_hosts:
+            if quorum_since is None:
+                quorum_since = client.clock()
+                checkpoint.note(quorum_since=quorum_since)
+            if client.clock() - quorum_since >= module.params['quorum_grace_period']:
+                result['quorum'] = True
+                checkpoint.clear()
+                break
+        elif quorum_since is not None:
+            quorum_since = None
+            checkpoint.note(quorum_since=None)
+        remaining = deadline - client.clock()
+        if remaining <= 0:
+            result['result'] = cluster
+            msg = 'Timeout waiting for the hosts, %d of %d ready' % (ready_hosts, expected_hosts)
+            if missing:
+                msg += ', missing: ' + ', '.join(host['hostname'] or host['id'] for host in missing[:10])
+                if len(missing) > 10:
+                    msg += ' and %d more' % (len(missing) - 10)
+            checkpoint.clear()
+            module.fail_json(msg=msg, **results.trim(result, module.params))
+        client.sleep(min(module.params['delay'], remaining))
+
+    result['result'] = cluster
 
     # in the event of a successful module execution, you will want to
     # simple AnsibleModule.exit_json(), passing the key/value results
-    module.exit_json(**result)
+    module.exit_json(**results.trim(result, module.params))
 
 
 def main():
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import pytest
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.assisted_client import (
+    AssistedClient, AssistedError, TransientError)
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def client(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr('time.time', clock.time)
+    monkeypatch.setattr('time.sleep', clock.sleep)
+    return AssistedClient('offline-xyz')
+
+
+def failing(*errors):
+    # Raises the errors in turn, then returns "done"
+    errors = list(errors)
+
+    def func():
+        if errors:
+            raise errors.pop(0)
+        return 'done'
+    return func
+
+
+def test_wait_until_retries_not_ready_answers(client):
+    not_ready = AssistedError('Request failed: ', {'code': '409', 'reason': 'Cluster is not installed'})
+    transient = TransientError('Request failed: ', {'code': '503', 'reason': 'unavailable'})
+    assert client.wait_until(failing(not_ready, transient, not_ready), 1800, 10, 60) == ('done', 4)
+    assert client.sleep_time == 10 + 20 + 40
+
+
+@pytest.mark.parametrize('error', [
+    AssistedError('Request failed: ', {'code': '404', 'reason': 'Cluster not found'}),
+    AssistedError('Request failed: ', {'code': '401', 'reason': 'Unauthorized'}),
+    AssistedError('Error getting access token ', {'error': 'invalid_grant'}),
+])
+def test_wait_until_raises_other_errors_at_once(client, error):
+    with pytest.raises(AssistedError) as raised:
+        client.wait_until(failing(error), 1800, 10, 60)
+    assert raised.value is error
+    assert client.sleep_time == 0
+
+
+def test_wait_until_gives_up_at_timeout(client):
+    not_ready = AssistedError('Request failed: ', {'code': '409', 'reason': 'Cluster is not installed'})
+    with pytest.raises(AssistedError):
+        client.wait_until(failing(*[not_ready] * 100), 60, 10, 60)
+    assert client.sleep_time == 60
+
+
+class Module(object):
+    _name = 'install_cluster'
+
+    def __init__(self, **params):
+        self.params = dict(offline_token='offline-xyz', **params)
+        self.results = []
+
+    def exit_json(self, **kwargs):
+        self.results.append(kwargs)
+
+    def fail_json(self, msg, **kwargs):
+        self.results.append(dict(kwargs, msg=msg, failed=True))
+
+
+@pytest.mark.parametrize('params, profiled', [
+    (dict(), True),
+    (dict(result_mode='full'), True),
+    (dict(result_mode='summary'), False),
+    (dict(return_fields=['id']), False),
+])
+def test_api_profile_only_with_full_results(params, profiled):
+    module = Module(**params)
+    AssistedClient.from_module(module)
+    module.exit_json(changed=False)
+    module.fail_json(msg='boom')
+    assert ['api_profile' in result for result in module.results] == [profiled, profiled]
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.catalog import Catalog
+
+# GET /openshift-versions
+VERSIONS = {
+    '4.13': dict(display_name='4.13.21', cpu_architectures=['x86_64', 'arm64']),
+    '4.14': dict(display_name='4.14.10', cpu_architectures=['x86_64', 'arm64'], default=True),
+    '4.14-multi': dict(display_name='4.14.10-multi', cpu_architectures=['x86_64', 'arm64', 'ppc64le', 's390x']),
+}
+
+
+def test_multi_versions_keep_their_suffix():
+    catalog = Catalog(VERSIONS, ['lso', 'odf'])
+    assert catalog.validate(dict(openshift_version='4.14', cpu_architecture='multi')) == (
+        [], dict(openshift_version='4.14.10-multi'))
+    assert catalog.validate(dict(openshift_version='4.14.10', cpu_architecture='multi')) == (
+        [], dict(openshift_version='4.14.10-multi'))
+    assert catalog.validate(dict(openshift_version='4.14.8', cpu_architecture='multi')) == (
+        [], dict(openshift_version='4.14.8-multi'))
+    assert catalog.validate(dict(openshift_version='4.14.10-multi', cpu_architecture='multi')) == ([], {})
+
+
+def test_single_architecture_versions():
+    catalog = Catalog(VERSIONS, ['lso', 'odf'])
+    assert catalog.validate(dict(openshift_version='4.14')) == ([], dict(openshift_version='4.14.10'))
+    assert catalog.validate(dict(openshift_version='4.13.21', cpu_architecture='arm64')) == ([], {})
+    errors, _ = catalog.validate(dict(openshift_version='4.14', cpu_architecture='s390x'))
+    assert errors == ['cpu_architecture s390x is not available for OpenShift 4.14.10, use one of: x86_64, arm64']
+
+
+def test_mistyped_patch_releases_are_rejected():
+    catalog = Catalog(VERSIONS, ['lso', 'odf'])
+    for version in ('4.14.99', '4.14.1O', '4.14.10x', '4.14.'):
+        errors, changes = catalog.validate(dict(openshift_version=version))
+        assert errors == ['openshift_version %s is not available, known versions: 4.13.21, 4.14.10, 4.14.10-multi' % version]
+        assert changes == {}
+    assert catalog.warnings == []
+
+
+def test_unlisted_patch_releases_warn():
+    catalog = Catalog(VERSIONS, ['lso', 'odf'])
+    assert catalog.validate(dict(openshift_version='4.14.8')) == ([], {})
+    assert catalog.validate(dict(openshift_version='4.14.10')) == ([], {})
+    assert catalog.warnings == ['openshift_version 4.14.8 is not listed by the API, the latest listed release is 4.14.10']
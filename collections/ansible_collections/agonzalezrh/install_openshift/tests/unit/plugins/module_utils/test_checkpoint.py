@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import os
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.checkpoint import Checkpoint
+
+
+def test_rerun_resumes_the_saved_deadline(tmp_path):
+    path = str(tmp_path / 'wait.json')
+    first = Checkpoint(path, 'install_cluster', 'c1')
+    first.load()
+    assert first.start(600, now=1000) == 1600
+    first.update('installing', '2023-01-01T00:00:00Z')
+
+    rerun = Checkpoint(path, 'install_cluster', 'c1')
+    assert rerun.load()['last_status_updated_at'] == '2023-01-01T00:00:00Z'
+    assert rerun.start(600, now=1200) == 1600
+
+
+def test_passed_deadline_starts_a_new_wait(tmp_path):
+    path = str(tmp_path / 'wait.json')
+    first = Checkpoint(path, 'wait_for_hosts', 'c1')
+    first.start(600, now=1000)
+    first.note(quorum_since=1100)
+
+    rerun = Checkpoint(path, 'wait_for_hosts', 'c1')
+    rerun.load()
+    assert rerun.start(600, now=2000) == 2600
+    assert 'quorum_since' not in rerun.data
+    assert Checkpoint(path, 'wait_for_hosts', 'c1').load()['deadline'] == 2600
+
+
+def test_other_waits_are_ignored_and_clear_removes_the_file(tmp_path):
+    path = str(tmp_path / 'wait.json')
+    checkpoint = Checkpoint(path, 'install_cluster', 'c1')
+    checkpoint.start(600, now=1000)
+    assert Checkpoint(path, 'install_cluster', 'c2').load() is None
+    assert Checkpoint(path, 'wait_for_hosts', 'c1').load() is None
+    checkpoint.clear()
+    assert not os.path.exists(path)
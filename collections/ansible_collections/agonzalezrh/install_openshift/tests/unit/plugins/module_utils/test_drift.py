@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import drift
+
+NETWORK_YAML = '''interfaces:
+- name: eth0
+  type: ethernet
+  state: up
+  ipv4:
+    enabled: true
+    address:
+    - ip: 192.168.10.21
+      prefix-length: 24
+'''
+
+STATIC_NETWORK_CONFIG = [
+    dict(network_yaml=NETWORK_YAML.replace('.21', '.22'),
+         mac_interface_map=[dict(mac_address='52:54:00:AA:BB:02', logical_nic_name='eth0')]),
+    dict(network_yaml=NETWORK_YAML,
+         mac_interface_map=[dict(mac_address='52:54:00:AA:BB:01', logical_nic_name='eth0')]),
+]
+
+CLUSTER = dict(
+    cluster_network_cidr='10.128.0.1/14',
+    cluster_network_host_prefix=23,
+    service_networks=[dict(cidr='172.30.0.0/16')],
+    machine_networks=[dict(cidr='192.168.10.0/24')],
+    api_vips=[dict(ip='2001:db8:0::0005')],
+    ingress_vip='192.168.10.6',
+    http_proxy='http://proxy:3128',
+    no_proxy=' .example.com,192.168.10.0/24,.example.com',
+    olm_operators=[dict(name='odf'), dict(name='cnv')],
+)
+
+
+def stored(hosts, delimiter):
+    # Format the service returns the field in: the per-host JSON entries,
+    # sorted, joined by the delimiter
+    return delimiter.join(sorted(json.dumps(host) for host in hosts))
+
+
+def live_cluster():
+    # GET /clusters/{id} of a cluster created with CLUSTER
+    return dict(
+        id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11',
+        name='sno',
+        cluster_networks=[dict(cidr='10.128.0.0/14', host_prefix=23,
+                               cluster_id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11')],
+        service_networks=[dict(cidr='172.30.0.0/16', cluster_id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11')],
+        machine_networks=[dict(cidr='192.168.10.0/24', cluster_id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11')],
+        api_vips=[dict(ip='2001:db8::5', cluster_id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11', verification='succeeded')],
+        ingress_vips=[dict(ip='192.168.10.6', cluster_id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11')],
+        http_proxy='http://proxy:3128',
+        https_proxy='',
+        no_proxy='192.168.10.0/24,.example.com',
+        monitored_operators=[
+            dict(name='console', operator_type='builtin'),
+            dict(name='cnv', operator_type='olm'),
+            dict(name='lso', operator_type='olm'),
+            dict(name='odf', operator_type='olm'),
+        ],
+    )
+
+
+def live_infra_env(static_network_config):
+    # GET /infra-envs/{id}, static_network_config as the service stores it
+    return dict(
+        id='0f3c5e2a-7d1b-4c6e-8b5f-2a9d4e6c8b10',
+        name='sno_infra-env',
+        cluster_id='b1a8d1c6-3c2a-4f8e-9a43-6a3f0d1e2c11',
+        type='minimal-iso',
+        proxy=dict(http_proxy='', https_proxy='', no_proxy=''),
+        static_network_config=static_network_config,
+    )
+
+
+def check(cluster, infra_env, live, live_env):
+    desired = drift.desired_sections(cluster, infra_env)
+    return drift.compare(desired, drift.live_sections(desired, live, live_env))
+
+
+def test_matching_cluster_has_no_drift():
+    infra_env = dict(static_network_config=STATIC_NETWORK_CONFIG)
+    for delimiter in ('ZZZZZ', 'HOST_STATIC_NETWORK_CONFIG'):
+        digests, found = check(CLUSTER, infra_env, live_cluster(),
+                               live_infra_env(stored(STATIC_NETWORK_CONFIG, delimiter)))
+        assert found == {}
+        assert sorted(digests) == ['networking', 'operators', 'proxy', 'static_network_config']
+
+
+def test_static_network_config_stored_as_json():
+    infra_env = dict(static_network_config=STATIC_NETWORK_CONFIG)
+    _, found = check(None, infra_env, None, live_infra_env(json.dumps(STATIC_NETWORK_CONFIG)))
+    assert found == {}
+
+
+def test_static_network_config_drift():
+    hosts = [dict(host) for host in STATIC_NETWORK_CONFIG]
+    hosts[0]['network_yaml'] = NETWORK_YAML.replace('.21', '.23')
+    _, found = check(None, dict(static_network_config=STATIC_NETWORK_CONFIG), None,
+                     live_infra_env(stored(hosts, 'ZZZZZ')))
+    assert list(found) == ['static_network_config']
+
+
+def test_parse_static_network_config():
+    assert drift.parse_static_network_config('') == []
+    assert drift.parse_static_network_config(None) == []
+    parsed = drift.parse_static_network_config(stored(STATIC_NETWORK_CONFIG, 'ZZZZZ'))
+    assert sorted(host['mac_interface_map'][0]['mac_address'] for host in parsed) == [
+        '52:54:00:AA:BB:01', '52:54:00:AA:BB:02']
+
+
+def test_normalizers():
+    assert drift._cidr('10.128.0.1/14') == '10.128.0.0/14'
+    assert drift._cidr('2001:DB8:0:0::/64') == '2001:db8::/64'
+    assert drift._ip('2001:db8:0::0005') == '2001:db8::5'
+    assert drift._vips([dict(ip='192.168.10.6'), '192.168.10.5']) == ['192.168.10.5', '192.168.10.6']
+    assert drift._no_proxy(' b.com,a.com,,b.com ') == 'a.com,b.com'
+    interfaces = drift._static_network_config(STATIC_NETWORK_CONFIG)
+    assert [host['mac_interface_map'][0]['mac_address'] for host in interfaces] == [
+        '52:54:00:aa:bb:01', '52:54:00:aa:bb:02']
+
+
+def test_dependency_operators_are_not_drift():
+    cluster = dict(olm_operators=[dict(name='odf')])
+    _, found = check(cluster, None, live_cluster(), None)
+    assert found == {}
+    cluster = dict(olm_operators=[dict(name='odf'), dict(name='mce')])
+    _, found = check(cluster, None, live_cluster(), None)
+    assert found == {'operators': {'value': {'desired': ['mce', 'odf'], 'live': ['odf']}}}
+
+
+def test_networking_drift():
+    live = live_cluster()
+    live['api_vips'] = [dict(ip='2001:db8::6')]
+    _, found = check(CLUSTER, None, live, None)
+    assert found == {'networking': {'api_vips': {'desired': ['2001:db8::5'], 'live': ['2001:db8::6']}}}
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import host_rules
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.hosts import HostIndex
+
+ROLES = dict(roles=[dict(role='master', count=3), dict(role='worker')])
+
+
+def host(index, role='auto-assign', disks=None):
+    inventory = dict(
+        hostname='node-%d' % index,
+        interfaces=[dict(name='eth0', mac_address='52:54:00:00:00:%02x' % index)],
+        disks=disks or [],
+    )
+    return dict(id='host-%d' % index, requested_hostname='node-%d' % index, role=role, status='known',
+                inventory=json.dumps(inventory))
+
+
+def roles(patches):
+    return dict((patched.hostname, data['host_role']) for patched, data in patches if 'host_role' in data)
+
+
+def test_roles_by_mac():
+    index = HostIndex([host(index) for index in (5, 3, 4, 1, 2)])
+    assert roles(host_rules.plan(index, ROLES, expected_hosts=5)) == {
+        'node-1': 'master', 'node-2': 'master', 'node-3': 'master', 'node-4': 'worker', 'node-5': 'worker'}
+
+
+def test_later_host_does_not_take_a_role():
+    hosts = [host(index, 'master') for index in (3, 4, 5)] + [host(6, 'worker')]
+    # node-1 has the lowest MAC but the masters were already assigned
+    index = HostIndex(hosts + [host(1)])
+    assert roles(host_rules.plan(index, ROLES, expected_hosts=4)) == {'node-1': 'worker'}
+
+
+def test_disk_without_id_is_selected_by_path():
+    disks = [
+        dict(by_path='/dev/disk/by-path/pci-0000:00:05.0', path='/dev/vda', size_bytes=120 * 10 ** 9, drive_type='SSD'),
+        dict(path='/dev/vdb', size_bytes=500 * 10 ** 9, drive_type='SSD'),
+        dict(size_bytes=50 * 10 ** 9, drive_type='SSD'),
+    ]
+    index = HostIndex([host(1, 'master', disks)])
+    patches = host_rules.plan(index, dict(installation_disk=dict(prefer='smallest')))
+    assert patches[0][1] == {'disks_selected_config': [{'id': '/dev/disk/by-path/pci-0000:00:05.0', 'role': 'install'}]}
+    patches = host_rules.plan(index, dict(installation_disk=dict(prefer='largest')))
+    assert patches[0][1] == {'disks_selected_config': [{'id': '/dev/vdb', 'role': 'install'}]}
+    index.hosts[0].data['installation_disk_path'] = '/dev/vdb'
+    assert host_rules.plan(index, dict(installation_disk=dict(prefer='largest'))) == []
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+
+import pytest
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import hosts
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.hosts import Host, HostIndex
+
+
+def host(index, updated_at='2023-01-01T00:00:00Z', cpus=4):
+    inventory = dict(
+        hostname='node-%d' % index,
+        cpu=dict(count=cpus),
+        interfaces=[dict(name='eth0', mac_address='52:54:00:00:00:%02X' % index)],
+    )
+    return dict(id='host-%d' % index, status='known', updated_at=updated_at, inventory=json.dumps(inventory))
+
+
+@pytest.fixture
+def decoded(monkeypatch):
+    # Host IDs whose inventory was decoded, with an empty cache
+    hosts.clear_inventory_cache()
+    calls = []
+    loads = json.loads
+
+    def counting_loads(value):
+        calls.append(loads(value).get('hostname'))
+        return loads(value)
+
+    monkeypatch.setattr(hosts.json, 'loads', counting_loads)
+    yield calls
+    hosts.clear_inventory_cache()
+
+
+def test_inventory_is_decoded_lazily(decoded):
+    index = HostIndex([host(1), dict(host(2), requested_hostname='master-0')])
+    assert [item.status for item in index] == ['known', 'known']
+    assert index.by_id['host-2'].hostname == 'master-0'
+    assert decoded == []
+    assert index.by_id['host-1'].hostname == 'node-1'
+    assert index.by_id['host-1'].cpu_count == 4
+    assert decoded == ['node-1']
+
+
+def test_unchanged_hosts_reuse_the_decoded_inventory(decoded):
+    Host(host(1)).inventory
+    assert Host(host(1)).cpu_count == 4
+    assert decoded == ['node-1']
+
+
+def test_changed_updated_at_invalidates_the_entry(decoded):
+    assert Host(host(1)).cpu_count == 4
+    assert Host(host(1, updated_at='2023-01-01T00:01:00Z', cpus=8)).cpu_count == 8
+    assert Host(host(1, updated_at='2023-01-01T00:01:00Z', cpus=8)).cpu_count == 8
+    assert decoded == ['node-1', 'node-1']
+
+
+def test_hosts_without_updated_at_are_not_cached(decoded):
+    Host(host(1, updated_at=None)).inventory
+    Host(host(1, updated_at=None)).inventory
+    assert decoded == ['node-1', 'node-1']
+
+
+def test_cache_is_capped(decoded, monkeypatch):
+    monkeypatch.setattr(hosts, 'INVENTORY_CACHE_SIZE', 3)
+    for index in range(1, 5):
+        Host(host(index)).inventory
+    assert sorted(hosts._INVENTORY_CACHE) == ['host-4']
+    # Hosts already cached are refreshed in place
+    for index in (5, 6):
+        Host(host(index)).inventory
+    Host(host(6, updated_at='2023-01-01T00:01:00Z')).inventory
+    assert sorted(hosts._INVENTORY_CACHE) == ['host-4', 'host-5', 'host-6']
+
+
+def test_mac_index_is_built_on_first_use(decoded):
+    index = HostIndex([host(1), host(2)])
+    assert index.count('known') == 2
+    assert decoded == []
+    assert index.find(mac='52:54:00:00:00:02').id == 'host-2'
+    assert decoded == ['node-1', 'node-2']
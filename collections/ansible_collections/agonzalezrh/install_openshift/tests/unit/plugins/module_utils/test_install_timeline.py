@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.install_timeline import InstallTimeline
+
+
+class Clock(object):
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def cluster(*stages):
+    # One host per stage, the service clock one hour ahead of the client
+    return dict(hosts=[
+        dict(id='host-%d' % index, requested_hostname='master-%d' % index, status='installing',
+             progress=dict(current_stage=stage, stage_started_at='2023-05-10T13:00:00Z'))
+        for index, stage in enumerate(stages)])
+
+
+def test_times_come_from_the_client_clock():
+    clock = Clock(1683716400.0)
+    timeline = InstallTimeline(clock)
+    timeline.observe(cluster('Installing'))
+    clock.now += 30
+    timeline.observe(cluster('Writing image to disk'))
+    clock.now += 10
+    report = timeline.report()
+    assert report['started_at'] == '2023-05-10T11:00:00Z'
+    assert report['hosts']['master-0'] == [['Installing', 0.0, 30.0], ['Writing image to disk', 30.0, 10.0]]
+
+
+def test_stuck_skips_waiting_stages():
+    clock = Clock(1000.0)
+    timeline = InstallTimeline(clock)
+    timeline.observe(cluster('Rebooting', 'Waiting for control plane', 'Done'))
+    clock.now += 600
+    assert timeline.stuck(900) == []
+    clock.now += 600
+    assert timeline.stuck(900) == [dict(hostname='master-0', stage='Rebooting', seconds=1200)]
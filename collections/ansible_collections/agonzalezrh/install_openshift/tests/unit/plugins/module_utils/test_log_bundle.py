@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import io
+import os
+import tarfile
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.log_bundle import (
+    BundleWalker,
+    ChunkReader,
+    safe_path,
+)
+
+
+class FakeModule(object):
+
+    def atomic_move(self, src, dest):
+        os.rename(src, dest)
+
+
+def archive(members, mode='w:gz'):
+    # (name, data) pairs, a name starting with "link:" adds a symlink to data
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode=mode) as tar:
+        for name, data in members:
+            if name.startswith('link:'):
+                info = tarfile.TarInfo(name[5:])
+                info.type = tarfile.SYMTYPE
+                info.linkname = data
+                tar.addfile(info)
+            else:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buf.getvalue()
+
+
+def chunks(body, size=100):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+def bundle():
+    host = archive([('./var/log/kubelet.log', b'kubelet\n'), ('./var/log/crio.log', b'crio\n')])
+    return archive([
+        ('cluster_events.json', b'[]'),
+        ('master-0.tar.gz', host),
+        ('worker-0.tar', archive([('./var/log/kubelet.log', b'worker\n')], mode='w')),
+    ])
+
+
+def walk(tmp_path, patterns, body=None, nested=True):
+    dest = str(tmp_path / 'logs')
+    walker = BundleWalker(FakeModule(), dest, patterns, nested=nested)
+    reader = ChunkReader(chunks(body or bundle()))
+    walker.walk(reader)
+    reader.drain()
+    return dest, walker
+
+
+def test_nested_archives_are_indexed(tmp_path):
+    dest, walker = walk(tmp_path, [])
+    assert [member['name'] for member in walker.members] == [
+        'cluster_events.json',
+        'master-0.tar.gz',
+        'master-0.tar.gz/var/log/kubelet.log',
+        'master-0.tar.gz/var/log/crio.log',
+        'worker-0.tar',
+        'worker-0.tar/var/log/kubelet.log',
+    ]
+    assert walker.extracted == []
+    assert not os.path.exists(dest)
+
+
+def test_only_matching_members_are_extracted(tmp_path):
+    dest, walker = walk(tmp_path, ['*/kubelet.log'])
+    assert sorted(item['name'] for item in walker.extracted) == [
+        'master-0.tar.gz/var/log/kubelet.log', 'worker-0.tar/var/log/kubelet.log']
+    with open(os.path.join(dest, 'master-0', 'var', 'log', 'kubelet.log'), 'rb') as f:
+        assert f.read() == b'kubelet\n'
+    with open(os.path.join(dest, 'worker-0', 'var', 'log', 'kubelet.log'), 'rb') as f:
+        assert f.read() == b'worker\n'
+    assert not os.path.exists(os.path.join(dest, 'master-0', 'var', 'log', 'crio.log'))
+
+
+def test_matching_nested_archive_is_kept_as_is(tmp_path):
+    dest, walker = walk(tmp_path, ['master-0.tar.gz'])
+    assert [item['name'] for item in walker.extracted] == ['master-0.tar.gz']
+    assert os.listdir(dest) == ['master-0.tar.gz']
+    assert 'master-0.tar.gz/var/log/kubelet.log' not in [member['name'] for member in walker.members]
+
+
+def test_unsafe_members_are_skipped(tmp_path):
+    body = archive([
+        ('../escape.log', b'x'),
+        ('/etc/passwd.log', b'x'),
+        ('logs/../../up.log', b'x'),
+        ('link:evil.log', '/etc/passwd'),
+        ('ok.log', b'ok'),
+    ])
+    dest, walker = walk(tmp_path, ['*.log'], body=body)
+    assert [item['name'] for item in walker.extracted] == ['ok.log']
+    assert os.listdir(dest) == ['ok.log']
+    assert not os.path.exists(str(tmp_path / 'escape.log'))
+    assert not os.path.exists(str(tmp_path / 'up.log'))
+    assert 'evil.log' not in [member['name'] for member in walker.members]
+
+
+def test_safe_path():
+    assert safe_path('/dest', 'a/b.log') == os.path.join('/dest', 'a', 'b.log')
+    assert safe_path('/dest', 'a/../b.log') == os.path.join('/dest', 'b.log')
+    assert safe_path('/dest', 'a\\b.log') == os.path.join('/dest', 'a', 'b.log')
+    for name in ('../b.log', 'a/../../b.log', '/b.log', '..', '.', ''):
+        assert safe_path('/dest', name) is None
+
+
+def test_chunk_reader_tees_every_chunk():
+    tee = io.BytesIO()
+    reader = ChunkReader([b'abc', b'', b'defg', b'h'], tee=tee)
+    assert reader.read(2) == b'ab'
+    assert reader.read(3) == b'cde'
+    assert reader.read() == b'fgh'
+    assert reader.read(1) == b''
+    assert reader.size == 8
+    assert tee.getvalue() == b'abcdefgh'
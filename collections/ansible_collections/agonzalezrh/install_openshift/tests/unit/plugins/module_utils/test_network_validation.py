@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import pytest
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.network_validation import validate
+
+
+def params(**overrides):
+    values = dict(
+        machine_networks=[dict(cidr='10.0.0.0/24')],
+        cluster_networks=[dict(cidr='10.128.0.0/14', host_prefix=23)],
+        service_networks=[dict(cidr='172.30.0.0/16')],
+        api_vips=[dict(ip='10.0.0.5')],
+        ingress_vips=[dict(ip='10.0.0.6')],
+    )
+    values.update(overrides)
+    return values
+
+
+DUAL_STACK = dict(
+    machine_networks=[dict(cidr='10.0.0.0/24'), dict(cidr='fd00::/64')],
+    cluster_networks=[dict(cidr='10.128.0.0/14', host_prefix=23), dict(cidr='fd01::/48', host_prefix=64)],
+    service_networks=[dict(cidr='172.30.0.0/16'), dict(cidr='fd02::/112')],
+    api_vips=[dict(ip='10.0.0.5'), dict(ip='fd00::5')],
+    ingress_vips=[dict(ip='10.0.0.6'), dict(ip='fd00::6')],
+)
+
+
+@pytest.mark.parametrize('overrides', [
+    {},
+    DUAL_STACK,
+    dict(api_vips=None, ingress_vips=None, api_vip='10.0.0.5', ingress_vip='10.0.0.6'),
+    dict(cluster_networks=None, service_networks=None,
+         cluster_network_cidr='10.128.0.0/14', cluster_network_host_prefix=23, service_network_cidr='172.30.0.0/16'),
+    dict(cluster_networks=[dict(cidr='10.128.0.0/21', host_prefix=23)], high_availability_mode='None'),
+    dict(machine_networks=[dict(cidr='10.0.0.0/24'), dict(cidr='10.0.1.0/24')], ingress_vips=[dict(ip='10.0.1.6')]),
+])
+def test_accepted(overrides):
+    assert validate(params(**overrides)) == []
+
+
+def test_overlapping_networks():
+    assert validate(params(service_networks=[dict(cidr='10.130.0.0/16')])) == [
+        'cluster_networks[0] 10.128.0.0/14 overlaps with service_networks[0] 10.130.0.0/16']
+    assert validate(params(machine_networks=[dict(cidr='10.0.0.0/16'), dict(cidr='10.0.1.0/24')])) == [
+        'machine_networks[0] 10.0.0.0/16 overlaps with machine_networks[1] 10.0.1.0/24']
+    # Adjacent networks do not overlap
+    assert validate(params(service_networks=[dict(cidr='10.132.0.0/16')])) == []
+
+
+def test_vip_membership():
+    assert validate(params(api_vips=[dict(ip='192.168.1.5')])) == [
+        'api_vips[0] 192.168.1.5 is not inside any machine network']
+    assert validate(params(ingress_vips=[dict(ip='10.0.0.255')])) == [
+        'ingress_vips[0] 10.0.0.255 is not a usable address of 10.0.0.0/24']
+    assert validate(params(ingress_vips=[dict(ip='10.0.0.5')])) == [
+        'ingress_vips[0] 10.0.0.5 is already used by api_vips[0]']
+    assert validate(params(api_vip='10.0.0.7')) == ['api_vip 10.0.0.7 does not match api_vips[0] 10.0.0.5']
+
+
+def test_vip_inside_pod_or_service_network():
+    errors = validate(params(machine_networks=[dict(cidr='172.30.0.0/24')], service_networks=[dict(cidr='172.30.0.0/16')],
+                             api_vips=[dict(ip='172.30.0.5')], ingress_vips=[dict(ip='172.30.0.6')]))
+    assert 'api_vips[0] 172.30.0.5 is inside service_networks[0] 172.30.0.0/16' in errors
+    assert 'ingress_vips[0] 172.30.0.6 is inside service_networks[0] 172.30.0.0/16' in errors
+
+
+def test_host_prefix_capacity():
+    # A /21 split in /23 subnets fits 4 nodes
+    assert validate(params(cluster_networks=[dict(cidr='10.128.0.0/21', host_prefix=23)], expected_hosts=4)) == []
+    assert validate(params(cluster_networks=[dict(cidr='10.128.0.0/21', host_prefix=23)], expected_hosts=5)) == [
+        'cluster_networks[0]: 10.128.0.0/21 with host prefix /23 only fits 4 nodes, 5 expected']
+    assert validate(params(cluster_networks=[dict(cidr='10.128.0.0/14', host_prefix=12)])) == [
+        'cluster_networks[0]: host prefix /12 is outside 10.128.0.0/14']
+    assert validate(params(cluster_networks=[dict(cidr='10.128.0.0/14', host_prefix=33)])) == [
+        'cluster_networks[0]: host prefix /33 is outside 10.128.0.0/14']
+
+
+def test_dual_stack_ordering():
+    swapped = dict(DUAL_STACK, machine_networks=[dict(cidr='fd00::/64'), dict(cidr='10.0.0.0/24')])
+    assert 'machine_networks: dual-stack configurations must list IPv4 before IPv6' in validate(params(**swapped))
+
+    two_ipv4 = dict(DUAL_STACK, api_vips=[dict(ip='10.0.0.5'), dict(ip='10.0.0.7')])
+    assert validate(params(**two_ipv4)) == ['api_vips: at most one IPv4 address is allowed']
+
+    # A single-stack VIP list only has to follow the order of the networks
+    assert validate(params(**dict(DUAL_STACK, api_vips=[dict(ip='10.0.0.5')]))) == []
+    ipv6_only = dict(DUAL_STACK, ingress_vips=[dict(ip='fd00::6')])
+    assert validate(params(**ipv6_only)) == ['ingress_vips: IP families must follow the order IPv4, IPv6']
+
+    single_stack_service = dict(DUAL_STACK, service_networks=[dict(cidr='172.30.0.0/16')])
+    assert validate(params(**single_stack_service)) == ['service_networks: IP families must follow the order IPv4, IPv6']
+
+
+def test_invalid_values():
+    assert validate(params(machine_networks=[dict(cidr='10.0.0.1/24')], api_vips=None, ingress_vips=None)) == [
+        'machine_networks[0]: invalid CIDR 10.0.0.1/24 (10.0.0.1/24 has host bits set)']
+    assert validate(params(api_vips=[dict(ip='10.0.0.300')])) == [
+        "api_vips[0]: invalid IP address 10.0.0.300 ('10.0.0.300' does not appear to be an IPv4 or IPv6 address)"]
+    assert validate(params(machine_networks=[dict()], api_vips=None, ingress_vips=None)) == [
+        'machine_networks[0]: missing cidr']
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import pytest
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils import results
+
+HOST = dict(kind='Host', id='h1', requested_hostname='master-0', status='known', role='master',
+            inventory='{"disks": []}', progress=dict(current_stage='Done', stage_updated_at='t'))
+CLUSTER = dict(kind='Cluster', id='c1', name='demo', status='ready', pull_secret_set=True,
+               hosts=[HOST, dict(HOST, id='h2', requested_hostname='master-1')])
+
+
+def test_field_tree():
+    assert results.field_tree(['id', 'hosts.status', 'hosts.progress.current_stage']) == {
+        'id': None, 'hosts': {'status': None, 'progress': {'current_stage': None}}}
+    # A whole parent wins over its nested fields, whatever the order
+    assert results.field_tree(['hosts', 'hosts.status']) == {'hosts': None}
+    assert results.field_tree(['hosts.status', 'hosts']) == {'hosts': None}
+
+
+def test_project_nested_paths_and_lists():
+    tree = results.field_tree(['id', 'hosts.id', 'hosts.progress.current_stage', 'missing'])
+    assert results.project(CLUSTER, tree) == dict(id='c1', hosts=[
+        dict(id='h1', progress=dict(current_stage='Done')),
+        dict(id='h2', progress=dict(current_stage='Done')),
+    ])
+    assert results.project([CLUSTER, dict(CLUSTER, id='c2')], results.field_tree(['id'])) == [
+        dict(id='c1'), dict(id='c2')]
+    # Scalars met where a nested path was expected are kept
+    assert results.project(dict(hosts='none'), results.field_tree(['hosts.id'])) == dict(hosts='none')
+
+
+def test_summarize():
+    summary = results.summarize([CLUSTER, 'other'])
+    assert summary[1] == 'other'
+    assert 'pull_secret_set' not in summary[0]
+    assert summary[0]['hosts'][0] == dict(id='h1', requested_hostname='master-0', status='known', role='master',
+                                          progress=dict(current_stage='Done', stage_updated_at='t'))
+    assert results.summarize(HOST) == dict(kind='Host', id='h1', requested_hostname='master-0', status='known',
+                                           role='master', progress=dict(current_stage='Done', stage_updated_at='t'))
+    # Objects of an unknown kind are returned as they are
+    assert results.summarize(dict(kind='Manifest', content='x')) == dict(kind='Manifest', content='x')
+
+
+@pytest.mark.parametrize('params', [
+    dict(result_mode='summary'),
+    dict(return_fields=['id']),
+    dict(result_mode='full', return_fields=['id']),
+])
+def test_trim_drops_the_access_token(params):
+    result = dict(changed=False, access_token='T', result=CLUSTER)
+    trimmed = results.trim(result, params)
+    assert 'access_token' not in trimmed
+    assert result['access_token'] == 'T'
+    assert trimmed['result']['id'] == 'c1'
+
+
+def test_full_mode_keeps_everything():
+    result = dict(changed=False, access_token='T', result=CLUSTER)
+    assert results.trim(result, dict(result_mode='full')) is result
+    assert results.trim(result, dict()) is result
+    assert results.transformer(dict(result_mode='full', return_fields=[])) is None
+
+
+def test_trim_keys():
+    result = dict(access_token='T', result=CLUSTER, clusters=[CLUSTER])
+    trimmed = results.trim(result, dict(return_fields=['name']), keys=('clusters',))
+    assert trimmed == dict(result=CLUSTER, clusters=[dict(name='demo')])
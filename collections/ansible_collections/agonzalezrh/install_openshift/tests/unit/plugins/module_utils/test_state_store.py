@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.state_store import StateStore
+
+
+def cluster(object_id, hosts=()):
+    return dict(id=object_id, name='cluster-' + object_id, status='ready',
+                hosts=[dict(id=host_id, requested_hostname=host_id, status='known') for host_id in hosts])
+
+
+def test_full_sync_forgets_deleted_clusters_and_their_hosts(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'))
+    store.record_many('cluster', [cluster('a', ['a-0']), cluster('b', ['b-0', 'b-1'])], full_sync=True, now=100)
+    store.record_many('cluster', [cluster('a', ['a-0'])], full_sync=True, now=200)
+    assert [item['id'] for item in store.query('cluster')] == ['a']
+    assert [item['id'] for item in store.query('host')] == ['a-0']
+    # The history of the deleted cluster is kept
+    assert len(store.history('cluster', 'b')) == 1
+
+
+def test_partial_listing_forgets_nothing(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'))
+    store.record_many('cluster', [cluster('a'), cluster('b')], full_sync=True, now=100)
+    store.record_many('cluster', [cluster('a')], now=200)
+    assert [item['id'] for item in store.query('cluster')] == ['a', 'b']
+    assert store.last_sync('cluster') == 100
+
+
+def test_forget(tmp_path):
+    store = StateStore(str(tmp_path / 'state.db'))
+    store.record('cluster', cluster('a', ['a-0']))
+    store.record('infra_env', dict(id='ie', name='ie', cluster_id='a'))
+    store.forget('cluster', ['a'])
+    store.forget('infra_env', ['ie'])
+    assert store.query('cluster') == []
+    assert store.query('host') == []
+    assert store.query('infra_env') == []
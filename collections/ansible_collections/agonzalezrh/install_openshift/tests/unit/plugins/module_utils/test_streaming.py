@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import json
+
+import pytest
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.streaming import iter_json_array
+
+BODY = u'[1.5, -12, 1.5e3, 2E-2, 0, true, null, "café", {"id": "a", "hosts": [1, 2]}, [], 7]'.encode('utf-8')
+
+
+def split(body, *cuts):
+    cuts = (0,) + cuts + (len(body),)
+    return [body[start:end] for start, end in zip(cuts, cuts[1:])]
+
+
+def test_every_split_point():
+    expected = json.loads(BODY.decode('utf-8'))
+    for cut in range(1, len(BODY)):
+        assert list(iter_json_array(split(BODY, cut))) == expected
+
+
+def test_top_level_numbers_split_across_chunks():
+    assert list(iter_json_array([b'[1.', b'5]'])) == [1.5]
+    assert list(iter_json_array([b'[1.5e', b'3, 2', b'0]'])) == [1500.0, 20]
+
+
+def test_byte_chunks():
+    expected = json.loads(BODY.decode('utf-8'))
+    assert list(iter_json_array([BODY[index:index + 1] for index in range(len(BODY))])) == expected
+
+
+def test_large_element_in_small_chunks():
+    body = json.dumps([dict(id=str(index), name='x' * 100) for index in range(500)]).encode('utf-8')
+    assert len(list(iter_json_array(split(body, *range(7, len(body), 7))))) == 500
+
+
+@pytest.mark.parametrize('body', [b'[1, 2', b'{"a": 1}', b'[1 2]', b'[1.]'])
+def test_invalid(body):
+    with pytest.raises(ValueError):
+        list(iter_json_array(split(body, 1)))
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+import pytest
+
+from ansible_collections.agonzalezrh.install_openshift.plugins.module_utils.timeutil import parse_time
+
+
+def test_parse_time():
+    assert parse_time('2023-05-10T12:00:00Z') == 1683720000
+    assert parse_time('2023-05-10T12:00:00.250Z') == pytest.approx(1683720000.25)
+
+
+@pytest.mark.parametrize('value', [None, '', '0001-01-01T00:00:00.000Z', 'yesterday'])
+def test_unset_and_invalid_times(value):
+    assert parse_time(value) is None
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2023, Alberto Gonzalez <alberto.gonzalez@redhat.com>
+# GNU General Public License v3.0+ (see LICENSES/GPL-3.0-or-later.txt or https://www.gnu.org/licenses/gpl-3.0.txt)
+#
+# Replays the scenarios of benchmarks/request_budget.py, a change that makes
+# a module send more requests, SSO exchanges or bytes, or sleep longer, than
+# benchmarks/request_budgets.json allows fails here.
+import json
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), *(['..'] * 6 + ['benchmarks']))
+
+if not os.path.isfile(os.path.join(BENCHMARKS, 'request_budget.py')):
+    pytest.skip('the request budget harness is only in the source repository', allow_module_level=True)
+
+sys.path.insert(0, BENCHMARKS)
+import request_budget  # noqa: E402
+
+with open(request_budget.BUDGETS) as f:
+    BUDGETS = json.load(f)
+
+
+def test_every_scenario_has_a_budget():
+    assert sorted(BUDGETS) == sorted(request_budget.SCENARIOS)
+
+
+@pytest.mark.parametrize('scenario', list(request_budget.SCENARIOS))
+def test_scenario_within_budget(scenario):
+    measured = request_budget.measure(scenario)
+    over = dict((metric, (measured[metric], BUDGETS[scenario][metric])) for metric in request_budget.METRICS
+                if measured[metric] > BUDGETS[scenario][metric])
+    assert over == {}, 'over budget (measured, budget): %s, requests: %s' % (over, dict(measured['endpoints']))